@@ -0,0 +1,77 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+
+# --- FILE LAYOUT ---
+# [8-byte magic][uint32 format version][uint32 header length][JSON header][padding][array data ...]
+# Every array starts on a 64-byte boundary so it can be viewed straight out of an mmap.
+MAGIC = b'BSNBARR\0'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sII')
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_array_file(path, kind, meta, arrays):
+    """
+    Writes named NumPy arrays plus a JSON metadata header to `path`. The file is
+    written next to the target and renamed over it, so readers never see a
+    half-written file.
+    """
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+        offset = _align(offset + arr.nbytes)
+
+    header = json.dumps({'kind': kind, 'meta': meta, 'arrays': layout}).encode('utf-8')
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, arr in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(arr.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not an array file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"'{path}' has format version {version}, expected {FORMAT_VERSION}")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    header['data_start'] = _align(_PREAMBLE.size + header_len)
+    return header
+
+
+def open_array_file(path, kind=None):
+    """
+    Memory-maps `path` read-only and returns (meta, {name: array}). The arrays
+    are zero-copy views into the mapping; pages are only read when touched.
+    """
+    header = read_header(path)
+    if kind is not None and header['kind'] != kind:
+        raise ValueError(f"'{path}' holds a '{header['kind']}', expected '{kind}'")
+
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        start = header['data_start'] + spec['offset']
+        arrays[name] = mapped[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+    return header['meta'], arrays
@@ -0,0 +1,254 @@
+import heapq
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from config import (MODEL_ARTIFACT_FILE, PREDICTION_THRESHOLD, STARTING_BALANCE, MAX_OPEN_TRADES,
+                    MAX_EXPOSURE_MULTIPLE, RISK_PER_TRADE_PERCENT, RR_RATIO, FEE_PERCENT)
+from forest_inference import SELL_SIGN
+from model_artifact import load_forest
+from position_book import EXPOSURE_TOLERANCE
+from streaming_features import feature_matrix
+
+
+NO_TOUCH = np.iinfo(np.int64).max
+
+
+def default_params():
+    """The live bot's trading rules, as configured in config.py."""
+    return {
+        'threshold': PREDICTION_THRESHOLD,
+        'rr_ratio': RR_RATIO,
+        'risk_per_trade_percent': RISK_PER_TRADE_PERCENT,
+        'max_open_trades': MAX_OPEN_TRADES,
+        'max_exposure_multiple': MAX_EXPOSURE_MULTIPLE,
+        'fee_percent': FEE_PERCENT,
+        'starting_balance': STARTING_BALANCE,
+    }
+
+
+# --- MARKET DATA + SIGNALS ---
+def prepare(df, model):
+    """
+    Computes features (with the bot's streaming code) and buy/sell probabilities
+    for every candle in one batch. Returns the arrays the backtest replays.
+    """
+    X = feature_matrix(df)
+    valid = ~np.isnan(X).any(axis=1)
+    buy_prob = np.zeros(len(df))
+    sell_prob = np.zeros(len(df))
+    if valid.any():
+        buy_prob[valid] = model.predict_proba1(X[valid])
+        sell_prob[valid] = model.predict_proba1(X[valid] * SELL_SIGN)
+    return {
+        'high': df['high'].values.astype(np.float64),
+        'low': df['low'].values.astype(np.float64),
+        'close': df['close'].values.astype(np.float64),
+        'buy_prob': buy_prob,
+        'sell_prob': sell_prob,
+    }
+
+
+def _first_touch_at(values, rows, levels, above, max_hold):
+    """
+    Offset of the first candle after each entry row whose value crosses its level,
+    or NO_TOUCH. Only still-unresolved entries are carried to the next offset, so
+    the cost follows the total holding time rather than len(values) ** 2.
+    """
+    n = len(values)
+    first = np.full(len(rows), NO_TOUCH, dtype=np.int64)
+    active = np.arange(len(rows))
+    j = 1
+    while active.size and j <= max_hold:
+        pos = rows[active] + j
+        active, pos = active[pos < n], pos[pos < n]
+        hit = values[pos] >= levels[active] if above else values[pos] <= levels[active]
+        first[active[hit]] = j
+        active = active[~hit]
+        j += 1
+    return first
+
+
+def _exits(data, rows, side, risk, rr, max_hold):
+    """Exit candle, exit price and TP flag for a trade entered at the close of each row."""
+    entry = data['close'][rows]
+    if side == 'buy':
+        sl, tp = entry * (1 - risk), entry * (1 + risk * rr)
+        first_sl = _first_touch_at(data['low'], rows, sl, False, max_hold)
+        first_tp = _first_touch_at(data['high'], rows, tp, True, max_hold)
+    else:
+        sl, tp = entry * (1 + risk), entry * (1 - risk * rr)
+        first_sl = _first_touch_at(data['high'], rows, sl, True, max_hold)
+        first_tp = _first_touch_at(data['low'], rows, tp, False, max_hold)
+    # Intrabar, the stop is assumed to fill before the target (same rule as the labeler).
+    is_tp = first_tp < first_sl
+    offset = np.minimum(first_sl, first_tp)
+    exit_bar = np.where(offset == NO_TOUCH, NO_TOUCH, rows + np.minimum(offset, len(data['close'])))
+    return exit_bar, np.where(is_tp, tp, sl), is_tp
+
+
+# --- BACKTEST ENGINE ---
+def run_backtest(data, params=None, max_hold=None):
+    """
+    Replays open_trade() / check_and_close_trades() over history:
+    - a signal at a candle's close opens a trade at that close (buy first, then the sign-flipped sell);
+    - SL/TP, sizing, max_open_trades, exposure cap, fees and balance compounding follow the bot;
+    - open trades are filled at their SL/TP price using the intrabar high/low of later candles.
+    """
+    params = {**default_params(), **(params or {})}
+    n = len(data['close'])
+    max_hold = n if max_hold is None else max_hold
+    risk, rr, fee = params['risk_per_trade_percent'], params['rr_ratio'], params['fee_percent']
+
+    # Candidate entries are known up front; only their exits need a first-touch search.
+    buy_rows = np.flatnonzero(data['buy_prob'] >= params['threshold'])
+    sell_rows = np.flatnonzero((data['buy_prob'] < params['threshold']) & (data['sell_prob'] >= params['threshold']))
+    exits = {'buy': _exits(data, buy_rows, 'buy', risk, rr, max_hold),
+             'sell': _exits(data, sell_rows, 'sell', risk, rr, max_hold)}
+    signals = sorted([(i, 'buy', k) for k, i in enumerate(buy_rows)] + [(i, 'sell', k) for k, i in enumerate(sell_rows)])
+
+    balance = params['starting_balance']
+    open_heap = []  # (exit_bar, seq, trade)
+    closed, seq = [], itertools.count()
+
+    def close_until(bar):
+        nonlocal balance
+        while open_heap and open_heap[0][0] <= bar:
+            exit_bar, _, trade = heapq.heappop(open_heap)
+            direction = 1 if trade['side'] == 'buy' else -1
+            pnl = (trade['exit_price'] - trade['entry_price']) * trade['size'] * direction
+            fees = (trade['entry_price'] + trade['exit_price']) * trade['size'] * fee
+            balance += pnl - fees
+            closed.append((trade['entry_bar'], exit_bar, direction, trade['is_tp'], pnl, fees, balance))
+
+    for bar, side, k in signals:
+        close_until(bar)
+        if len(open_heap) >= params['max_open_trades']:
+            continue
+        entry_price = data['close'][bar]
+        position_value = balance * risk / risk
+        if params['max_exposure_multiple'] is not None:
+            exposure = sum(t['entry_price'] * t['size'] for _, _, t in open_heap)
+            if exposure + position_value > params['max_exposure_multiple'] * balance * (1 + EXPOSURE_TOLERANCE):
+                continue
+        exit_bar, exit_price, is_tp = exits[side][0][k], exits[side][1][k], exits[side][2][k]
+        trade = {'side': side, 'entry_bar': bar, 'entry_price': entry_price, 'size': position_value / entry_price,
+                 'exit_price': exit_price, 'is_tp': bool(is_tp)}
+        heapq.heappush(open_heap, (exit_bar, next(seq), trade))
+    close_until(n - 1)
+
+    return _summarize(closed, [t for _, _, t in open_heap], data, params)
+
+
+def _summarize(closed, still_open, data, params):
+    n = len(data['close'])
+    trades = np.array(closed, dtype=[('entry_bar', 'i8'), ('exit_bar', 'i8'), ('direction', 'i1'), ('is_tp', '?'),
+                                     ('pnl', 'f8'), ('fees', 'f8'), ('balance', 'f8')])
+    realized = np.zeros(n)
+    np.add.at(realized, trades['exit_bar'], trades['pnl'] - trades['fees'])
+    equity = params['starting_balance'] + np.cumsum(realized)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+
+    wins = int(trades['is_tp'].sum())
+    gross = float(trades['pnl'].sum())
+    fees = float(trades['fees'].sum())
+    last_close = data['close'][-1]
+    unrealized = sum((last_close - t['entry_price']) * t['size'] * (1 if t['side'] == 'buy' else -1) for t in still_open)
+    return {
+        'params': params,
+        'final_balance': float(equity[-1]) if n else params['starting_balance'],
+        'return_pct': (float(equity[-1]) / params['starting_balance'] - 1) * 100 if n else 0.0,
+        'total_trades': len(trades),
+        'wins': wins,
+        'losses': len(trades) - wins,
+        'win_rate': wins / len(trades) * 100 if len(trades) else 0.0,
+        'max_drawdown_pct': float(drawdown.min()) * 100 if n else 0.0,
+        'gross_pnl': gross,
+        'total_fees': fees,
+        'fee_drag_pct': fees / params['starting_balance'] * 100,
+        'open_at_end': len(still_open),
+        'unrealized_pnl': unrealized,
+        'equity': equity,
+        'drawdown': drawdown,
+        'trades': trades,
+    }
+
+
+# --- PARAMETER GRIDS ---
+_worker_data = None
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _run_one(params):
+    result = run_backtest(_worker_data, params)
+    # Curves stay in the worker; the grid only ships the scalar statistics back.
+    return {k: v for k, v in result.items() if k not in ('equity', 'drawdown', 'trades')}
+
+
+def run_grid(data, grid, processes=None):
+    """
+    Runs every combination of the lists in `grid` (e.g. {'threshold': [...], 'rr_ratio': [...]})
+    across a process pool. The market data is sent to each worker once.
+    """
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count(), initializer=_init_worker, initargs=(data,)) as pool:
+        return list(pool.map(_run_one, combos, chunksize=max(1, len(combos) // (4 * (processes or os.cpu_count())))))
+
+
+def print_summary(result):
+    p = result['params']
+    print(f"Threshold {p['threshold']:.2f} | RR {p['rr_ratio']:.1f} | Risk {p['risk_per_trade_percent'] * 100:.2f}% | Max trades {p['max_open_trades']}")
+    print(f"  Final Balance: ${result['final_balance']:.2f} ({result['return_pct']:+.2f}%)")
+    print(f"  Trades: {result['total_trades']} (Wins: {result['wins']}, Losses: {result['losses']}, Win Rate: {result['win_rate']:.2f}%)")
+    print(f"  Max Drawdown: {result['max_drawdown_pct']:.2f}%")
+    print(f"  Gross P&L: ${result['gross_pnl']:.2f}, Fees: ${result['total_fees']:.2f} (fee drag {result['fee_drag_pct']:.2f}% of start)")
+    if result['open_at_end']:
+        print(f"  Still open at end: {result['open_at_end']} (unrealized ${result['unrealized_pnl']:.2f})")
+
+
+def main():
+    input_file = 'btc_15m_data.csv'
+    grid = {
+        'threshold': [0.3, 0.35, 0.4, 0.45, 0.5],
+        'rr_ratio': [1.5, 2.0, 3.0],
+        'risk_per_trade_percent': [0.005, 0.01, 0.02],
+        'max_open_trades': [1, 2, 4],
+    }
+
+    print(f"--- Backtesting the bot's trade rules on '{input_file}' ---")
+    df = pd.read_csv(input_file)
+    model, _ = load_forest(MODEL_ARTIFACT_FILE)
+
+    start = time.perf_counter()
+    data = prepare(df, model)
+    prepare_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = run_backtest(data)
+    replay_time = time.perf_counter() - start
+
+    print(f"\nCandles: {len(df)} (features + inference {prepare_time * 1000:.1f} ms, replay {replay_time * 1000:.1f} ms, "
+          f"{len(df) / replay_time:,.0f} candles/s)\n")
+    print("--- Live configuration ---")
+    print_summary(result)
+
+    n_combos = int(np.prod([len(v) for v in grid.values()]))
+    start = time.perf_counter()
+    results = run_grid(data, grid)
+    grid_time = time.perf_counter() - start
+    print(f"\n--- Grid: {n_combos} configurations in {grid_time:.2f} s ---")
+    for r in sorted(results, key=lambda r: r['final_balance'], reverse=True)[:5]:
+        print_summary(r)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import MODEL_FILE, MODEL_ARTIFACT_FILE, FEATURE_COLUMNS, TIMEFRAME
+from scheduler import timeframe_seconds, BarClose
+
+
+RESULTS_DIR = 'bench_results'
+DEFAULT_SIZES = [1_000, 100_000]
+# Batch prediction is capped at this many rows: it measures per-row cost, not memory.
+MAX_PREDICT_ROWS = 100_000
+
+
+# --- SYNTHETIC MARKET DATA ---
+def synthetic_ohlcv(n, seed=42, start='2024-01-01', timeframe=TIMEFRAME, price=100_000.0, volatility=0.002):
+    """
+    `n` candles shaped like btc_15m_data.csv: a geometric random walk with
+    fat-tailed returns and volatility clustering, highs/lows beyond open and
+    close, and log-normal volumes. The same seed always gives the same frame.
+    """
+    rng = np.random.default_rng(seed)
+    regime = np.exp(np.convolve(rng.normal(0, 0.3, n + 99), np.ones(100) / 10, mode='valid'))
+    returns = rng.standard_t(4, n) * volatility * regime / np.sqrt(2)
+    close = price * np.exp(np.cumsum(returns))
+    open = np.concatenate([[price], close[:-1]])
+    wick = np.abs(rng.normal(0, volatility * regime / 2, (2, n)))
+    high = np.maximum(open, close) * (1 + wick[0])
+    low = np.minimum(open, close) * (1 - wick[1])
+    volume = rng.lognormal(4, 0.6, n) * (1 + 20 * np.abs(returns))
+    timestamp = pd.Timestamp(start) + pd.to_timedelta(np.arange(n) * timeframe_seconds(timeframe), unit='s')
+    return pd.DataFrame({'timestamp': timestamp, 'open': open, 'high': high, 'low': low, 'close': close, 'volume': volume})
+
+
+# --- TIMING ---
+def measure(fn, setup=None, repeat=9, budget=3.0, self_timed=False):
+    """
+    Per-call seconds of fn(): `repeat` samples (fewer if they exceed `budget`
+    seconds), each looping fn enough times to last about 10 ms. `setup` runs
+    untimed before every call. With `self_timed` fn returns its own elapsed
+    time (for async code timed inside the event loop); otherwise the call is
+    timed here and its return value ignored.
+    """
+    def once():
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        return result if self_timed else time.perf_counter() - start
+
+    first = once()  # also warms caches and lazy imports
+    loops = max(1, int(0.01 / max(first, 1e-9)))
+    samples = []
+    spent = first
+    while len(samples) < repeat and (not samples or spent < budget):
+        elapsed = sum(once() for _ in range(loops))
+        spent += elapsed
+        samples.append(elapsed / loops)
+    return {'median': float(np.median(samples)), 'min': float(np.min(samples)), 'samples': len(samples), 'loops': loops}
+
+
+# --- BENCHMARKS ---
+CALIBRATION = 'calibration'
+
+
+def _calibration_workload(values=np.random.default_rng(0).random(200_000)):
+    # A fixed mix of interpreter and NumPy work, used to factor machine speed out of comparisons.
+    total = 0.0
+    for value in values[:20_000].tolist():
+        total += value * value
+    np.sort(values)
+
+
+def bench_features(df, results):
+    from bot import calculate_features
+    from streaming_features import feature_matrix
+
+    n = len(df)
+    results[f"calculate_features[n={n}]"] = measure(lambda: calculate_features(df.copy()), repeat=3)
+    results[f"feature_matrix[n={n}]"] = measure(lambda: feature_matrix(df), repeat=3)
+
+
+def bench_labeling(df, results):
+    from create_master_dataset import build_master_frame
+
+    results[f"build_master_frame[n={len(df)}]"] = measure(lambda: build_master_frame(df), repeat=3)
+
+
+def bench_predict(df, results):
+    from model_artifact import load_forest
+    from streaming_features import feature_matrix
+
+    X = feature_matrix(df.iloc[:MAX_PREDICT_ROWS + 100])
+    X = X[~np.isnan(X).any(axis=1)][:MAX_PREDICT_ROWS]
+    forest, _ = load_forest(MODEL_ARTIFACT_FILE)
+    row = X[-1]
+    results["forest.predict_buy_sell[rows=1]"] = measure(lambda: forest.predict_buy_sell(row))
+    results[f"forest.predict_proba1[rows={len(X)}]"] = measure(lambda: forest.predict_proba1(X), repeat=3)
+    try:
+        import joblib
+        model = joblib.load(MODEL_FILE)
+    except ImportError:
+        return
+    model.set_params(n_jobs=1)
+    frame = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+    single = frame.iloc[-1:]
+    results["sklearn.predict_proba[rows=1]"] = measure(lambda: model.predict_proba(single))
+    results[f"sklearn.predict_proba[rows={len(X)}]"] = measure(lambda: model.predict_proba(frame), repeat=3)
+
+
+class _Notifier:
+    def notify(self, text, priority=None):
+        pass
+
+
+def _bot_with_fake_exchange(directory, name, candles=None):
+    import bot
+    from exchange_client import FakeExchange
+    from journal import Journal, new_state
+
+    bot.exchange = FakeExchange(candles=candles, latency=0.0, poll_interval=0.0)
+    bot.journal = Journal(os.path.join(directory, f"{name}.journal"), snapshot_every=10**9)
+    bot.portfolio.update(new_state(bot.portfolio['balance']))
+    bot.journal.recover(bot.portfolio)
+    return bot
+
+
+def bench_check_and_close(results, directory):
+    bot = _bot_with_fake_exchange(directory, 'check')
+    loop = asyncio.new_event_loop()
+    symbols = [f"C{i}/USDC:USDC" for i in range(12)]
+    notifier = _Notifier()
+
+    for n_positions in (10, 1000):
+        for hits in (0, 10):
+            def setup():
+                book = bot.portfolio['positions']
+                book.remove(range(len(book)))
+                for i in range(n_positions):
+                    # The first `hits` positions sit below their take-profit at 100, the rest never trigger.
+                    tp = 99.0 if i < hits else 1e9
+                    book.add(symbols[i % len(symbols)], 'buy', 98.0, 1.0, tp, 1.0, f"b{i}")
+
+            prices = {symbol: 100.0 for symbol in symbols}
+
+            async def check():
+                start = time.perf_counter()
+                await bot.check_and_close_trades(prices, notifier)
+                return time.perf_counter() - start
+
+            name = f"check_and_close_trades[positions={n_positions},hits={hits}]"
+            results[name] = measure(lambda: loop.run_until_complete(check()), setup=setup, repeat=5, self_timed=True)
+    loop.close()
+    bot.journal.close()
+
+
+def bench_cycle(df, results, directory, n_symbols=12, n_cycles=200):
+    """One candle close for `n_symbols` symbols against a zero-latency fake exchange, as on_candle_close runs it."""
+    rows = [[int(ts), o, h, l, c, v] for ts, o, h, l, c, v in zip(
+        df['timestamp'].values.astype('datetime64[ms]').astype(np.int64).tolist(), df['open'].tolist(), df['high'].tolist(),
+        df['low'].tolist(), df['close'].tolist(), df['volume'].tolist())]
+    warmup = 60
+    if len(rows) < warmup + n_cycles + 1:
+        return
+    bot = _bot_with_fake_exchange(directory, 'cycle', rows[:warmup])
+    states = bot.build_symbol_states([{'symbol': f"C{i}/USDC:USDC"} for i in range(n_symbols)])
+    notifier = _Notifier()
+    loop = asyncio.new_event_loop()
+    position = {'end': warmup}
+
+    def setup():
+        # One more closed candle plus the new forming one.
+        end = position['end'] = position['end'] + 1
+        timestamp, open = rows[end - 1][:2]
+        bot.exchange.candles = rows[:end - 1] + [[timestamp, open, open, open, open, 0.0]]
+
+    async def cycle():
+        close_time = bot.exchange.candles[-1][0] / 1000
+        bar = BarClose(close_time, 1.0, 0, False)
+        start = time.perf_counter()
+        await asyncio.gather(*(bot.run_symbol_cycle(state, notifier, bar) for state in states), return_exceptions=True)
+        return time.perf_counter() - start
+
+    for _ in range(3):  # first backfills
+        setup()
+        loop.run_until_complete(cycle())
+    results[f"candle_cycle[symbols={n_symbols}]"] = measure(lambda: loop.run_until_complete(cycle()), setup=setup,
+                                                             repeat=min(n_cycles, len(rows) - position['end'] - 20) // 10, self_timed=True)
+    loop.close()
+    bot.journal.close()
+
+
+def run(sizes, seed=42):
+    results = {CALIBRATION: measure(_calibration_workload)}
+    with tempfile.TemporaryDirectory(prefix='bench-') as directory:
+        for n in sizes:
+            start = time.perf_counter()
+            df = synthetic_ohlcv(n, seed)
+            print(f"synthetic_ohlcv({n}): {time.perf_counter() - start:.2f}s")
+            bench_features(df, results)
+            bench_labeling(df, results)
+            if n == sizes[-1]:
+                bench_predict(df, results)
+        bench_check_and_close(results, directory)
+        bench_cycle(synthetic_ohlcv(1_000, seed), results, directory)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'created': datetime.utcnow().isoformat(timespec='seconds'), 'commit': commit, 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+# --- COMPARISON ---
+def compare(base, new, threshold=0.10, stat='min'):
+    """
+    Prints every benchmark both runs have; returns the names whose `stat`
+    got slower by more than `threshold`. The default compares the fastest
+    sample, which other load on the machine can only make slower, and every
+    change is divided by the change of the calibration workload, so a
+    uniformly slower machine is not reported as a regression.
+    """
+    regressions = []
+    speed = 1.0
+    if CALIBRATION in base['results'] and CALIBRATION in new['results']:
+        speed = new['results'][CALIBRATION][stat] / base['results'][CALIBRATION][stat]
+        print(f"Machine speed factor (new/base calibration): {speed:.3f}; changes below are relative to it.")
+    print(f"{'benchmark':<58} {'base':>11} {'new':>11}  change")
+    for name in sorted((set(base['results']) & set(new['results'])) - {CALIBRATION}):
+        before, after = base['results'][name][stat], new['results'][name][stat]
+        ratio = after / before / speed if before else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print(f"{name:<58} {_format_seconds(before):>11} {_format_seconds(after):>11}  {ratio - 1:+7.1%}{flag}")
+    for name in sorted(set(base['results']) ^ set(new['results'])):
+        print(f"{name:<58} only in {'base' if name in base['results'] else 'new'}")
+    return regressions
+
+
+def _format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds * 1e9:.0f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the bot's hot paths on synthetic market data.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the suite and store the results as JSON')
+    run_parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                            help='comma-separated candle counts for the data-size benchmarks (1000 up to 10000000)')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--out', help=f"result file (default: {RESULTS_DIR}/<timestamp>.json)")
+    compare_parser = commands.add_parser('compare', help='compare two result files; exits with 1 on a regression')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown that counts as a regression')
+    compare_parser.add_argument('--stat', choices=('min', 'median'), default='min')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        sizes = sorted(int(size) for size in args.sizes.split(','))
+        results = run(sizes, args.seed)
+        out = args.out or os.path.join(RESULTS_DIR, datetime.utcnow().strftime('%Y%m%d-%H%M%S') + '.json')
+        os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+        with open(out, 'w') as f:
+            json.dump({'environment': environment(), 'sizes': sizes, 'seed': args.seed, 'results': results}, f, indent=1)
+        for name, stats in results.items():
+            print(f"{name:<58} {_format_seconds(stats['median']):>11}  (min {_format_seconds(stats['min'])}, {stats['samples']} samples)")
+        print(f"Results written to '{out}'.")
+    else:
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold, args.stat)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}.")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,96 @@
 # --- IMPORTS ---
 import pandas as pd
-import joblib
+import numpy as np
 import os
+import time
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 from pytz import timezone
-from datetime import datetime, timedelta
+from datetime import datetime
 import telegram
-import ccxt
-import asyncio
 from ccxt.base.errors import OrderNotFound
 
+from streaming_features import StreamingFeatures, ContextFeatures
+from candle_cache import CandleCache
+from position_book import PositionBook, plan_trade, can_open, close_fees
+from journal import Journal, apply_record, reconcile
+from forest_inference import CompiledForest
+from model_artifact import load_forest
+from exchange_client import create_exchange
+from metrics import metrics, SamplingProfiler
+from scheduler import CandleScheduler, timeframe_seconds
+from retrain import retrain, format_result
+from shadow import ShadowRunner
+from price_stream import PriceMonitor
+from market_log import MarketClock, MarketRecorder
+from notifier import Notifier, escape_markdown, PRIORITY_FILL, PRIORITY_ERROR, PRIORITY_INFO, PRIORITY_REPORT
+
 
 # --- CONFIGURATION ---
-MODEL_FILE = 'master_model.joblib'
-PREDICTION_THRESHOLD = 0.45
-FEATURE_COLUMNS = ['return_1', 'return_5', 'return_10', 'volume_change_1', 'volume_change_5', 'candle_range', 'volatility_10']
+from config import MODEL_FILE, MODEL_ARTIFACT_FILE, PREDICTION_THRESHOLD, TIMEFRAME, SYMBOLS, CONTEXT_TIMEFRAMES
+from config import STARTING_BALANCE, MAX_OPEN_TRADES, MAX_EXPOSURE_MULTIPLE, RISK_PER_TRADE_PERCENT, RR_RATIO, FEE_PERCENT
+from config import JOURNAL_FILE, MARKET_LOG_FILE, RETRAIN_INTERVAL_HOURS, SHADOW_MODELS, SHADOW_WORKERS, EXCHANGE, LIVE_TRADING
+from config import METRICS_ENABLED, METRICS_FILE, METRICS_PORT, CANDLE_CLOSE_DELAY, MONITOR_INTERVAL, MAX_SIGNAL_LATENESS, INTRABAR_MONITOR
 MARKET_SYMBOL = 'BTCUSDT'
-TIMEFRAME = '15m'
+TIMEFRAME_SECONDS = timeframe_seconds(TIMEFRAME)
 
-# --- CCXT HYPERLIQUID SETUP ---
+# --- EXCHANGE SETUP ---
+# One async exchange session is shared by every symbol, so rate limiting and pooled connections are shared too.
 MARKET_SYMBOL_CCXT = 'BTC/USDC:USDC'
-exchange = ccxt.hyperliquid({'enableRateLimit': True})
+exchange = create_exchange(EXCHANGE)
+# The loop reads the time, waits and gets its market data through market_clock: main() turns it into a
+# MarketRecorder logging all of it to MARKET_LOG_FILE, and market_log.py replays such a log through main().
+market_clock = MarketClock()
 
 # --- PORTFOLIO & RISK MANAGEMENT ---
 portfolio = {
-    "balance": 100.0,
-    "open_trades": [],
-    "max_open_trades": 2,
-    "risk_per_trade_percent": 0.02,
-    "rr_ratio": 3.0,
-    "fee_percent": 0.0005,
+    "balance": STARTING_BALANCE,
+    "positions": PositionBook(),
+    "max_open_trades": MAX_OPEN_TRADES,
+    "max_exposure_multiple": MAX_EXPOSURE_MULTIPLE,
+    "risk_per_trade_percent": RISK_PER_TRADE_PERCENT,
+    "rr_ratio": RR_RATIO,
+    "fee_percent": FEE_PERCENT,
     "wins": 0,
     "losses": 0,
     "total_trades": 0,
     "start_time": datetime.utcnow()
 }
+# Held while checking the caps and placing an order, so concurrent symbols cannot overshoot them.
+trade_lock = asyncio.Lock()
+# Every change to the portfolio above is journaled; main() rebuilds it from the journal at startup.
+journal = Journal(JOURNAL_FILE)
+# Paper-only candidate models fed the same feature vectors; they never place orders.
+shadows = ShadowRunner(SHADOW_MODELS, workers=SHADOW_WORKERS)
+
+# --- PER-SYMBOL STATE ---
+class SymbolState:
+    """Candle/feature state, model and limits of one traded symbol. Its trades live in portfolio['positions']."""
+
+    def __init__(self, symbol, model, threshold=PREDICTION_THRESHOLD, max_open_trades=None, model_file=MODEL_ARTIFACT_FILE):
+        self.symbol = symbol
+        self.model = model
+        self.model_file = model_file
+        self.threshold = threshold
+        self.max_open_trades = max_open_trades
+        self.features = StreamingFeatures()
+        # Higher-timeframe bars are resampled from this symbol's TIMEFRAME candles, so the cache holds enough of them.
+        self.context = ContextFeatures(TIMEFRAME) if CONTEXT_TIMEFRAMES else None
+        self.candles = CandleCache(symbol, TIMEFRAME, size=max(25, self.context.warmup_candles() if self.context else 0))
+        self.last_price = None
+
+    def open_trades(self):
+        return portfolio['positions'].trades(self.symbol)
+
+    def latest_features(self):
+        """FEATURE_COLUMNS of the newest committed candle: base features plus any context (None while warming up)."""
+        if self.context is None:
+            return self.features.latest
+        if self.features.latest is None or self.context.latest is None:
+            return None
+        return np.concatenate([self.features.latest, self.context.latest])
 
 # --- TELEGRAM BOT CLASS ---
 class TelegramBot:
@@ -45,12 +100,10 @@ class TelegramBot:
         self.chat_id = os.getenv("TELEGRAM_CHAT_ID")
         self.bot = telegram.Bot(token=self.token) if self.token and self.chat_id else None
 
-    async def send_message(self, text):
+    async def send_message(self, text, parse_mode='Markdown'):
+        # Errors propagate: the Notifier resends a rejected message in parts and reports what still fails.
         if self.bot:
-            try:
-                await self.bot.send_message(chat_id=self.chat_id, text=text, parse_mode='Markdown')
-            except Exception as e:
-                print(f"Error sending Telegram message: {e}")
+            await self.bot.send_message(chat_id=self.chat_id, text=text, parse_mode=parse_mode)
 
 # --- FEATURE CALCULATION ---
 def calculate_features(df):
@@ -65,95 +118,170 @@ def calculate_features(df):
     return df
 
 
-async def get_hyperliquid_candles(symbol, timeframe, limit=25):
+async def refresh_candles(state, now_ms):
     """
-    Fetches the latest k-line/candle data from Hyperliquid via CCXT.
+    Brings the symbol's candle cache up to date from Hyperliquid via CCXT; after
+    the first backfill only the candles since the last closed one are fetched.
     """
     try:
-        ohlcv = await asyncio.to_thread(exchange.fetch_ohlcv, MARKET_SYMBOL_CCXT, timeframe, None, limit)
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        return df
+        with metrics.span('fetch_candles'):
+            await state.candles.refresh(exchange, now_ms)
+        return True
     except Exception as e:
-        print(f"Hyperliquid Fetch Error: {e}")
-        return None
+        metrics.inc('fetch_failures')
+        print(f"Hyperliquid Fetch Error ({state.symbol}): {e}")
+        return False
 
 # --- TRADE SIMULATION & P&L ---
-async def check_and_close_trades(current_price, telegram_bot):
+async def check_and_close_trades(prices, notifier, lows=None, highs=None, since=None):
+    """
+    Closes every open position whose TP or SL is hit at `prices` ({symbol: current price}),
+    or anywhere in the `lows`/`highs` range seen since the last check when those are given
+    (only at `prices` for positions opened after the range started at `since`).
+    """
     global portfolio
-    trades_to_remove = []
-    for trade in portfolio["open_trades"]:
-        pnl, closed, status = 0, False, ""
-        if trade['side'] == 'buy':
-            if current_price >= trade['tp_price']:
-                pnl, closed, status, portfolio['wins'] = (trade['tp_price'] - trade['entry_price']) * trade['size'], True, "✅ TP HIT", portfolio['wins'] + 1
-            elif current_price <= trade['sl_price']:
-                pnl, closed, status, portfolio['losses'] = (trade['sl_price'] - trade['entry_price']) * trade['size'], True, "❌ SL HIT", portfolio['losses'] + 1
-        elif trade['side'] == 'sell':
-            if current_price <= trade['tp_price']:
-                pnl, closed, status, portfolio['wins'] = (trade['entry_price'] - trade['tp_price']) * trade['size'], True, "✅ TP HIT", portfolio['wins'] + 1
-            elif current_price >= trade['sl_price']:
-                pnl, closed, status, portfolio['losses'] = (trade['entry_price'] - trade['sl_price']) * trade['size'], True, "❌ SL HIT", portfolio['losses'] + 1
-        
-        if closed:
-            # Close position on Hyperliquid (market order to reverse side)
-            close_side = 'sell' if trade['side'] == 'buy' else 'buy'
-            try:
-                await asyncio.to_thread(exchange.create_order, MARKET_SYMBOL_CCXT, 'market', close_side, trade['size'])
-            except OrderNotFound:
-                print(f"Order {trade['order_id']} already closed.")
-            except Exception as e:
-                print(f"Error closing order: {e}")
-
-            fees = (trade['entry_price'] * trade['size'] + current_price * trade['size']) * portfolio['fee_percent']
-            net_pnl = pnl - fees
-            portfolio['balance'] += net_pnl
-            trades_to_remove.append(trade)
-            message = f"*{status}*\n\nSide: {trade['side'].upper()}\nNet P&L: `${net_pnl:.2f}` (incl. `${fees:.2f}` fees)\n*New Balance: `${portfolio['balance']:.2f}`*"
-            await telegram_bot.send_message(message)
-    
-    portfolio['open_trades'] = [t for t in portfolio['open_trades'] if t not in trades_to_remove]
+    book = portfolio['positions']
+    indices, hit_tp, gross_pnl = book.triggered(prices) if lows is None else book.triggered_range(lows, highs, prices, since)
+    if not len(indices):
+        return
+
+    # Triggered positions leave the book right away, so a concurrent check cannot close them twice.
+    triggered = [(book.trade(i), pnl, tp) for i, pnl, tp in zip(indices.tolist(), gross_pnl.tolist(), hit_tp.tolist())]
+    book.remove(indices.tolist())
+
+    # Close every triggered position on Hyperliquid at once (market orders to reverse side)
+    closes = [(trade['symbol'], 'sell' if trade['side'] == 'buy' else 'buy', trade['size'], prices[trade['symbol']]) for trade, _, _ in triggered]
+    with metrics.span('close_orders'):
+        results = await exchange.close_positions(closes)
+    metrics.inc('trades_closed', len(triggered))
 
-async def open_trade(side, entry_price, telegram_bot):
+    for (trade, pnl, tp), result in zip(triggered, results):
+        if isinstance(result, OrderNotFound):
+            print(f"Order {trade['order_id']} already closed.")
+        elif isinstance(result, Exception):
+            print(f"Error closing order: {result}")
+        elif not result[1]:
+            print(f"Close order for {trade['order_id']} was not confirmed as filled.")
+
+        status = "✅ TP HIT" if tp else "❌ SL HIT"
+        current_price = prices[trade['symbol']]
+        fees = close_fees(portfolio, trade, current_price)
+        net_pnl = pnl - fees
+        record = dict(order_id=trade['order_id'], symbol=trade['symbol'], side=trade['side'], exit_price=current_price,
+                      pnl=pnl, fees=fees, net_pnl=net_pnl, win=tp, balance=portfolio['balance'] + net_pnl)
+        apply_record(portfolio, {'type': 'close', **record})  # the position itself already left the book above
+        journal.record('close', **record)
+        message = f"*{status}*\n\nSymbol: {trade['symbol']}\nSide: {trade['side'].upper()}\nNet P&L: `${net_pnl:.2f}` (incl. `${fees:.2f}` fees)\n*New Balance: `${portfolio['balance']:.2f}`*"
+        notifier.notify(message, PRIORITY_FILL)
+    await journal.commit()
+
+def can_open_trade(state, position_value):
+    """Global trade cap, per-symbol trade cap and total exposure cap."""
+    if state is None:
+        return can_open(portfolio, position_value)
+    return can_open(portfolio, position_value, state.symbol, state.max_open_trades)
+
+async def open_trade(side, entry_price, notifier, symbol=MARKET_SYMBOL_CCXT, state=None):
+    async with trade_lock:
+        await _open_trade(side, entry_price, notifier, symbol, state)
+
+async def _open_trade(side, entry_price, notifier, symbol, state):
     global portfolio
-    risk_amount_usd = portfolio['balance'] * portfolio['risk_per_trade_percent']
-    
-    if side == 'buy':
-        sl_price = entry_price * (1 - portfolio['risk_per_trade_percent'])
-        tp_price = entry_price * (1 + (portfolio['risk_per_trade_percent'] * portfolio['rr_ratio']))
-    else:  # 'sell'
-        sl_price = entry_price * (1 + portfolio['risk_per_trade_percent'])
-        tp_price = entry_price * (1 - (portfolio['risk_per_trade_percent'] * portfolio['rr_ratio']))
-    
-    position_value = risk_amount_usd / portfolio['risk_per_trade_percent']
-    size_coin = position_value / entry_price
+    sl_price, tp_price, size_coin, position_value = plan_trade(portfolio, side, entry_price)
+    if not can_open_trade(state, position_value):
+        return
 
     # Place market order on Hyperliquid
     try:
-        order = await asyncio.to_thread(exchange.create_order, MARKET_SYMBOL_CCXT, 'market', side, size_coin)
+        with metrics.span('create_order'):
+            order, filled = await exchange.market_order(symbol, side, size_coin, entry_price)
+        metrics.inc('orders')
         order_id = order.get('id')
+        if not filled:
+            print(f"Order {order_id} was not confirmed as filled.")
     except Exception as e:
+        metrics.inc('order_errors')
         print(f"Order placement error: {e}")
         return
 
-    portfolio['open_trades'].append({
-        'side': side,
-        'entry_price': entry_price,
-        'sl_price': sl_price,
-        'tp_price': tp_price,
-        'size': size_coin,
-        'order_id': order_id
-    })
-    portfolio['total_trades'] += 1
-    message = f"🔔 *NEW TRADE OPENED*\n\nSide: {side.upper()}\nEntry: `${entry_price:,.2f}`\nTP: `${tp_price:,.2f}`\nSL: `${sl_price:,.2f}`"
-    await telegram_bot.send_message(message)
+    record = dict(symbol=symbol, side=side, entry_price=entry_price, sl_price=sl_price, tp_price=tp_price, size=size_coin,
+                  order_id=str(order_id) if order_id else f"local-{journal.seq + 1}")
+    apply_record(portfolio, {'type': 'open', **record, 'opened': market_clock.monotonic()})
+    journal.record('open', **record)
+    await journal.commit()
+    message = f"🔔 *NEW TRADE OPENED*\n\nSymbol: {symbol}\nSide: {side.upper()}\nEntry: `${entry_price:,.2f}`\nTP: `${tp_price:,.2f}`\nSL: `${sl_price:,.2f}`"
+    notifier.notify(message, PRIORITY_FILL)
+
+# --- MODEL LOADING ---
+def load_model(artifact_file=MODEL_ARTIFACT_FILE, model_file=MODEL_FILE):
+    """
+    Memory-maps the pickle-free forest artifact when it exists, so startup never
+    imports sklearn. Falls back to the joblib pickle otherwise.
+    """
+    if os.path.exists(artifact_file):
+        model, meta = load_forest(artifact_file)
+        if meta['prediction_threshold'] != PREDICTION_THRESHOLD:
+            print(f"Warning: '{artifact_file}' was exported with threshold {meta['prediction_threshold']}, using {PREDICTION_THRESHOLD}.")
+        print(f"Loaded '{artifact_file}' ({meta['n_trees']} trees, training data {meta['training_data_sha256'][:12]}).")
+        return model
+
+    import joblib
+    print(f"'{artifact_file}' not found, loading '{model_file}'.")
+    return CompiledForest.from_sklearn(joblib.load(model_file))
+
+def build_symbol_states(symbols=SYMBOLS):
+    """One SymbolState per configured symbol; symbols without their own 'model_file' share one loaded model."""
+    models = {}
+    states = []
+    for entry in symbols:
+        artifact_file = entry.get('model_file', MODEL_ARTIFACT_FILE)
+        if artifact_file not in models:
+            models[artifact_file] = load_model(artifact_file)
+        states.append(SymbolState(entry['symbol'], models[artifact_file],
+                                  threshold=entry.get('threshold', PREDICTION_THRESHOLD),
+                                  max_open_trades=entry.get('max_open_trades'), model_file=artifact_file))
+    return states
+
+def swap_model(states, artifact_file=MODEL_ARTIFACT_FILE):
+    """
+    Reloads `artifact_file` and points every symbol trading it at the new model.
+    A cycle that is already scoring keeps the model it started with; the next one uses the new model.
+    """
+    model = load_model(artifact_file)
+    swapped = [state.symbol for state in states if state.model_file == artifact_file]
+    for state in states:
+        if state.model_file == artifact_file:
+            state.model = model
+    return swapped
+
+async def retrain_loop(states, notifier):
+    """Walk-forward retraining every RETRAIN_INTERVAL_HOURS in a worker process, so the event loop never stalls."""
+    loop = asyncio.get_running_loop()
+    # 'spawn': the worker must not inherit the event loop or the exchange's open connections.
+    pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        while True:
+            await asyncio.sleep(RETRAIN_INTERVAL_HOURS * 3600)
+            try:
+                result = await loop.run_in_executor(pool, retrain)
+            except Exception as e:
+                print(f"Retraining failed: {e}")
+                notifier.notify(f"🚨 *ERROR* (retraining): {escape_markdown(e)}", PRIORITY_ERROR)
+                continue
+            summary = format_result(result)
+            print(summary)
+            if result['accepted']:
+                swapped = swap_model(states)
+                notifier.notify(f"🧠 *Model updated* for {len(swapped)} symbols\n{escape_markdown(summary)}", PRIORITY_INFO)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 # --- REPORTING FUNCTION ---
-async def send_report(telegram_bot):
+def send_report(notifier):
     global portfolio
     uptime = datetime.utcnow() - portfolio['start_time']
     win_rate = (portfolio['wins'] / portfolio['total_trades'] * 100) if portfolio['total_trades'] > 0 else 0
-    pnl = portfolio['balance'] - 100.0
+    pnl = portfolio['balance'] - STARTING_BALANCE
     
     message = (
         f"📊 *Periodic Report*\n\n"
@@ -166,63 +294,194 @@ async def send_report(telegram_bot):
         f"Wins: {portfolio['wins']}\n"
         f"Losses: {portfolio['losses']}\n"
         f"Win Rate: {win_rate:.2f}%\n"
-        f"Open Trades: {len(portfolio['open_trades'])}"
+        f"Open Trades: {len(portfolio['positions'])}"
     )
-    await telegram_bot.send_message(message)
+    open_symbols = portfolio['positions'].open_symbols()
+    if open_symbols:
+        message += "\n" + "\n".join(f"  {symbol}: {portfolio['positions'].count(symbol)}" for symbol in open_symbols)
+    if shadows:
+        message += f"\n----------------------\nShadow models (paper only):\n```\n{shadows.report(portfolio)}\n```"
+    notifier.notify(message, PRIORITY_REPORT)
 
 # --- MAIN BOT LOOP ---
+async def run_symbol_cycle(state, notifier, bar):
+    """Runs after every candle close: fetch, manage open trades and look for an entry on the bar that just closed."""
+    if not await refresh_candles(state, int((bar.close_time + bar.lateness) * 1000)) or state.candles.last_price is None:
+        print(f"Could not fetch data for {state.symbol}.")
+        return
+
+    current_price = state.candles.last_price
+    state.last_price = current_price
+    await check_and_close_trades({state.symbol: current_price}, notifier)
+
+    # Only closed candles are committed to the stream; the forming one is ignored.
+    bar_open = (bar.close_time - TIMEFRAME_SECONDS) * 1000
+    with metrics.span('features'):
+        rows = state.candles.rows()
+        state.features.sync(rows)
+        if state.context is not None:
+            state.context.sync(rows)
+    if state.features.last_timestamp is None or state.features.last_timestamp < bar_open:
+        print(f"Candle {pd.Timestamp(bar_open, unit='ms')} of {state.symbol} is not published yet, no signal this bar.")
+        return
+    if bar.stale:
+        return
+
+    feature_vector = state.latest_features()
+    if len(portfolio['positions']) < portfolio['max_open_trades'] and feature_vector is not None:
+        # Buy row and sign-flipped sell row are scored together in one batched call.
+        with metrics.span('inference'):
+            buy_prob, sell_prob = state.model.predict_buy_sell(feature_vector)
+        market_clock.signal(state.symbol, bar.close_time, buy_prob, sell_prob)
+        if buy_prob >= state.threshold:
+            await open_trade('buy', current_price, notifier, state.symbol, state)
+        elif sell_prob >= state.threshold:
+            await open_trade('sell', current_price, notifier, state.symbol, state)
+    # Queued only; the shadows are scored after every symbol has decided (see on_candle_close).
+    shadows.submit(state.symbol, feature_vector, current_price, state.max_open_trades)
+
+async def monitor_open_trades(notifier):
+    """TP/SL check between candle closes: one price request covers every symbol with open (live or shadow) trades."""
+    symbols = sorted(set(portfolio['positions'].open_symbols()) | set(shadows.open_symbols()))
+    if not symbols:
+        return
+    with metrics.span('fetch_prices'):
+        prices = await exchange.fetch_prices(symbols)
+    await check_and_close_trades(prices, notifier)
+    shadows.check(prices)
+
+async def check_intrabar(batch, started, notifier):
+    """PriceMonitor callback: `batch` is {symbol: (low, high, last)} since the previous check, which began at `started`."""
+    if not len(portfolio['positions']) and not shadows:
+        return
+    prices = {symbol: last for symbol, (_, _, last) in batch.items()}
+    lows = {symbol: low for symbol, (low, _, _) in batch.items()}
+    highs = {symbol: high for symbol, (_, high, _) in batch.items()}
+    with metrics.span('intrabar_check'):
+        await check_and_close_trades(prices, notifier, lows, highs, started)
+    shadows.check(prices, lows, highs, started)
+
+async def reconcile_positions(symbols, notifier):
+    """Compares the recovered positions with the exchange's and flags every difference; nothing is changed automatically."""
+    try:
+        exchange_net = await exchange.fetch_net_positions(symbols)
+    except Exception as e:
+        print(f"Could not fetch exchange positions, skipping reconciliation: {e}")
+        return
+    mismatches = reconcile(portfolio['positions'], exchange_net)
+    for symbol, ours, theirs in mismatches:
+        message = f"⚠️ *POSITION MISMATCH* ({symbol}): journal {ours:+.6f}, exchange {theirs:+.6f}"
+        print(message)
+        notifier.notify(message, PRIORITY_ERROR)
+    if not mismatches:
+        print("Open positions match the exchange.")
+
 async def main():
-    print("Bot starting up in LIVE MAINNET PAPER TRADING MODE using ccxt Hyperliquid integration...")
-    model = joblib.load(MODEL_FILE)
-    telegram_bot = TelegramBot()
-    await telegram_bot.send_message("🤖 *Bot is now online (Hyperliquid Paper‑Trading via ccxt).*")
+    global exchange, market_clock
+    mode = 'LIVE TRADING (real orders)' if LIVE_TRADING else 'PAPER TRADING (orders filled locally)'
+    print(f"Bot starting up on {EXCHANGE} in {mode} mode...")
+    if MARKET_LOG_FILE and market_clock.passthrough:
+        market_clock = MarketRecorder(MARKET_LOG_FILE, journal)  # before recovery: it keeps the journal as found on disk
+    exchange = market_clock.wrap(exchange)
+    shadows.clock = market_clock.monotonic
+    start = time.perf_counter()
+    replayed = journal.recover(portfolio)
+    print(f"Recovered portfolio from '{journal.path}' in {(time.perf_counter() - start) * 1000:.1f} ms: "
+          f"balance ${portfolio['balance']:.2f}, {len(portfolio['positions'])} open positions, {replayed} records replayed.")
+    states = build_symbol_states()
+    # Telegram is only ever reached from the notifier's background task; the loop just enqueues.
+    notifier = Notifier(TelegramBot()).start()
+    notifier.notify(f"🤖 *Bot is now online ({EXCHANGE}, {'LIVE trading' if LIVE_TRADING else 'paper trading'}), "
+                    f"trading {len(states)} symbols.*", PRIORITY_INFO)
+    symbols = sorted({state.symbol for state in states} | set(portfolio['positions'].open_symbols()))
+    await reconcile_positions(symbols, notifier)
     
-    last_report_time = datetime.utcnow()
+    last_report_time = market_clock.now()  # the loop's clock, so report timing replays too
+
+    metrics.enabled = METRICS_ENABLED
+    metrics_server = await metrics.serve(METRICS_PORT) if METRICS_ENABLED and METRICS_PORT else None
+    # `kill -USR1 <pid>` profiles the next cycle into profiles/.
+    profiler = SamplingProfiler()
+    profiler.install_signal()
 
-    while True:
+    # Signals run just after each TIMEFRAME close; open trades are checked every MONITOR_INTERVAL in between.
+    scheduler = CandleScheduler(TIMEFRAME, close_delay=CANDLE_CLOSE_DELAY, monitor_interval=MONITOR_INTERVAL,
+                                max_lateness=MAX_SIGNAL_LATENESS, clock=market_clock.now, sleep=market_clock.sleep)
+
+    async def on_candle_close(bar):
+        nonlocal last_report_time
         try:
             ny_time = pd.to_datetime('now').tz_localize('UTC').tz_convert('America/New_York')
-            print(f"\n--- Cycle Start: {ny_time.strftime('%Y-%m-%d %H:%M:%S')} (NY Time) ---")
-            
-            candles_df = await get_hyperliquid_candles(symbol=MARKET_SYMBOL_CCXT, timeframe=TIMEFRAME)
-            if candles_df is None or candles_df.empty:
-                print("Could not fetch data, sleeping for 60 seconds...")
-                await asyncio.sleep(60)
-                continue
+            print(f"\n--- Cycle Start: {ny_time.strftime('%Y-%m-%d %H:%M:%S')} (NY Time), {bar.lateness:.1f}s after close ---")
+            if bar.missed:
+                print(f"Fell behind by {bar.missed} candles; their data is backfilled, only the newest is traded.")
+            if bar.stale:
+                print(f"Candle closed {bar.lateness:.0f}s ago, too late for new entries.")
+
+            # Every symbol runs concurrently on this event loop; one failing symbol does not stop the others.
+            profiler.cycle_start()
+            with metrics.span('cycle'):
+                results = await asyncio.gather(*(run_symbol_cycle(state, notifier, bar) for state in states), return_exceptions=True)
+            profiler.cycle_end()
+            # Shadows settle on the same prices, then score this bar in the background.
+            shadows.check({state.symbol: state.last_price for state in states if state.last_price is not None})
+            shadows.flush()
+            for state, result in zip(states, results):
+                if isinstance(result, Exception):
+                    print(f"An error occurred while processing {state.symbol}: {result}")
+                    notifier.notify(f"🚨 *ERROR* ({state.symbol}): {escape_markdown(result)}", PRIORITY_ERROR)
+
+            if market_clock.now() - last_report_time >= 12 * 3600:
+                send_report(notifier)
+                last_report_time = market_clock.now()
 
-            current_price = candles_df.iloc[-1]['close']
-            await check_and_close_trades(current_price, telegram_bot)
-
-            if len(portfolio['open_trades']) < portfolio['max_open_trades']:
-                features_df = calculate_features(candles_df.copy())
-                if not features_df.empty:
-                    latest_features = features_df.iloc[-1:][FEATURE_COLUMNS]
-                    
-                    buy_prob = model.predict_proba(latest_features)[0][1]
-                    if buy_prob >= PREDICTION_THRESHOLD:
-                        await open_trade('buy', current_price, telegram_bot)
-                    else:
-                        sell_features = latest_features.copy()
-                        directional_features = ['return_1', 'return_5', 'return_10']
-                        for col in directional_features:
-                            sell_features[col] = sell_features[col] * -1
-                        sell_prob = model.predict_proba(sell_features)[0][1]
-                        if sell_prob >= PREDICTION_THRESHOLD:
-                            await open_trade('sell', current_price, telegram_bot)
-
-            if datetime.utcnow() - last_report_time >= timedelta(hours=12):
-                await send_report(telegram_bot)
-                last_report_time = datetime.utcnow()
-
-            print(f"Current Price (BTC): ${current_price:,.2f}")
-            print(f"Current Balance: ${portfolio['balance']:.2f}, Open Trades: {len(portfolio['open_trades'])}")
-            print("Waiting 60 seconds...")
-            await asyncio.sleep(60)
+            for state in states:
+                if state.last_price is not None:
+                    print(f"Current Price ({state.symbol}): ${state.last_price:,.2f}")
+            print(f"Current Balance: ${portfolio['balance']:.2f}, Open Trades: {len(portfolio['positions'])}")
+            if metrics.enabled and METRICS_FILE:
+                metrics.write_textfile(METRICS_FILE)
 
         except Exception as e:
             print(f"An error occurred in the main loop: {e}")
-            await telegram_bot.send_message(f"🚨 *CRITICAL ERROR*: Bot loop failed with error: {e}")
-            await asyncio.sleep(60)
+            notifier.notify(f"🚨 *CRITICAL ERROR*: Bot loop failed with error: {escape_markdown(e)}", PRIORITY_ERROR)
+
+    # TP/SL on every streamed price update, independent of the candle cycle.
+    price_monitor = None
+    if INTRABAR_MONITOR and exchange.has_price_stream:
+        price_monitor = PriceMonitor(exchange, symbols, lambda batch, started: check_intrabar(batch, started, notifier), clock=market_clock.monotonic,
+                                     sleep=market_clock.pause, checkpoint=market_clock.checkpoint)
+    elif INTRABAR_MONITOR:
+        print("The exchange has no price stream; open trades are checked by polling only.")
+
+    async def on_monitor():
+        if price_monitor is not None and price_monitor.healthy():
+            return  # the stream already checks every update; poll only while it is down
+        try:
+            await monitor_open_trades(notifier)
+        except Exception as e:
+            print(f"An error occurred while monitoring open trades: {e}")
+            notifier.notify(f"🚨 *ERROR* (TP/SL monitor): {escape_markdown(e)}", PRIORITY_ERROR)
+
+    retrain_task = asyncio.create_task(retrain_loop(states, notifier)) if RETRAIN_INTERVAL_HOURS else None
+    price_task = asyncio.create_task(price_monitor.run()) if price_monitor is not None else None
+
+    try:
+        await scheduler.run(on_candle_close, on_monitor)
+    finally:
+        if retrain_task is not None:
+            retrain_task.cancel()
+        if price_task is not None:
+            price_task.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        journal.close()
+        if shadows:
+            await shadows.close()
+            print(f"Shadow models (paper only):\n{shadows.report(portfolio)}")
+        await notifier.stop()
+        await exchange.close()
+        market_clock.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+
+from scheduler import timeframe_seconds
+
+
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+# Hyperliquid answers at most 5000 candles per request.
+MAX_FETCH = 5000
+
+
+# --- ROLLING CANDLE CACHE ---
+class CandleCache:
+    """
+    The newest `size` closed candles of one symbol/timeframe, plus the
+    still-forming one.
+
+    The first refresh() backfills `size` candles. Every later refresh asks the
+    exchange only for candles since the newest closed one: normally that is
+    the bar that just closed and the new forming bar. The forming bar is
+    overwritten in place until it closes. If the delta does not continue the
+    series (an outage longer than the cache, or the exchange skipped bars), the
+    cache is rebuilt from a fresh backfill.
+
+    Closed candles live in preallocated NumPy columns; column() returns views
+    without copying.
+    """
+
+    def __init__(self, symbol, timeframe, size=25):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.period_ms = timeframe_seconds(timeframe) * 1000
+        self.size = size
+        self.capacity = 2 * size
+        self.timestamps = np.zeros(self.capacity, dtype=np.int64)
+        self.values = np.zeros((self.capacity, len(COLUMNS)), dtype=np.float64)
+        self.start = 0
+        self.end = 0
+        self.forming = None  # [timestamp, open, high, low, close, volume]
+        self.gaps = 0
+        self.fetched = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def last_closed(self):
+        """Open timestamp (ms) of the newest closed candle, or None."""
+        return int(self.timestamps[self.end - 1]) if len(self) else None
+
+    @property
+    def last_price(self):
+        if self.forming is not None:
+            return self.forming[4]
+        return float(self.values[self.end - 1, 3]) if len(self) else None
+
+    def column(self, name):
+        if name == 'timestamp':
+            return self.timestamps[self.start:self.end]
+        return self.values[self.start:self.end, COLUMNS.index(name)]
+
+    def rows(self, n=None):
+        """The newest `n` closed candles as (timestamp, open, high, low, close, volume) tuples."""
+        start = self.start if n is None else max(self.start, self.end - n)
+        return [(int(ts), *row) for ts, row in zip(self.timestamps[start:self.end], self.values[start:self.end].tolist())]
+
+    def clear(self):
+        self.start = self.end = 0
+        self.forming = None
+
+    def _append(self, rows):
+        if self.end + len(rows) > self.capacity:
+            # Compact: keep the newest size - len(rows) candles at the front.
+            keep = max(0, min(len(self), self.size - len(rows)))
+            self.timestamps[:keep] = self.timestamps[self.end - keep:self.end]
+            self.values[:keep] = self.values[self.end - keep:self.end]
+            self.start, self.end = 0, keep
+            rows = rows[-self.size:]
+        n = len(rows)
+        self.timestamps[self.end:self.end + n] = [row[0] for row in rows]
+        self.values[self.end:self.end + n] = [row[1:6] for row in rows]
+        self.end += n
+        self.start = max(self.start, self.end - self.size)
+
+    def apply(self, rows, now_ms):
+        """
+        Merges fetched OHLCV rows. Rows whose period has ended by `now_ms` are
+        closed; a newer one becomes the forming bar. Returns False when the rows
+        do not continue the cached series (the caller should backfill).
+        """
+        closed = [row for row in rows if row[0] + self.period_ms <= now_ms]
+        forming = [row for row in rows if row[0] + self.period_ms > now_ms]
+        last = self.last_closed
+        if last is not None:
+            closed = [row for row in closed if row[0] > last]
+            if closed and closed[0][0] != last + self.period_ms:
+                return False
+        for a, b in zip(closed, closed[1:]):
+            if b[0] != a[0] + self.period_ms:
+                return False
+        if closed:
+            self._append(closed)
+        if forming:
+            row = forming[-1]
+            if self.forming is not None and self.forming[0] == row[0]:
+                self.forming[1:] = row[1:6]
+            else:
+                self.forming = list(row[:6])
+        elif self.forming is not None and self.forming[0] + self.period_ms <= now_ms:
+            self.forming = None
+        return True
+
+    async def refresh(self, exchange, now_ms=None):
+        """Brings the cache up to `now_ms`; returns the number of newly closed candles."""
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        before = self.last_closed
+        if before is not None:
+            since = before + self.period_ms
+            missing = (now_ms - since) // self.period_ms + 1
+            if missing <= self.size:
+                rows = await exchange.fetch_ohlcv(self.symbol, self.timeframe, since, min(missing + 1, MAX_FETCH))
+                self.fetched += len(rows)
+                if self.apply(rows, now_ms):
+                    return self._new_since(before)
+            self.gaps += 1
+        self.clear()
+        rows = await exchange.fetch_ohlcv(self.symbol, self.timeframe, None, self.size + 1)
+        self.fetched += len(rows)
+        if not self.apply(rows, now_ms):
+            # The backfill itself has holes: keep only the newest contiguous run.
+            self.clear()
+            closed = [row for row in rows if row[0] + self.period_ms <= now_ms]
+            cut = len(closed) - 1
+            while cut > 0 and closed[cut][0] - closed[cut - 1][0] == self.period_ms:
+                cut -= 1
+            self.apply(closed[cut:] + [row for row in rows if row[0] + self.period_ms > now_ms], now_ms)
+        return self._new_since(before)
+
+    def _new_since(self, before):
+        if before is None or self.last_closed is None:
+            return len(self)
+        return (self.last_closed - before) // self.period_ms
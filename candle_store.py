@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from array_file import open_array_file, write_array_file
+
+
+STORE_DIR = 'candle_store'
+STORE_KIND = 'candles'
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+# --- COLUMNAR CANDLE STORE ---
+class CandleStore:
+    """
+    On-disk OHLCV history partitioned as <root>/<symbol>/<interval>/<YYYY-MM>.arr.
+    Each partition holds one int64 millisecond `timestamp` column and float64
+    price/volume columns, sorted and unique by timestamp. Partitions are
+    rewritten atomically, so an interrupted write never corrupts the store.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+
+    def _series_dir(self, symbol, interval):
+        return os.path.join(self.root, symbol, interval)
+
+    def partitions(self, symbol, interval):
+        series_dir = self._series_dir(symbol, interval)
+        if not os.path.isdir(series_dir):
+            return []
+        return sorted(os.path.join(series_dir, name) for name in os.listdir(series_dir) if name.endswith('.arr'))
+
+    def read_partition(self, path):
+        _, arrays = open_array_file(path, kind=STORE_KIND)
+        return arrays
+
+    def last_timestamp(self, symbol, interval):
+        """Open time (ms) of the newest stored candle, or None for an empty series."""
+        partitions = self.partitions(symbol, interval)
+        if not partitions:
+            return None
+        return int(self.read_partition(partitions[-1])['timestamp'][-1])
+
+    def append(self, symbol, interval, columns):
+        """
+        Merges candles into their month partitions. `columns` maps every name in
+        COLUMNS to an array. A candle already in the store is replaced by the new one.
+        """
+        timestamps = np.asarray(columns['timestamp'], dtype=np.int64)
+        if not len(timestamps):
+            return 0
+        months = pd.to_datetime(timestamps, unit='ms').strftime('%Y-%m').values
+        series_dir = self._series_dir(symbol, interval)
+        os.makedirs(series_dir, exist_ok=True)
+
+        for month in np.unique(months):
+            mask = months == month
+            new = {name: np.asarray(columns[name])[mask] for name in COLUMNS}
+            path = os.path.join(series_dir, f"{month}.arr")
+            if os.path.exists(path):
+                old = {name: np.array(arr) for name, arr in self.read_partition(path).items()}
+                merged = {name: np.concatenate([old[name], new[name]]) for name in COLUMNS}
+            else:
+                merged = new
+            # Keep the last occurrence of every timestamp (new data wins), in time order.
+            ts = merged['timestamp'].astype(np.int64)
+            order = np.lexsort((np.arange(len(ts)), ts))
+            last = np.r_[ts[order][1:] != ts[order][:-1], True]
+            keep = order[last]
+            write_array_file(path, STORE_KIND, {'symbol': symbol, 'interval': interval, 'month': str(month)}, {
+                'timestamp': ts[keep],
+                **{name: merged[name][keep].astype(np.float64) for name in COLUMNS[1:]},
+            })
+        return len(timestamps)
+
+    def load(self, symbol, interval, start_ms=None, end_ms=None):
+        """All stored candles of a series (optionally within [start_ms, end_ms]) as one dict of arrays."""
+        parts = [self.read_partition(path) for path in self.partitions(symbol, interval)]
+        if not parts:
+            return {name: np.empty(0, dtype=np.int64 if name == 'timestamp' else np.float64) for name in COLUMNS}
+        columns = {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+        mask = np.ones(len(columns['timestamp']), dtype=bool)
+        if start_ms is not None:
+            mask &= columns['timestamp'] >= start_ms
+        if end_ms is not None:
+            mask &= columns['timestamp'] <= end_ms
+        return {name: arr[mask] for name, arr in columns.items()}
+
+    def to_dataframe(self, symbol, interval, start_ms=None, end_ms=None):
+        """Same layout as btc_15m_data.csv: a datetime `timestamp` plus OHLCV columns."""
+        df = pd.DataFrame(self.load(symbol, interval, start_ms, end_ms))
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
@@ -0,0 +1,331 @@
+import argparse
+import glob
+import hashlib
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from candle_store import CandleStore, STORE_DIR, COLUMNS
+from config import MODEL_FILE, MODEL_ARTIFACT_FILE, PREDICTION_THRESHOLD, FEATURE_COLUMNS, CONTEXT_TIMEFRAMES, TIMEFRAME
+from config import LABEL_RISK_PERCENT, LABEL_RR_RATIO, LABEL_LOOKAHEAD
+from create_master_dataset import build_master_frame
+from dataset_store import Dataset, save_dataset, load_dataset
+from model_artifact import file_sha256
+from resampler import timestamps_ms
+from streaming_features import ContextFeatures, VOLATILITY_WINDOW
+
+
+SHARD_DIR = 'master_training_data.shards'
+DEFAULT_CHUNK_ROWS = 100_000
+DEFAULT_MAX_TRAIN_ROWS = 1_000_000
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far, in MB. VmHWM belongs to the
+    running image; ru_maxrss (the fallback off Linux) also counts the parent's
+    memory at fork time for a spawned worker.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# --- OVERLAPPING CHUNKS ---
+def feature_lookback():
+    """
+    Candles a feature row reads before its own: return_10 and volatility_10
+    look 10 closes back, and context features need ContextFeatures' warm-up.
+    """
+    lookback = VOLATILITY_WINDOW
+    if CONTEXT_TIMEFRAMES:
+        lookback = max(lookback, ContextFeatures().warmup_candles())
+    return lookback
+
+
+def csv_pieces(path, rows=DEFAULT_CHUNK_ROWS):
+    """An OHLCV CSV (btc_15m_data.csv layout) as consecutive column dicts of `rows` candles."""
+    for chunk in pd.read_csv(path, chunksize=rows):
+        yield {'timestamp': timestamps_ms(chunk['timestamp']), **{c: chunk[c].values.astype(np.float64) for c in COLUMNS[1:]}}
+
+
+def store_pieces(store, symbol, interval):
+    """A candle store series one month partition at a time, copied out so each mapping is released."""
+    for path in store.partitions(symbol, interval):
+        arrays = store.read_partition(path)
+        yield {name: np.array(arrays[name]) for name in COLUMNS}
+
+
+def overlapping_chunks(pieces, chunk_rows, back, ahead):
+    """
+    Regroups consecutive column pieces into windows of `chunk_rows` core rows
+    with up to `back` rows before and `ahead` rows after them. Yields
+    (window, core_start, core_end), the core as indices into the window.
+    Every core row then sees the same history and the same future as in one
+    big frame, so rolling features and forward labels are exact at chunk
+    borders. At most back + chunk_rows + ahead rows plus one incoming piece
+    are held at a time.
+    """
+    buffer, core = None, 0
+
+    def window(core_start, core_end):
+        n = len(buffer['timestamp'])
+        start, end = max(core_start - back, 0), min(core_end + ahead, n)
+        return {name: values[start:end] for name, values in buffer.items()}, core_start - start, core_end - start
+
+    for piece in pieces:
+        buffer = piece if buffer is None else {name: np.concatenate([buffer[name], piece[name]]) for name in buffer}
+        while len(buffer['timestamp']) - core >= chunk_rows + ahead:
+            yield window(core, core + chunk_rows)
+            core += chunk_rows
+            drop = max(core - back, 0)
+            buffer = {name: values[drop:] for name, values in buffer.items()}
+            core -= drop
+    if buffer is not None and len(buffer['timestamp']) > core:
+        yield window(core, len(buffer['timestamp']))
+
+
+# --- SHARDED BUILD ---
+def window_rows(window, core_start, core_end, risk_percent=LABEL_RISK_PERCENT, rr_ratio=LABEL_RR_RATIO, lookahead=LABEL_LOOKAHEAD):
+    """The core rows of one window as create_master_dataset builds them: buy rows, then sign-flipped sell rows, NaN rows dropped."""
+    df = pd.DataFrame(window)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    buy, sell = build_master_frame(df, risk_percent, rr_ratio, lookahead)
+    core = slice(core_start, core_end)
+    frame = pd.concat([buy.iloc[core], sell.iloc[core]], ignore_index=True)
+    frame.insert(0, 'timestamp', np.tile(df['timestamp'].values[core], 2))
+    return frame.dropna()
+
+
+def build_shards(pieces, out_dir, name, chunk_rows=DEFAULT_CHUNK_ROWS, risk_percent=LABEL_RISK_PERCENT,
+                 rr_ratio=LABEL_RR_RATIO, lookahead=LABEL_LOOKAHEAD, provenance=None):
+    """
+    Streams one candle series through overlapping_chunks() and writes every
+    chunk's training rows to <out_dir>/<name>-<chunk>.dset as soon as it is
+    built. Returns [(path, rows)].
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    shards = []
+    chunks = overlapping_chunks(pieces, chunk_rows, feature_lookback(), lookahead)
+    for i, (window, core_start, core_end) in enumerate(chunks):
+        frame = window_rows(window, core_start, core_end, risk_percent, rr_ratio, lookahead)
+        path = os.path.join(out_dir, f"{name}-{i:05d}.dset")
+        save_dataset(Dataset.from_dataframe(frame, {
+            **(provenance or {}), 'series': name, 'chunk': i,
+            'first_timestamp': int(window['timestamp'][core_start]), 'last_timestamp': int(window['timestamp'][core_end - 1]),
+            'rr_ratio': rr_ratio, 'risk_percent': risk_percent, 'lookahead_candles': lookahead,
+        }), path)
+        shards.append((path, len(frame)))
+    return shards
+
+
+def shard_paths(shard_dir=SHARD_DIR):
+    return sorted(glob.glob(os.path.join(shard_dir, '*.dset')))
+
+
+def clear_shards(shard_dir):
+    for path in shard_paths(shard_dir):
+        os.remove(path)
+
+
+# --- BOUNDED-MEMORY TRAINING ---
+def train_from_shards(paths, n_estimators=100, trees_per_round=25, max_rows=DEFAULT_MAX_TRAIN_ROWS, random_state=42):
+    """
+    Grows a RandomForestClassifier (train_unified_model.py's settings) over
+    any number of shards while holding at most `max_rows` training rows.
+    Each round draws a uniform sample of at most `max_rows` rows across all
+    shards, reading the memory-mapped shards one at a time, then adds
+    `trees_per_round` trees fitted on it (warm_start). With max_rows >= the
+    dataset every round sees all rows: a plain fit. Class balancing uses the
+    class counts of the whole dataset as sample weights, as
+    class_weight='balanced' would. Returns (model, stats).
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    sizes, positives = [], 0
+    for path in paths:
+        dataset = load_dataset(path)
+        if dataset.feature_columns != FEATURE_COLUMNS:
+            raise ValueError(f"'{path}' has features {dataset.feature_columns}, expected {FEATURE_COLUMNS}")
+        sizes.append(len(dataset))
+        positives += int(dataset.label().sum(dtype=np.int64))
+    sizes = np.array(sizes, dtype=np.int64)
+    total = int(sizes.sum())
+    if not total or positives in (0, total):
+        raise ValueError(f"{total} rows with {positives} positive labels: nothing to train on")
+    class_weight = total / (2 * np.array([total - positives, positives], dtype=np.float64))
+
+    sample_rows = min(max_rows, total)
+    X = np.empty((sample_rows, len(FEATURE_COLUMNS)), dtype=np.float32)
+    y = np.empty(sample_rows, dtype=np.int8)
+    rng = np.random.default_rng(random_state)
+    model, grown, rounds = None, 0, 0
+    while grown < n_estimators:
+        counts = rng.multivariate_hypergeometric(sizes, sample_rows) if sample_rows < total else sizes
+        offset = 0
+        for path, count in zip(paths, counts.tolist()):
+            if not count:
+                continue
+            dataset = load_dataset(path)
+            rows = np.sort(rng.choice(len(dataset), count, replace=False)) if count < len(dataset) else slice(None)
+            X[offset:offset + count] = dataset.features[rows]
+            y[offset:offset + count] = dataset.label()[rows]
+            offset += count
+            del dataset  # unmap the shard before the next one is read
+        grown = min(grown + trees_per_round, n_estimators)
+        if model is None:
+            model = RandomForestClassifier(n_estimators=grown, random_state=random_state, n_jobs=-1, warm_start=True)
+        else:
+            model.set_params(n_estimators=grown)
+        model.fit(X, y, sample_weight=class_weight[y])
+        rounds += 1
+    return model, {'rows': total, 'positives': positives, 'shards': len(paths), 'sample_rows': sample_rows,
+                   'sample_mb': (X.nbytes + y.nbytes) / 2**20, 'rounds': rounds}
+
+
+def shards_hash(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(file_sha256(path).encode('ascii'))
+    return digest.hexdigest()
+
+
+# --- STAGES ---
+def build_stage(source, out_dir, chunk_rows, symbols=None, interval=TIMEFRAME, store_root=STORE_DIR):
+    """Builds shards from a CSV file or, with `symbols`, from the candle store; returns a summary with the peak RSS."""
+    start, baseline = time.perf_counter(), peak_rss_mb()
+    clear_shards(out_dir)
+    shards = []
+    if symbols:
+        store = CandleStore(store_root)
+        for symbol in symbols:
+            shards += build_shards(store_pieces(store, symbol, interval), out_dir, f"{symbol}-{interval}", chunk_rows,
+                                   provenance={'source': store_root, 'symbol': symbol, 'interval': interval})
+    else:
+        name = os.path.splitext(os.path.basename(source))[0]
+        shards += build_shards(csv_pieces(source, chunk_rows), out_dir, name, chunk_rows,
+                               provenance={'source': source, 'source_sha256': file_sha256(source)})
+    return {'shards': len(shards), 'rows': sum(rows for _, rows in shards), 'seconds': time.perf_counter() - start,
+            'baseline_rss_mb': baseline, 'peak_rss_mb': peak_rss_mb()}
+
+
+def train_stage(shard_dir, model_file, artifact_file, n_estimators, trees_per_round, max_rows):
+    """Trains on every shard of `shard_dir`, writes the joblib model and the forest artifact; returns a summary."""
+    import joblib
+    import sklearn.ensemble  # noqa: F401 (imported before the baseline is taken)
+
+    from forest_inference import CompiledForest
+    from model_artifact import export_forest
+
+    start, baseline = time.perf_counter(), peak_rss_mb()
+    paths = shard_paths(shard_dir)
+    model, stats = train_from_shards(paths, n_estimators, trees_per_round, max_rows)
+    if model_file:
+        joblib.dump(model, model_file)
+    if artifact_file:
+        export_forest(CompiledForest.from_sklearn(model), artifact_file, PREDICTION_THRESHOLD, shards_hash(paths))
+    return {**stats, 'seconds': time.perf_counter() - start, 'baseline_rss_mb': baseline, 'peak_rss_mb': peak_rss_mb()}
+
+
+def in_memory_stage(source, out_file):
+    """create_master_dataset.main() on the same source, for the memory comparison in `check`."""
+    start, baseline = time.perf_counter(), peak_rss_mb()
+    buy, sell = build_master_frame(pd.read_csv(source))
+    master_df = pd.concat([buy, sell], ignore_index=True).dropna()
+    save_dataset(Dataset.from_dataframe(master_df), out_file)
+    return {'rows': len(master_df), 'seconds': time.perf_counter() - start, 'baseline_rss_mb': baseline, 'peak_rss_mb': peak_rss_mb()}
+
+
+def memory_line(result):
+    return f"peak RSS {result['peak_rss_mb']:.0f} MB ({result['peak_rss_mb'] - result['baseline_rss_mb']:+.0f} MB over the imports)"
+
+
+def _in_child(fn, *args):
+    # Each stage runs in a fresh process, so its peak RSS is its own.
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def check(rows, chunk_rows, max_train_rows, n_estimators):
+    """Chunked vs in-memory build on synthetic candles: identical rows, and each stage's peak memory."""
+    from benchmarks import synthetic_ohlcv
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'candles.csv')
+        synthetic_ohlcv(rows).to_csv(source, index=False)
+        print(f"Synthetic source: {rows:,} candles, {os.path.getsize(source) / 2**20:.0f} MB CSV")
+
+        reference_file, shard_dir = os.path.join(tmp, 'master.dset'), os.path.join(tmp, 'shards')
+        reference = _in_child(in_memory_stage, source, reference_file)
+        print(f"In-memory build: {reference['rows']:,} rows in {reference['seconds']:.1f} s, {memory_line(reference)}")
+        built = _in_child(build_stage, source, shard_dir, chunk_rows)
+        print(f"Chunked build:   {built['rows']:,} rows in {built['shards']} shards of {chunk_rows:,} candles "
+              f"in {built['seconds']:.1f} s, {memory_line(built)}")
+
+        # The in-memory build lists every buy row, then every sell row; each shard holds its buy half, then its sell half.
+        shards = [load_dataset(path) for path in shard_paths(shard_dir)]
+        halves = [np.split(np.arange(len(s)), 2) for s in shards]
+        features = np.concatenate([s.features[h[side]] for side in (0, 1) for s, h in zip(shards, halves)])
+        labels = np.concatenate([s.label()[h[side]] for side in (0, 1) for s, h in zip(shards, halves)])
+        expected = load_dataset(reference_file)
+        same_shape = features.shape == expected.features.shape
+        print(f"Rows identical: {same_shape and np.array_equal(labels, expected.label())} labels, "
+              f"features max abs difference {np.abs(features - expected.features).max() if same_shape else float('nan'):.3e}")
+        del shards, features, labels, expected
+
+        trained = _in_child(train_stage, shard_dir, None, None, n_estimators, max(1, n_estimators // 4), max_train_rows)
+        print(f"Chunked training: {n_estimators} trees in {trained['rounds']} rounds on samples of {trained['sample_rows']:,} of "
+              f"{trained['rows']:,} rows ({trained['sample_mb']:.0f} MB buffer) in {trained['seconds']:.1f} s, "
+              f"{memory_line(trained)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Out-of-core training data build and bounded-memory training.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='write training shards from a CSV or the candle store')
+    build_parser.add_argument('--source', default='btc_15m_data.csv', help='OHLCV CSV (ignored with --symbols)')
+    build_parser.add_argument('--symbols', nargs='*', help='candle store series to build from instead, e.g. BTCUSDT ETHUSDT')
+    build_parser.add_argument('--interval', default=TIMEFRAME)
+    build_parser.add_argument('--out', default=SHARD_DIR)
+    build_parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help='candles per shard')
+    train_parser = commands.add_parser('train', help='train the model from the shards with bounded memory')
+    train_parser.add_argument('--shards', default=SHARD_DIR)
+    train_parser.add_argument('--max-rows', type=int, default=DEFAULT_MAX_TRAIN_ROWS, help='training rows held in memory')
+    train_parser.add_argument('--trees', type=int, default=100)
+    train_parser.add_argument('--trees-per-round', type=int, default=25)
+    check_parser = commands.add_parser('check', help='compare the chunked and in-memory builds on synthetic data')
+    check_parser.add_argument('--rows', type=int, default=500_000)
+    check_parser.add_argument('--chunk-rows', type=int, default=50_000)
+    check_parser.add_argument('--max-rows', type=int, default=100_000)
+    check_parser.add_argument('--trees', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        source = f"candle store {args.symbols} {args.interval}" if args.symbols else f"'{args.source}'"
+        print(f"--- Building training shards from {source} into '{args.out}' ---")
+        result = build_stage(args.source, args.out, args.chunk_rows, args.symbols, args.interval)
+        print(f"{result['rows']:,} rows in {result['shards']} shards in {result['seconds']:.1f} s, {memory_line(result)}")
+    elif args.command == 'train':
+        print(f"--- Training from '{args.shards}' with at most {args.max_rows:,} rows in memory ---")
+        result = train_stage(args.shards, MODEL_FILE, MODEL_ARTIFACT_FILE, args.trees, args.trees_per_round, args.max_rows)
+        print(f"{args.trees} trees in {result['rounds']} rounds on samples of {result['sample_rows']:,} of {result['rows']:,} rows "
+              f"({result['sample_mb']:.0f} MB buffer) in {result['seconds']:.1f} s, {memory_line(result)}")
+        print(f"Model saved to '{MODEL_FILE}', fast-start artifact to '{MODEL_ARTIFACT_FILE}'.")
+    else:
+        print("--- Chunked vs in-memory pipeline ---")
+        check(args.rows, args.chunk_rows, args.max_rows, args.trees)
+
+
+if __name__ == "__main__":
+    main()
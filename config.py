@@ -0,0 +1,84 @@
+# --- SHARED CONFIGURATION ---
+# Values the live bot and the offline scripts must agree on.
+MODEL_FILE = 'master_model.joblib'
+MODEL_ARTIFACT_FILE = 'master_model.forest'
+TRAINING_DATA_FILE = 'master_training_data.dset'
+PREDICTION_THRESHOLD = 0.45
+BASE_FEATURE_COLUMNS = ['return_1', 'return_5', 'return_10', 'volume_change_1', 'volume_change_5', 'candle_range', 'volatility_10']
+# Higher-timeframe context resampled from TIMEFRAME candles (resampler.py, streaming_features.ContextFeatures).
+# Every timeframe adds one column per CONTEXT_FEATURES entry, e.g. 'return_1_4h'; changing either list
+# means rebuilding the dataset and retraining the model.
+CONTEXT_TIMEFRAMES = []         # e.g. ['1h', '4h']
+CONTEXT_FEATURES = ['return_1', 'volatility_10']
+FEATURE_COLUMNS = BASE_FEATURE_COLUMNS + [f"{name}_{tf}" for tf in CONTEXT_TIMEFRAMES for name in CONTEXT_FEATURES]
+# The sell side is scored on the same model with these features sign-flipped (see create_master_dataset.py).
+DIRECTIONAL_FEATURES = ['return_1', 'return_5', 'return_10'] + [f"return_1_{tf}" for tf in CONTEXT_TIMEFRAMES]
+
+# --- EXCHANGE ---
+# 'hyperliquid' or 'injective' (exchange_client.create_exchange). Symbols use the ccxt form on both
+# venues: Injective's 'BTC/USDT PERP' market is 'BTC/USDT:USDT'. Credentials come from .env
+# (HYPERLIQUID_WALLET_ADDRESS / HYPERLIQUID_PRIVATE_KEY, INJ_PRIVATE_KEY).
+EXCHANGE = 'hyperliquid'
+LIVE_TRADING = False                # False: paper trading, orders are filled locally at the reference price and never sent
+INJECTIVE_NETWORK = 'mainnet'       # or 'testnet'
+MARKET_CACHE_FILE = 'market_cache.json'   # symbol -> market id / precision per venue, reused across restarts
+MARKET_CACHE_TTL_HOURS = 24
+
+# --- MULTI-SYMBOL TRADING ---
+TIMEFRAME = '15m'
+# Symbols the bot trades concurrently (Hyperliquid USDC perps). Every entry may override
+# 'threshold', 'max_open_trades' and 'model_file' (a forest artifact); otherwise the shared
+# model, PREDICTION_THRESHOLD and the portfolio-wide trade cap apply. The shared model is trained
+# on BTC only: roadmap Step 12 repeats data, training and tuning per coin, so add a coin once its
+# own model exists, e.g. {'symbol': 'ETH/USDC:USDC', 'model_file': 'eth_model.forest'}.
+SYMBOLS = [
+    {'symbol': 'BTC/USDC:USDC'},
+]
+
+# --- PORTFOLIO & RISK RULES ---
+# Used by the live bot and by anything that replays its rules offline (backtest, threshold tuning).
+STARTING_BALANCE = 100.0
+MAX_OPEN_TRADES = 2             # across all symbols
+MAX_EXPOSURE_MULTIPLE = 2.0     # cap on total open notional as a multiple of balance; None disables it
+RISK_PER_TRADE_PERCENT = 0.02
+RR_RATIO = 3.0
+FEE_PERCENT = 0.0005
+
+# --- TELEMETRY ---
+METRICS_ENABLED = False              # spans/counters in the trading loop; off costs one attribute check per span
+METRICS_FILE = 'bot_metrics.prom'    # Prometheus text file rewritten after every cycle (None to skip)
+METRICS_PORT = None                  # e.g. 9108 to also serve the metrics on http://127.0.0.1:<port>/
+
+# --- SCHEDULING ---
+CANDLE_CLOSE_DELAY = 1.0        # seconds after a TIMEFRAME close before the signal cycle runs
+MONITOR_INTERVAL = 10.0         # TP/SL check cadence between closes, in seconds
+MAX_SIGNAL_LATENESS = 30.0      # no new entries from a bar processed later than this after its close
+INTRABAR_MONITOR = True         # check TP/SL on every websocket price update; polling covers stream outages
+
+# --- PERSISTENCE ---
+JOURNAL_FILE = 'portfolio.journal'   # append-only portfolio journal; snapshots go to JOURNAL_FILE + '.snapshot'
+MARKET_LOG_FILE = None               # e.g. 'market_data.log' records every payload and clock reading the loop receives,
+                                     # for market_log.py to replay; opt-in, as the file grows until rotated or deleted
+
+# --- LABELING ---
+# Triple-barrier parameters the training labels are built with (create_master_dataset.py, retrain.py).
+LABEL_RISK_PERCENT = 0.005
+LABEL_RR_RATIO = 3.0
+LABEL_LOOKAHEAD = 100
+
+# --- RETRAINING ---
+RETRAIN_INTERVAL_HOURS = None   # hours between background walk-forward retraining runs in the bot; None disables it
+RETRAIN_SYMBOL = 'BTCUSDT'      # Binance series in the candle store the model is trained on
+RETRAIN_WINDOW_DAYS = 30
+RETRAIN_HOLDOUT_DAYS = 3
+RETRAIN_ADD_TREES = 25          # trees added per run with warm_start...
+RETRAIN_MAX_TREES = 300         # ...until the forest would exceed this, then it is refitted from scratch
+RETRAIN_MIN_TRADES = 10         # a candidate must take at least this many holdout trades
+
+# --- SHADOW MODELS ---
+# Candidates scored on the live feature vectors and traded on paper only, e.g.
+#   {'name': 'thr-0.45', 'threshold': 0.45}
+#   {'name': 'candidate', 'model_file': 'candidate_model.forest'}
+# 'model_file' defaults to MODEL_ARTIFACT_FILE and 'threshold' to PREDICTION_THRESHOLD.
+SHADOW_MODELS = []
+SHADOW_WORKERS = 1              # processes scoring the shadows; 0 scores them inline on the event loop
@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from array_file import open_array_file, write_array_file
+from config import FEATURE_COLUMNS
+from model_artifact import file_sha256
+
+
+DATASET_KIND = 'dataset'
+DATASET_EXTENSION = '.dset'
+# CSV intermediates of the pipeline; raw price files (btc_15m_data.csv, ...) belong to the candle store instead.
+INTERMEDIATE_CSVS = [
+    'btc_15m_features.csv', 'btc_15m_labeled.csv', 'master_training_data.csv',
+    'normal_processed.csv', 'inverted_processed.csv',
+    'X_test.csv', 'y_test.csv',
+    'X_buy_train.csv', 'X_buy_test.csv', 'y_buy_train.csv', 'y_buy_test.csv',
+    'X_sell_train.csv', 'X_sell_test.csv', 'y_sell_train.csv', 'y_sell_test.csv',
+]
+
+
+# --- DATASET ---
+class Dataset:
+    """
+    A training table stored as typed columns:
+    - `features`: one C-contiguous (n, k) float32 matrix, exactly what sklearn trains on;
+    - `labels`: int8 columns (every column whose name starts with 'label');
+    - `timestamp`: int64 milliseconds, when the source had one;
+    - `extra`: any other numeric column (e.g. OHLCV) kept as float64.
+    Loaded datasets are read-only views into a memory map; nothing is copied.
+    """
+
+    def __init__(self, feature_columns, features, labels, timestamp=None, extra=None, provenance=None):
+        self.feature_columns = list(feature_columns)
+        self.features = features
+        self.labels = labels
+        self.timestamp = timestamp
+        self.extra = extra or {}
+        self.provenance = provenance or {}
+
+    def __len__(self):
+        return len(self.features)
+
+    def label(self, name='label'):
+        return self.labels[name]
+
+    @classmethod
+    def from_dataframe(cls, df, provenance=None):
+        feature_columns = [c for c in df.columns if c in FEATURE_COLUMNS]
+        label_columns = [c for c in df.columns if c.startswith('label')]
+        extra_columns = [c for c in df.columns if c not in feature_columns and c not in label_columns and c != 'timestamp']
+        features = np.ascontiguousarray(df[feature_columns].values, dtype=np.float32).reshape(len(df), len(feature_columns))
+        timestamp = None
+        if 'timestamp' in df.columns:
+            timestamp = pd.to_datetime(df['timestamp']).values.astype('datetime64[ms]').astype(np.int64)
+        return cls(feature_columns, features,
+                   {c: df[c].values.astype(np.int8) for c in label_columns},
+                   timestamp,
+                   {c: df[c].values.astype(np.float64) for c in extra_columns},
+                   provenance)
+
+    def to_dataframe(self):
+        df = pd.DataFrame(self.features, columns=self.feature_columns)
+        if self.timestamp is not None:
+            df.insert(0, 'timestamp', pd.to_datetime(self.timestamp, unit='ms'))
+        for name, values in self.extra.items():
+            df[name] = values
+        for name, values in self.labels.items():
+            df[name] = values
+        return df
+
+
+def save_dataset(dataset, path):
+    arrays = {'features': dataset.features}
+    arrays.update({f"label:{name}": values for name, values in dataset.labels.items()})
+    arrays.update({f"extra:{name}": values for name, values in dataset.extra.items()})
+    if dataset.timestamp is not None:
+        arrays['timestamp'] = dataset.timestamp
+    meta = {
+        'schema': {
+            'feature_columns': dataset.feature_columns,
+            'label_columns': list(dataset.labels),
+            'extra_columns': list(dataset.extra),
+            'has_timestamp': dataset.timestamp is not None,
+        },
+        'provenance': {
+            'rows': len(dataset),
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'created_by': os.path.basename(sys.argv[0]) or 'python',
+            **dataset.provenance,
+        },
+    }
+    write_array_file(path, DATASET_KIND, meta, arrays)
+
+
+def load_dataset(path):
+    meta, arrays = open_array_file(path, kind=DATASET_KIND)
+    schema = meta['schema']
+    return Dataset(schema['feature_columns'], arrays['features'],
+                   {name: arrays[f"label:{name}"] for name in schema['label_columns']},
+                   arrays.get('timestamp'),
+                   {name: arrays[f"extra:{name}"] for name in schema['extra_columns']},
+                   meta['provenance'])
+
+
+def dataset_path(csv_path):
+    return os.path.splitext(csv_path)[0] + DATASET_EXTENSION
+
+
+def convert_csv(csv_path, out_path=None):
+    """One-time conversion of a pipeline CSV; its sha256 is kept in the provenance header."""
+    out_path = out_path or dataset_path(csv_path)
+    df = pd.read_csv(csv_path)
+    save_dataset(Dataset.from_dataframe(df, {'source': csv_path, 'source_sha256': file_sha256(csv_path)}), out_path)
+    return out_path
+
+
+def main():
+    print("--- Converting CSV intermediates to memory-mapped datasets ---")
+    for csv_path in INTERMEDIATE_CSVS:
+        if not os.path.exists(csv_path):
+            continue
+        out_path = convert_csv(csv_path)
+
+        start = time.perf_counter()
+        pd.read_csv(csv_path)
+        csv_time = time.perf_counter() - start
+        start = time.perf_counter()
+        dataset = load_dataset(out_path)
+        dataset.features.sum()
+        load_time = time.perf_counter() - start
+
+        print(f"{csv_path:<26} -> {out_path:<27} {os.path.getsize(csv_path) / 1024:7.1f} KB -> "
+              f"{os.path.getsize(out_path) / 1024:7.1f} KB, read {csv_time * 1000:6.2f} ms -> {load_time * 1000:5.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,520 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+import uuid
+from decimal import Decimal, ROUND_DOWN
+
+import ccxt.async_support as ccxt_async
+import ccxt.pro as ccxt_pro
+from ccxt.base.errors import OrderNotFound
+from dotenv import load_dotenv
+
+from config import EXCHANGE, INJECTIVE_NETWORK, LIVE_TRADING, MARKET_CACHE_FILE, MARKET_CACHE_TTL_HOURS
+from scheduler import timeframe_seconds
+
+
+# --- MARKET METADATA CACHE ---
+class MarketCache:
+    """
+    Market metadata per venue (symbol -> market id, precision, limits) in one
+    JSON file with a TTL. A restart within the TTL reuses it instead of
+    downloading every market again; a missing, stale or unreadable entry is
+    fetched and the file rewritten atomically.
+    """
+
+    def __init__(self, path=MARKET_CACHE_FILE, ttl_hours=MARKET_CACHE_TTL_HOURS, clock=time.time):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.clock = clock
+        self.entries = self._read()
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, venue):
+        entry = self.entries.get(venue)
+        if entry is None or self.clock() - entry['fetched_at'] > self.ttl:
+            return None
+        return entry['markets']
+
+    def put(self, venue, markets):
+        self.entries[venue] = {'fetched_at': self.clock(), 'markets': markets}
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+
+    async def load(self, venue, fetch):
+        """The cached markets of `venue`; `await fetch()` only runs when the entry is missing or stale."""
+        markets = self.get(venue)
+        if markets is None:
+            markets = await fetch()
+            self.put(venue, markets)
+        return markets
+
+
+# --- ASYNC EXCHANGE ADAPTER ---
+class AsyncExchange:
+    """
+    Native asyncio access to Hyperliquid through ccxt.async_support. The
+    underlying aiohttp session is persistent and pooled, so every request of
+    every symbol reuses the same connections and no call ties up a thread.
+
+    This is also the interface every venue implements (candles as
+    [ms, open, high, low, close, volume] rows, prices, orders, balances,
+    positions, market metadata); see InjectiveExchange and create_exchange().
+    With a `market_cache` the ccxt markets come from it, so a warm start
+    makes no market request, for the REST and the websocket client alike.
+
+    With `paper` set, market_order() and close_positions() never reach the
+    exchange: every order fills at once at its reference price, locally.
+    """
+
+    venue = 'hyperliquid'
+    # Whether watch_prices() exists; without it the bot checks TP/SL by polling only.
+    has_price_stream = True
+    paper = False
+
+    def __init__(self, client=None, fill_timeout=5.0, poll_interval=0.25, market_cache=None, paper=False):
+        self.client = client or ccxt_async.hyperliquid({'enableRateLimit': True})
+        self.paper = paper
+        self.stream_client = None
+        self.fill_timeout = fill_timeout
+        self.poll_interval = poll_interval
+        self.market_cache = market_cache
+
+    async def load_markets(self):
+        if not self.client.markets:
+            if self.market_cache is None:
+                await self.client.load_markets()
+            else:
+                cached = await self.market_cache.load(self.venue, self._fetch_markets)
+                self.client.set_markets(cached['markets'], cached['currencies'])
+        return self.client.markets
+
+    async def _fetch_markets(self):
+        await self.client.load_markets(reload=True)
+        return {'markets': self.client.markets, 'currencies': self.client.currencies}
+
+    async def market(self, symbol):
+        """Venue market id, tick sizes and minimum amount of a symbol, in the same shape for every venue."""
+        market = (await self.load_markets())[symbol]
+        return {'symbol': symbol, 'id': market['id'], 'price_precision': market['precision']['price'],
+                'amount_precision': market['precision']['amount'], 'min_amount': market['limits']['amount']['min']}
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        await self.load_markets()
+        return await self.client.fetch_ohlcv(symbol, timeframe, since, limit)
+
+    async def fetch_prices(self, symbols):
+        """Last traded price of several symbols in one request."""
+        await self.load_markets()
+        tickers = await self.client.fetch_tickers(symbols)
+        # Hyperliquid tickers may carry only the mid price.
+        return {symbol: tickers[symbol]['last'] or tickers[symbol]['close'] for symbol in symbols if symbol in tickers}
+
+    async def watch_prices(self, symbols):
+        """
+        Price updates as (symbol, price, timestamp ms) from Hyperliquid's
+        websocket ticker feed, for as long as the connection lives. The
+        websocket client is separate from the REST one and opened on first use.
+        """
+        if self.stream_client is None:
+            self.stream_client = ccxt_pro.hyperliquid({'enableRateLimit': True})
+            await self.load_markets()
+            self.stream_client.set_markets(self.client.markets, self.client.currencies)
+        while True:
+            tickers = await self.stream_client.watch_tickers(symbols)
+            for symbol, ticker in tickers.items():
+                price = ticker['last'] or ticker['close']
+                if price:
+                    yield symbol, price, ticker['timestamp'] or int(time.time() * 1000)
+
+    async def fetch_net_positions(self, symbols):
+        """Signed open size per symbol (+ long, - short); needs account credentials."""
+        await self.load_markets()
+        positions = await self.client.fetch_positions(symbols)
+        net = {}
+        for position in positions:
+            sign = 1 if position['side'] == 'long' else -1
+            net[position['symbol']] = net.get(position['symbol'], 0.0) + sign * (position['contracts'] or 0.0)
+        return net
+
+    async def fetch_balance(self):
+        """Total balance per currency, e.g. {'USDC': 100.0}; needs account credentials."""
+        await self.load_markets()
+        balance = await self.client.fetch_balance()
+        return {currency: total for currency, total in balance['total'].items() if total}
+
+    async def create_order(self, symbol, order_type, side, amount, price=None, reduce_only=False):
+        # Hyperliquid derives its market-order slippage bound from `price`.
+        await self.load_markets()
+        return await self.client.create_order(symbol, order_type, side, amount, price, {'reduceOnly': True} if reduce_only else {})
+
+    async def fetch_order(self, order_id, symbol):
+        await self.load_markets()
+        return await self.client.fetch_order(order_id, symbol)
+
+    async def confirm_fill(self, order, symbol, amount):
+        """Polls the order until it is fully filled or `fill_timeout` passes. Returns (order, filled)."""
+        deadline = time.monotonic() + self.fill_timeout
+        while True:
+            if order.get('status') == 'closed' or (order.get('filled') or 0) >= amount:
+                return order, True
+            if order.get('status') in ('canceled', 'rejected', 'expired') or time.monotonic() >= deadline or not order.get('id'):
+                return order, False
+            await asyncio.sleep(self.poll_interval)
+            order = await self.fetch_order(order['id'], symbol)
+
+    async def market_order(self, symbol, side, amount, price=None, reduce_only=False):
+        """Places a market order and waits for its fill confirmation."""
+        if self.paper:
+            return {'id': f"paper-{uuid.uuid4().hex[:12]}", 'symbol': symbol, 'type': 'market', 'side': side, 'amount': amount,
+                    'price': price, 'filled': amount, 'status': 'closed'}, True
+        order = await self.create_order(symbol, 'market', side, amount, price, reduce_only)
+        return await self.confirm_fill(order, symbol, amount)
+
+    async def close_positions(self, closes):
+        """
+        Sends the reverse market orders for several positions at once.
+        `closes` is a list of (symbol, side, amount, price); the result holds,
+        in the same order, either (order, filled) or the exception raised.
+        The orders are reduce-only, so a close can never open a position.
+        """
+        return await asyncio.gather(*(self.market_order(symbol, side, amount, price, reduce_only=True)
+                                      for symbol, side, amount, price in closes),
+                                    return_exceptions=True)
+
+    async def close(self):
+        if self.stream_client is not None:
+            await self.stream_client.close()
+        await self.client.close()
+
+
+# --- INJECTIVE ADAPTER ---
+def injective_symbol(ticker):
+    """ccxt-style symbol of an Injective perpetual: 'BTC/USDT PERP' -> 'BTC/USDT:USDT'."""
+    pair = ticker.rsplit(' ', 1)[0]
+    return f"{pair}:{pair.split('/')[1]}"
+
+
+def _field(obj, *names):
+    # pyinjective hands back dicts from some calls and attribute objects from others
+    # (compare test_data_fetch.py with check_injective_connection.py).
+    for name in names:
+        if isinstance(obj, dict):
+            if name in obj:
+                return obj[name]
+        elif hasattr(obj, name):
+            return getattr(obj, name)
+    raise KeyError(names[0])
+
+
+def _to_tick(value, tick):
+    tick = Decimal(str(tick))
+    return (Decimal(str(value)) / tick).to_integral_value(ROUND_DOWN) * tick
+
+
+def injective_candle_rows(candles):
+    """fetch_derivative_candles() candles as the [ms, open, high, low, close, volume] rows ccxt returns, oldest first."""
+    rows = [[int(_field(c, 'start_time', 'startTime')) * 1000,
+             *(float(_field(c, name)) for name in ('open', 'high', 'low', 'close', 'volume'))] for c in candles]
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+class InjectiveExchange(AsyncExchange):
+    """
+    The AsyncExchange interface on Injective perpetuals through pyinjective.
+    One AsyncClient (plus one composer and, with a private key, one
+    transaction broadcaster) lives as long as the adapter. Symbols use the
+    ccxt form ('BTC/USDT:USDT' for the 'BTC/USDT PERP' market); their market
+    ids and tick sizes come from the market cache (one entry per network),
+    so a warm start makes no market lookup at all.
+
+    Market orders are matched at the end of the block their transaction lands
+    in, and whatever does not match is cancelled. An accepted transaction is
+    therefore only an open order; fetch_order() reads its fills from the
+    indexer's trade and order history, by the client order id (cid) the
+    order was placed with. There is no price stream here: the bot checks
+    TP/SL by polling.
+    """
+
+    venue = 'injective'
+    has_price_stream = False
+    # Worst price a market order accepts, as a fraction beyond the reference price (ccxt's Hyperliquid default).
+    market_slippage = 0.05
+
+    def __init__(self, network=INJECTIVE_NETWORK, private_key_hex=None, fill_timeout=5.0, poll_interval=0.25, market_cache=None,
+                 paper=False):
+        # pyinjective is only needed when this venue is selected.
+        from pyinjective.async_client import AsyncClient
+        from pyinjective.core.network import Network
+
+        self.network_name = network
+        self.network = getattr(Network, network)()
+        self.client = AsyncClient(self.network)
+        self.paper = paper
+        self.stream_client = None
+        self.fill_timeout = fill_timeout
+        self.poll_interval = poll_interval
+        self.market_cache = market_cache
+        self.markets = None
+        self.composer = None
+        self.broadcaster = None
+        self.private_key_hex = private_key_hex
+        self.orders = {}
+        self.address = self.subaccount_id = None
+        if private_key_hex:
+            from pyinjective.wallet import PrivateKey
+
+            self.address = PrivateKey.from_hex(private_key_hex).to_public_key().to_address()
+            self.subaccount_id = self.address.get_subaccount_id(index=0)
+
+    async def load_markets(self):
+        if self.markets is None:
+            if self.market_cache is None:
+                self.markets = await self._fetch_markets()
+            else:
+                # Market ids and tick sizes differ between mainnet and testnet.
+                self.markets = await self.market_cache.load(f"{self.venue}-{self.network_name}", self._fetch_markets)
+        return self.markets
+
+    async def _fetch_markets(self):
+        response = await self.client.fetch_derivative_markets()
+        markets = {}
+        for market in response['markets']:
+            if not market['ticker'].endswith(' PERP'):
+                continue
+            quote = market['quoteTokenMeta']
+            # Derivative prices are quoted in the quote token's smallest unit, quantities in whole contracts.
+            markets[injective_symbol(market['ticker'])] = {
+                'id': market['marketId'],
+                'ticker': market['ticker'],
+                'price_precision': float(market['minPriceTickSize']) / 10 ** int(quote['decimals']),
+                'amount_precision': float(market['minQuantityTickSize']),
+                'min_amount': float(market['minQuantityTickSize']),
+                'quote': quote['symbol'],
+                'quote_denom': market['quoteDenom'],
+                'quote_decimals': int(quote['decimals']),
+            }
+        return markets
+
+    async def market(self, symbol):
+        market = (await self.load_markets())[symbol]
+        return {'symbol': symbol, 'id': market['id'], 'price_precision': market['price_precision'],
+                'amount_precision': market['amount_precision'], 'min_amount': market['min_amount']}
+
+    def _require_key(self):
+        if self.address is None:
+            raise ccxt_async.AuthenticationError("InjectiveExchange needs a private key (INJ_PRIVATE_KEY) for account calls")
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        market = await self.market(symbol)
+        kwargs = {'limit': limit} if limit else {}
+        response = await self.client.fetch_derivative_candles(market_id=market['id'], resolution=timeframe_seconds(timeframe), **kwargs)
+        rows = injective_candle_rows(_field(response, 'candles'))
+        return [row for row in rows if row[0] >= since] if since is not None else rows
+
+    async def fetch_prices(self, symbols):
+        """Close of the newest 1m candle of every symbol, fetched concurrently."""
+        results = await asyncio.gather(*(self.fetch_ohlcv(symbol, '1m', limit=1) for symbol in symbols), return_exceptions=True)
+        return {symbol: rows[-1][4] for symbol, rows in zip(symbols, results) if not isinstance(rows, Exception) and rows}
+
+    async def fetch_balance(self):
+        self._require_key()
+        markets = await self.load_markets()
+        decimals = {m['quote_denom']: (m['quote'], m['quote_decimals']) for m in markets.values()}
+        response = await self.client.fetch_subaccount_balances_list(subaccount_id=self.subaccount_id)
+        balances = {}
+        for balance in response['balances']:
+            denom = _field(balance, 'denom')
+            total = float(_field(_field(balance, 'deposit'), 'totalBalance', 'total_balance'))
+            name, scale = decimals.get(denom, (denom, 0))
+            if total:
+                balances[name] = total / 10 ** scale
+        return balances
+
+    async def fetch_net_positions(self, symbols):
+        self._require_key()
+        markets = await self.load_markets()
+        by_id = {m['id']: symbol for symbol, m in markets.items()}
+        response = await self.client.fetch_derivative_positions_v2(subaccount_id=self.subaccount_id)
+        net = {}
+        for position in response['positions']:
+            symbol = by_id.get(position['marketId'])
+            if symbol in symbols:
+                sign = 1 if position['direction'] == 'long' else -1
+                net[symbol] = net.get(symbol, 0.0) + sign * float(position['quantity'])
+        return net
+
+    async def _broadcaster(self):
+        if self.broadcaster is None:
+            from pyinjective.core.broadcaster import MsgBroadcasterWithPk
+
+            self.composer = await self.client.composer()
+            self.broadcaster = MsgBroadcasterWithPk.new_using_simulation(network=self.network, private_key=self.private_key_hex)
+        return self.broadcaster
+
+    async def create_order(self, symbol, order_type, side, amount, price=None, reduce_only=False):
+        self._require_key()
+        if order_type != 'market' or price is None:
+            raise ccxt_async.NotSupported("InjectiveExchange only places market orders with a reference price")
+        market = await self.market(symbol)
+        broadcaster = await self._broadcaster()
+        # The chain rejects prices and quantities off the market's tick sizes.
+        quantity = _to_tick(amount, market['amount_precision'])
+        if quantity <= 0:
+            raise ccxt_async.InvalidOrder(f"{amount} {symbol} is below the minimum quantity {market['amount_precision']}")
+        worst_price = _to_tick(price * ((1 + self.market_slippage) if side == 'buy' else (1 - self.market_slippage)), market['price_precision'])
+        sender = self.address.to_acc_bech32()
+        cid = str(uuid.uuid4())
+        message = self.composer.msg_create_derivative_market_order(
+            sender=sender, market_id=market['id'], subaccount_id=self.subaccount_id, fee_recipient=sender,
+            price=worst_price, quantity=quantity,
+            margin=self.composer.calculate_margin(quantity=quantity, price=worst_price, leverage=Decimal(1), is_reduce_only=reduce_only),
+            order_type='BUY' if side == 'buy' else 'SELL', cid=cid)
+        result = await broadcaster.broadcast([message])
+        tx = result.get('txResponse', {})
+        order = {'id': cid, 'symbol': symbol, 'type': order_type, 'side': side, 'amount': float(quantity), 'price': price,
+                 'filled': 0.0, 'status': 'open', 'info': result}
+        if int(tx.get('code', 0)) != 0:
+            return {**order, 'status': 'rejected'}
+        self.orders[cid] = order
+        return order
+
+    async def fetch_order(self, order_id, symbol):
+        """An order placed by create_order(), with its fills so far; `order_id` is its cid."""
+        self._require_key()
+        if order_id not in self.orders:
+            raise OrderNotFound(order_id)
+        market = await self.market(symbol)
+        trades, history = await asyncio.gather(
+            self.client.fetch_derivative_trades(market_ids=[market['id']], subaccount_ids=[self.subaccount_id], cid=order_id),
+            self.client.fetch_derivative_orders_history(subaccount_id=self.subaccount_id, market_ids=[market['id']], cid=order_id))
+        order = dict(self.orders[order_id])
+        order['filled'] = sum(float(_field(_field(trade, 'positionDelta', 'position_delta'), 'executionQuantity', 'execution_quantity'))
+                              for trade in _field(trades, 'trades')) or 0.0
+        states = [_field(entry, 'state') for entry in _field(history, 'orders')]
+        # The indexer may not have the order yet: it stays open until confirm_fill() times out.
+        if 'filled' in states or order['filled'] >= order['amount']:
+            order.update(status='closed', filled=max(order['filled'], order['amount']))
+        elif 'canceled' in states:
+            order['status'] = 'canceled'
+        if order['status'] != 'open':
+            del self.orders[order_id]
+        return order
+
+    async def close(self):
+        # AsyncClient has no close(); its channels end with the process.
+        pass
+
+
+# --- LOCAL FAKE EXCHANGE ---
+class FakeExchange(AsyncExchange):
+    """
+    In-process stand-in for tests and benchmarks. Every call waits `latency`
+    seconds; orders fill after `fill_delay`. Candles come from `candles`
+    (a list of OHLCV rows): the last `limit` rows, or the first `limit` rows
+    from `since` on, like the exchange. There is no price stream; the bot
+    falls back to polling (price_stream.ReplayPriceStream replays ticks).
+    """
+
+    has_price_stream = False
+
+    def __init__(self, candles=None, latency=0.05, fill_delay=0.0, fail_orders=False, poll_interval=0.01):
+        self.client = None
+        self.market_cache = None
+        self.fill_timeout = max(1.0, fill_delay * 4)
+        self.poll_interval = poll_interval
+        self.candles = candles or []
+        self.latency = latency
+        self.fill_delay = fill_delay
+        self.fail_orders = fail_orders
+        self.orders = {}
+        self._ids = itertools.count(1)
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        await asyncio.sleep(self.latency)
+        if since is None:
+            rows = self.candles[-limit:] if limit else self.candles
+        else:
+            rows = [c for c in self.candles if c[0] >= since]
+            rows = rows[:limit] if limit else rows
+        return [list(c) for c in rows]
+
+    async def fetch_prices(self, symbols):
+        await asyncio.sleep(self.latency)
+        return {symbol: self.candles[-1][4] for symbol in symbols} if self.candles else {}
+
+    async def load_markets(self):
+        return {}
+
+    async def market(self, symbol):
+        return {'symbol': symbol, 'id': symbol, 'price_precision': None, 'amount_precision': None, 'min_amount': None}
+
+    async def fetch_balance(self):
+        await asyncio.sleep(self.latency)
+        return {}
+
+    async def fetch_net_positions(self, symbols):
+        await asyncio.sleep(self.latency)
+        net = {}
+        for order in self.orders.values():
+            if order['symbol'] in symbols and order['filled']:
+                net[order['symbol']] = net.get(order['symbol'], 0.0) + (order['filled'] if order['side'] == 'buy' else -order['filled'])
+        return {symbol: size for symbol, size in net.items() if abs(size) > 1e-12}
+
+    async def create_order(self, symbol, order_type, side, amount, price=None, reduce_only=False):
+        await asyncio.sleep(self.latency)
+        if self.fail_orders:
+            raise ccxt_async.ExchangeError("fake exchange rejected the order")
+        order_id = str(next(self._ids))
+        self.orders[order_id] = {'id': order_id, 'symbol': symbol, 'type': order_type, 'side': side, 'amount': amount,
+                                 'price': price, 'filled': 0.0, 'status': 'open', 'created': time.monotonic()}
+        return await self.fetch_order(order_id, symbol, wait=False)
+
+    async def fetch_order(self, order_id, symbol, wait=True):
+        if wait:
+            await asyncio.sleep(self.latency)
+        if order_id not in self.orders:
+            raise OrderNotFound(order_id)
+        order = self.orders[order_id]
+        if order['status'] == 'open' and time.monotonic() - order['created'] >= self.fill_delay:
+            order.update(status='closed', filled=order['amount'])
+        return dict(order)
+
+    async def close(self):
+        pass
+
+
+# --- VENUE SELECTION ---
+def create_exchange(venue=EXCHANGE, market_cache=None, live_trading=LIVE_TRADING):
+    """
+    The adapter of `venue` ('hyperliquid' or 'injective') with its
+    credentials from .env, sharing the MARKET_CACHE_FILE market cache.
+    Unless `live_trading`, orders are paper fills and the Hyperliquid client
+    only gets the wallet address (enough to read positions and balances).
+    """
+    load_dotenv()
+    market_cache = market_cache or MarketCache()
+    if venue == 'hyperliquid':
+        options = {'enableRateLimit': True}
+        if os.getenv('HYPERLIQUID_WALLET_ADDRESS'):
+            options.update(walletAddress=os.getenv('HYPERLIQUID_WALLET_ADDRESS'))
+            if live_trading:
+                options.update(privateKey=os.getenv('HYPERLIQUID_PRIVATE_KEY'))
+        return AsyncExchange(ccxt_async.hyperliquid(options), market_cache=market_cache, paper=not live_trading)
+    if venue == 'injective':
+        # Paper mode keeps the key: balances and positions are read for its subaccount, and no order is ever signed.
+        return InjectiveExchange(INJECTIVE_NETWORK, os.getenv('INJ_PRIVATE_KEY'), market_cache=market_cache, paper=not live_trading)
+    raise ValueError(f"Unknown exchange '{venue}' (expected 'hyperliquid' or 'injective')")
@@ -1,59 +1,278 @@
+import argparse
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import requests
-import pandas as pd
+
+from candle_store import CandleStore, COLUMNS
+from config import SYMBOLS
+
+
+BINANCE_API_URL = 'https://api.binance.com'
+KLINES_PATH = '/api/v3/klines'
+MAX_LIMIT = 1000
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '12h': 43_200_000, '1d': 86_400_000,
+}
+
+
+# --- HTTP LAYER (pluggable) ---
+class HttpError(Exception):
+    def __init__(self, status, message='', retry_after=None):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RequestsTransport:
+    """
+    Default transport: one pooled requests.Session. Anything with a
+    get_json(url, params) method that raises HttpError (or a
+    requests.RequestException) on failure can replace it, e.g. a client for a
+    local stub server in tests.
+    """
+
+    def __init__(self, pool_size=8, timeout=10):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.timeout = timeout
+
+    def get_json(self, url, params):
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            retry_after = response.headers.get('Retry-After')
+            raise HttpError(response.status_code, response.text[:200], float(retry_after) if retry_after else None)
+        return response.json()
+
+
+def _is_retryable(error):
+    if isinstance(error, HttpError):
+        # 418/429 are Binance's rate-limit answers; 5xx are transient server errors.
+        return error.status in (418, 429) or error.status >= 500
+    return isinstance(error, requests.RequestException)
+
+
+def get_with_retry(transport, url, params, max_retries=5, backoff=1.0):
+    for attempt in range(max_retries + 1):
+        try:
+            return transport.get_json(url, params)
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            delay = getattr(e, 'retry_after', None) or backoff * (2 ** attempt)
+            print(f"  Request failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+# --- KLINES DOWNLOADER ---
+class KlinesDownloader:
+    """
+    Brings every (symbol, interval) series in a CandleStore up to date.
+
+    A series resumes from its newest stored candle; an empty one starts at
+    `since_ms` if given, else from the first candle Binance has. The missing range is cut into
+    MAX_LIMIT-candle windows that are fetched concurrently on a bounded thread
+    pool. Windows are committed to the store strictly in time order, so an
+    interrupted run always resumes without holes. Only closed candles are
+    stored.
+    """
+
+    def __init__(self, store, transport=None, base_url=BINANCE_API_URL, max_workers=4, flush_rows=50_000):
+        self.store = store
+        self.transport = transport or RequestsTransport(pool_size=max_workers)
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.flush_rows = flush_rows
+
+    def _klines(self, symbol, interval, start_ms, limit=MAX_LIMIT):
+        params = {'symbol': symbol, 'interval': interval, 'startTime': start_ms, 'limit': limit}
+        return get_with_retry(self.transport, self.base_url + KLINES_PATH, params)
+
+    def first_available(self, symbol, interval):
+        first = self._klines(symbol, interval, 0, limit=1)
+        return int(first[0][0]) if first else None
+
+    def _windows(self, symbol, interval, now_ms, since_ms=None):
+        step = INTERVAL_MS[interval]
+        last = self.store.last_timestamp(symbol, interval)
+        if last is not None:
+            start = last + step
+        elif since_ms is not None:
+            start = -(-since_ms // step) * step  # first candle open at or after since_ms
+        else:
+            start = self.first_available(symbol, interval)
+        if start is None:
+            return []
+        # Newest candle that has fully closed.
+        end = (now_ms // step) * step - step
+        return list(range(start, end + 1, step * MAX_LIMIT))
+
+    def sync(self, symbols, intervals, now_ms=None, since_ms=None):
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        totals = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for symbol in symbols:
+                for interval in intervals:
+                    totals[(symbol, interval)] = self._sync_series(pool, symbol, interval, now_ms, since_ms)
+        return totals
+
+    def _sync_series(self, pool, symbol, interval, now_ms, since_ms=None):
+        windows = self._windows(symbol, interval, now_ms, since_ms)
+        # At most 2 * max_workers windows are in flight or waiting to be committed, so memory stays bounded.
+        in_flight = 2 * self.max_workers
+        futures = [pool.submit(self._klines, symbol, interval, start) for start in windows[:in_flight]]
+        buffered, stored = [], 0
+        for i in range(len(windows)):
+            rows = futures[i].result()
+            futures[i] = None
+            if i + in_flight < len(windows):
+                futures.append(pool.submit(self._klines, symbol, interval, windows[i + in_flight]))
+            buffered.extend(row for row in rows if int(row[6]) < now_ms)  # row[6] = close time
+            if len(buffered) >= self.flush_rows:
+                stored += self._flush(symbol, interval, buffered)
+                buffered = []
+        if buffered:
+            stored += self._flush(symbol, interval, buffered)
+        print(f"{symbol} {interval}: {stored} new candles")
+        return stored
+
+    def _flush(self, symbol, interval, rows):
+        data = np.array([row[:6] for row in rows], dtype=np.float64)
+        columns = {name: data[:, i] for i, name in enumerate(COLUMNS)}
+        columns['timestamp'] = np.array([int(row[0]) for row in rows], dtype=np.int64)
+        return self.store.append(symbol, interval, columns)
+
+
+# --- SELF-CHECK ---
+class StubTransport:
+    """
+    Binance's klines endpoint over in-memory candles, for check(): same
+    startTime/limit semantics and row layout, and a seeded share of requests
+    answered with 429 (a tiny Retry-After, so retries cost no time).
+    """
+
+    def __init__(self, series, fail_rate=0.1, seed=0):
+        self.series = series  # (symbol, interval) -> list of Binance kline rows, oldest first
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = self.rate_limited = 0
+
+    def get_json(self, url, params):
+        with self.lock:
+            self.requests += 1
+            if self.random.random() < self.fail_rate:
+                self.rate_limited += 1
+                raise HttpError(429, 'Too many requests', retry_after=0.001)
+        rows = self.series.get((params['symbol'], params['interval']), [])
+        first = np.searchsorted([row[0] for row in rows], params['startTime'])
+        return rows[first:first + params['limit']]
+
+
+def stub_klines(n, interval, start_ms, seed):
+    """`n` synthetic candles as Binance returns them: prices and volume as strings, plus the close time."""
+    from benchmarks import synthetic_ohlcv
+
+    df = synthetic_ohlcv(n, seed=seed)
+    step = INTERVAL_MS[interval]
+    return [[start_ms + i * step, *(f"{value:.8f}" for value in values), start_ms + (i + 1) * step - 1]
+            for i, values in enumerate(zip(df['open'], df['high'], df['low'], df['close'], df['volume']))]
+
+
+def check(candles=20_000, delta=5_000, fail_rate=0.1):
+    """Full sync, delta sync and no-op rerun against StubTransport; the store must match the source exactly."""
+    interval, step = '15m', INTERVAL_MS['15m']
+    start_ms = 1_600_000_000_000 // step * step
+    source = {(symbol, interval): stub_klines(candles + delta, interval, start_ms, seed)
+              for seed, symbol in enumerate(('AAAUSDT', 'BBBUSDT'))}
+    symbols = [symbol for symbol, _ in source]
+    transport = StubTransport({}, fail_rate)
+    ok = True
+    with tempfile.TemporaryDirectory() as root:
+        store = CandleStore(root)
+        downloader = KlinesDownloader(store, transport, max_workers=4, flush_rows=7_000)
+        # Binance only serves closed candles up to `now`; the last stub candle is still forming.
+        stages = (('full', candles), ('delta', candles + delta), ('no-op', candles + delta))
+        for name, available in stages:
+            transport.series = {key: rows[:available] for key, rows in source.items()}
+            now_ms = start_ms + (available - 1) * step + step // 2
+            requests, limited = transport.requests, transport.rate_limited
+            begin = time.perf_counter()
+            totals = downloader.sync(symbols, [interval], now_ms)
+            elapsed = time.perf_counter() - begin
+            same = True
+            for symbol in symbols:
+                stored = store.load(symbol, interval)
+                expected = np.array(source[(symbol, interval)][:available - 1], dtype=np.float64)
+                same &= (len(stored['timestamp']) == len(expected)
+                         and np.array_equal(stored['timestamp'], expected[:, 0].astype(np.int64))
+                         and all(np.array_equal(stored[column], expected[:, i + 1]) for i, column in enumerate(COLUMNS[1:])))
+            ok &= same
+            print(f"{name:<6} sync: {sum(totals.values()):6d} new candles, {transport.requests - requests:3d} requests "
+                  f"({transport.rate_limited - limited} answered 429) in {elapsed:.2f} s; store identical to the source: {same}")
+
+        # An empty store synced with since_ms (as retrain() does) only fetches from there on.
+        store = CandleStore(root + '/bounded')
+        since_ms = now_ms - 30 * 86_400_000
+        requests = transport.requests
+        KlinesDownloader(store, transport).sync(symbols[:1], [interval], now_ms, since_ms=since_ms)
+        stored = store.load(symbols[0], interval)['timestamp']
+        bounded = len(stored) and stored[0] == -(-since_ms // step) * step and stored[-1] == start_ms + (available - 2) * step
+        ok &= bool(bounded)
+        print(f"since_ms sync of an empty store: {len(stored)} candles from the last 30 days, {transport.requests - requests} requests; "
+              f"starts at since_ms and ends at the last closed candle: {bool(bounded)}")
+    return ok
+
 
 def main():
+    parser = argparse.ArgumentParser(description='Sync Binance klines into the candle store and export btc_15m_data.csv.')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('sync', help='the default: sync every configured symbol')
+    check_parser = commands.add_parser('check', help='sync from a stub transport that rate-limits, and verify the store')
+    check_parser.add_argument('--candles', type=int, default=20_000)
+    check_parser.add_argument('--delta', type=int, default=5_000)
+    check_parser.add_argument('--fail-rate', type=float, default=0.1)
+    args = parser.parse_args()
+    if args.command == 'check':
+        print("--- KlinesDownloader against a rate-limiting stub ---")
+        ok = check(args.candles, args.delta, args.fail_rate)
+        print("All stages match." if ok else "MISMATCH between the store and the source.")
+        return
+
     # --- Configuration ---
-    symbol = 'BTCUSDT'
-    interval = '15m'
-    limit = 1000
+    symbols = [entry['symbol'].split('/')[0] + 'USDT' for entry in SYMBOLS]
+    intervals = ['15m']
+    csv_symbol, csv_interval = 'BTCUSDT', '15m'
     output_filename = 'btc_15m_data.csv'
 
-    # Binance API endpoint for historical klines (candles)
-    url = f"https://api.binance.com/api/v3/klines?symbol={symbol}&interval={interval}&limit={limit}"
-
-    print(f"--- Fetching real-world data from Binance for {symbol} ({interval}) ---")
+    print(f"--- Syncing Binance klines for {len(symbols)} symbols ({', '.join(intervals)}) ---")
 
     try:
-        # Make the request to Binance's public API
-        response = requests.get(url)
-        # Raise an error if the request was not successful
-        response.raise_for_status() 
-
-        data = response.json()
-
-        # The data comes as a list of lists. We need to structure it.
-        # Define the column names based on Binance API documentation
-        columns = [
-            'timestamp', 'open', 'high', 'low', 'close', 'volume', 
-            'close_time', 'quote_asset_volume', 'number_of_trades', 
-            'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-        ]
-        
-        df = pd.DataFrame(data, columns=columns)
-
-        # --- Data Cleaning & Formatting ---
-        # We only need the essential columns
-        df = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']]
-
-        # Convert timestamp to a readable datetime format
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-
-        # Convert price and volume columns to numeric types
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = pd.to_numeric(df[col])
-
-        # Save the clean data to a CSV file
+        store = CandleStore()
+        downloader = KlinesDownloader(store)
+        start = time.perf_counter()
+        totals = downloader.sync(symbols, intervals)
+        print(f"\nSynced {sum(totals.values())} new candles in {time.perf_counter() - start:.1f}s.")
+
+        # The rest of the pipeline still starts from the BTC CSV.
+        df = store.to_dataframe(csv_symbol, csv_interval)
         df.to_csv(output_filename, index=False)
 
-        print(f"\nSUCCESS: Data fetch complete.")
-        print(f"Saved {len(df)} rows of real-world data to '{output_filename}'.")
+        print(f"\nSUCCESS: Saved {len(df)} rows of {csv_symbol} {csv_interval} data to '{output_filename}'.")
         print("\n--- Data Sample ---")
-        print(df.head())
+        print(df.tail())
         print("-------------------")
 
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, HttpError) as e:
         print(f"\nSCRIPT FAILED: An error occurred while fetching data from Binance.")
         print(f"Error details: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
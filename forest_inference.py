@@ -0,0 +1,135 @@
+import time
+
+import numpy as np
+
+from config import MODEL_FILE, FEATURE_COLUMNS, DIRECTIONAL_FEATURES
+
+
+SELL_SIGN = np.array([-1.0 if col in DIRECTIONAL_FEATURES else 1.0 for col in FEATURE_COLUMNS])
+
+
+# --- COMPILED FOREST ---
+class CompiledForest:
+    """
+    A RandomForestClassifier flattened into contiguous node arrays. Every tree's
+    nodes live in one global index space; leaves point back to themselves, so a
+    fixed number of vectorized steps walks every (row, tree) pair to its leaf.
+
+    `child[2 * node + 1]` is the left child (taken when x <= threshold) and
+    `child[2 * node]` the right one. `value` holds the class-1 probability of
+    each node, and `roots` the first node of every tree.
+    """
+
+    def __init__(self, feature, threshold, child, value, roots, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.child = child
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            node_ids = np.arange(n, dtype=np.int32)
+            is_leaf = tree.children_left < 0
+
+            left = np.where(is_leaf, node_ids, tree.children_left).astype(np.int32) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right).astype(np.int32) + offset
+            child = np.empty(2 * n, dtype=np.int32)
+            child[0::2], child[1::2] = right, left
+
+            proba = tree.value[:, 0, :]
+            proba = proba / proba.sum(axis=1, keepdims=True)
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            # A leaf compares against +inf and therefore always "goes left" to itself.
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(child)
+            values.append(proba[:, 1])
+            roots.append(offset)
+            offset += n
+
+        max_depth = max(estimator.tree_.max_depth for estimator in model.estimators_)
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(children),
+                   np.concatenate(values), np.array(roots, dtype=np.int32), max_depth, model.n_features_in_)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict_proba1(self, X):
+        """Class-1 probability for every row of a 2D array (same as predict_proba(X)[:, 1])."""
+        # sklearn compares float32 inputs against float64 thresholds; do the same for identical splits.
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.int32) * self.n_features, self.n_trees)
+        node = np.tile(self.roots, n_rows)
+
+        for _ in range(self.max_depth):
+            go_left = flat_X[row_offset + self.feature[node]] <= self.threshold[node]
+            node = self.child[2 * node + go_left]
+
+        return self.value[node].reshape(n_rows, self.n_trees).mean(axis=1)
+
+    def predict_buy_sell(self, feature_vector):
+        """Scores the buy row and the sign-flipped sell row in one batched call."""
+        feature_vector = np.asarray(feature_vector, dtype=np.float64)
+        probs = self.predict_proba1(np.stack([feature_vector, feature_vector * SELL_SIGN]))
+        return probs[0], probs[1]
+
+
+def main():
+    import joblib
+    import pandas as pd
+
+    from dataset_store import load_dataset
+
+    model_file = MODEL_FILE
+    x_test_file = 'X_test.dset'
+    repeats = 2000
+
+    print(f"--- Compiled forest: parity and latency against {model_file} ---")
+    model = joblib.load(model_file)
+    forest = CompiledForest.from_sklearn(model)
+    print(f"Trees: {forest.n_trees}, nodes: {len(forest.value)}, max depth: {forest.max_depth}")
+
+    # --- Parity ---
+    X = load_dataset(x_test_file).to_dataframe()[FEATURE_COLUMNS]
+    X_all = np.vstack([X.values, X.values * SELL_SIGN])
+    expected = model.predict_proba(pd.DataFrame(X_all, columns=FEATURE_COLUMNS))[:, 1]
+    actual = forest.predict_proba1(X_all)
+    print(f"\nRows compared: {len(X_all)}")
+    print(f"Max abs difference vs predict_proba: {np.max(np.abs(expected - actual)):.3e}")
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-12,
+                               err_msg="Compiled forest disagrees with predict_proba")
+
+    # --- Microbenchmark: the bot's decision (one buy row + one sell row) ---
+    row = X.iloc[:1]
+    sell_row = row * SELL_SIGN
+    start = time.perf_counter()
+    for _ in range(repeats // 20):
+        model.predict_proba(row)[0][1]
+        model.predict_proba(sell_row)[0][1]
+    sklearn_us = (time.perf_counter() - start) / (repeats // 20) * 1e6
+
+    vector = row.values[0]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        forest.predict_buy_sell(vector)
+    compiled_us = (time.perf_counter() - start) / repeats * 1e6
+
+    print("\n--- Buy + sell decision latency ---")
+    print(f"  sklearn (2 x predict_proba): {sklearn_us:,.1f} us")
+    print(f"  compiled forest (1 batched call): {compiled_us:,.1f} us")
+    print(f"  Speed-up: {sklearn_us / compiled_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
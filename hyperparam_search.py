@@ -0,0 +1,315 @@
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from array_file import ALIGNMENT
+from config import FEATURE_COLUMNS, DIRECTIONAL_FEATURES, PREDICTION_THRESHOLD, FEE_PERCENT
+from create_master_dataset import add_features
+from labeling import label_grid
+from tune_model_threshold import fees_in_r, expectancy
+
+
+SEARCH_CACHE_FILE = 'hyperparam_search.jsonl'
+# Passed to every candidate unless the model grid overrides it (train_unified_model.py's settings).
+BASE_MODEL_PARAMS = {'n_estimators': 100, 'class_weight': 'balanced', 'random_state': 42}
+
+
+# --- SHARED DATASET ---
+class SharedArrays:
+    """
+    Named NumPy arrays in one POSIX shared-memory block. The parent creates
+    it once; every worker attaches by name and gets read-only views of the
+    same physical pages, so the dataset exists once however many workers run.
+    """
+
+    def __init__(self, shm, layout, owner):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+                       for name, (dtype, shape, offset) in layout.items()}
+
+    @classmethod
+    def create(cls, arrays):
+        layout, size = {}, 0
+        for name, arr in arrays.items():
+            layout[name] = (arr.dtype.str, arr.shape, size)
+            size = (size + arr.nbytes + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        shared = cls(shared_memory.SharedMemory(create=True, size=max(size, 1)), layout, owner=True)
+        for name, arr in arrays.items():
+            shared.arrays[name][...] = arr
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        shared = cls(shared_memory.SharedMemory(name=spec['name']), spec['layout'], owner=False)
+        for arr in shared.arrays.values():
+            arr.flags.writeable = False
+        return shared
+
+    @property
+    def spec(self):
+        return {'name': self.shm.name, 'layout': self.layout}
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def close(self):
+        # Views must be dropped before the buffer can be released.
+        self.arrays = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# --- SEARCH DATA ---
+def expand_grid(grid):
+    """Every combination of the lists in `grid`, as dicts, in itertools.product order."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def search_arrays(df, label_configs):
+    """
+    The feature matrix, built once, and the labels of every label config.
+    Rows are interleaved by bar: row 2*i is bar i's buy row and 2*i + 1 its
+    sign-flipped sell row, so a contiguous range of bars is a contiguous,
+    C-ordered float32 slice that sklearn trains on without copying.
+    Returns {'features': (2n, k) float32, 'labels': (configs, 2n) int8, 'valid': (n,) bool}.
+    """
+    frame = add_features(df.copy())
+    buy = frame[FEATURE_COLUMNS].values.astype(np.float32)
+    sell = buy.copy()
+    for col in DIRECTIONAL_FEATURES:
+        sell[:, FEATURE_COLUMNS.index(col)] *= -1
+    features = np.stack([buy, sell], axis=1).reshape(-1, len(FEATURE_COLUMNS))
+
+    grid = label_grid(df['high'].values, df['low'].values, df['close'].values,
+                      sorted({c['risk_percent'] for c in label_configs}),
+                      sorted({c['rr_ratio'] for c in label_configs}),
+                      sorted({c['lookahead'] for c in label_configs}))
+    labels = np.empty((len(label_configs), len(features)), dtype=np.int8)
+    for i, c in enumerate(label_configs):
+        label_buy, label_sell = grid[(c['risk_percent'], c['rr_ratio'], c['lookahead'])]
+        labels[i] = np.stack([label_buy == 1, label_sell == 1], axis=1).reshape(-1)
+    return {'features': features, 'labels': labels, 'valid': np.isfinite(buy).all(axis=1)}
+
+
+# --- TIME-SERIES CROSS-VALIDATION ---
+def time_series_folds(n_bars, n_splits, gap):
+    """
+    Expanding-window folds over bars 0..n_bars - 1 as (train_end, test_start,
+    test_end): train on [0, train_end), test on [test_start, test_end).
+    `gap` bars are purged in between so no training label looks into the test window.
+    """
+    from sklearn.model_selection import TimeSeriesSplit
+
+    return [(int(train[-1]) + 1, int(test[0]), int(test[-1]) + 1)
+            for train, test in TimeSeriesSplit(n_splits=n_splits, gap=gap).split(np.arange(n_bars))]
+
+
+def _rows(arrays, start, end):
+    # Bars [start, end) as row views; only a window with invalid rows in its middle needs a masked copy.
+    valid = arrays['valid'][start:end]
+    first = start + int(np.argmax(valid)) if valid.any() else end
+    if valid[first - start:].all():
+        return slice(2 * first, 2 * end)
+    return np.repeat(np.flatnonzero(valid) + start, 2) * 2 + np.tile([0, 1], int(valid.sum()))
+
+
+def evaluate_config(arrays, task):
+    """
+    Fits one model config on one label config in every fold and scores the
+    out-of-fold trades at the task's threshold: a win pays rr_ratio, a loss
+    costs 1R, both minus round-trip fees as the bot charges them.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    start = time.perf_counter()
+    label, threshold = task['label'], task['threshold']
+    y_all = arrays['labels'][task['label_index']]
+    fees = fees_in_r(label['rr_ratio'], label['risk_percent'], task['fee_percent'])
+    trades = wins = 0
+    fold_expectancy = []
+    for train_end, test_start, test_end in task['folds']:
+        train, test = _rows(arrays, 0, train_end), _rows(arrays, test_start, test_end)
+        model = RandomForestClassifier(**{**BASE_MODEL_PARAMS, **task['model'], 'n_jobs': 1})
+        model.fit(arrays['features'][train], y_all[train])
+        if 1 in model.classes_:
+            take = model.predict_proba(arrays['features'][test])[:, list(model.classes_).index(1)] >= threshold
+        else:  # no winning trade in this training window: the model never signals
+            take = np.zeros(len(y_all[test]), dtype=bool)
+        fold_trades, fold_wins = int(take.sum()), int(y_all[test][take].sum())
+        trades += fold_trades
+        wins += fold_wins
+        fold_expectancy.append(float(expectancy(fold_trades, fold_wins, label['rr_ratio'], fees)[0]))
+    per_trade, total = expectancy(trades, wins, label['rr_ratio'], fees)
+    return {
+        'trades': trades,
+        'wins': wins,
+        'precision': wins / trades if trades else float('nan'),
+        'expectancy_r': float(per_trade),
+        'total_r': float(total),
+        'fold_expectancy_r': fold_expectancy,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+# --- WORKER SIDE ---
+_shared = None
+
+
+def _init_worker(spec):
+    global _shared
+    _shared = SharedArrays.attach(spec)
+
+
+def _run_one(task):
+    return evaluate_config(_shared.arrays, task)
+
+
+# --- RESULT CACHE ---
+def config_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Finished evaluations keyed by config hash, in an append-only JSON-lines
+    file. Each result is written as soon as it arrives, so an interrupted
+    search loses only the evaluations still running, and a torn last line is
+    ignored on load.
+    """
+
+    def __init__(self, path=SEARCH_CACHE_FILE):
+        self.path = path
+        self.results = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.results[record['key']] = record
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def __getitem__(self, key):
+        return self.results[key]
+
+    def add(self, record):
+        self.results[record['key']] = record
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+
+# --- SEARCH DRIVER ---
+def search(df, label_grid_spec, model_grid, n_splits=4, threshold=PREDICTION_THRESHOLD, fee_percent=FEE_PERCENT,
+           cache=None, workers=None):
+    """
+    Evaluates every label config x model config of the two grids under
+    expanding-window time-series CV on an OHLCV DataFrame. Configs whose hash
+    (data, features, folds, label and model parameters, threshold, fees) is
+    already cached are not recomputed. The rest run across `workers` spawned
+    processes (0: inline) that share one copy of the dataset.
+    Returns (records in grid order, stats dict).
+    """
+    cache = cache if cache is not None else ResultCache()
+    label_configs = expand_grid(label_grid_spec)
+    model_configs = expand_grid(model_grid)
+    gap = max(c['lookahead'] for c in label_configs)
+    # Every config is scored on the same folds: bars whose label window is complete for the longest lookahead.
+    folds = time_series_folds(len(df) - gap, n_splits, gap)
+    data_id = hashlib.sha256(np.ascontiguousarray(df[['open', 'high', 'low', 'close', 'volume']].values).tobytes()).hexdigest()
+
+    keys, tasks = [], []
+    for label_index, label in enumerate(label_configs):
+        for model in model_configs:
+            config = {'data': data_id, 'features': FEATURE_COLUMNS, 'folds': folds, 'label': label,
+                      'model': {**BASE_MODEL_PARAMS, **model}, 'threshold': threshold, 'fee_percent': fee_percent}
+            key = config_hash(config)
+            keys.append(key)
+            if key not in cache:
+                tasks.append({'key': key, 'label_index': label_index, 'label': label, 'model': model,
+                              'folds': folds, 'threshold': threshold, 'fee_percent': fee_percent})
+
+    stats = {'configs': len(keys), 'cached': len(keys) - len(tasks), 'evaluated': 0, 'shared_bytes': 0, 'seconds': 0.0}
+    start = time.perf_counter()
+    if tasks:
+        shared = SharedArrays.create(search_arrays(df, label_configs))
+        stats['shared_bytes'] = shared.nbytes
+        try:
+            if workers == 0:
+                for task in tasks:
+                    cache.add({'key': task['key'], 'label': task['label'], 'model': task['model'],
+                               **evaluate_config(shared.arrays, task)})
+                    stats['evaluated'] += 1
+            else:
+                # 'spawn': workers start clean and only ever see the dataset through the shared block.
+                with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_init_worker, initargs=(shared.spec,)) as pool:
+                    futures = {pool.submit(_run_one, task): task for task in tasks}
+                    for future in as_completed(futures):
+                        task = futures[future]
+                        cache.add({'key': task['key'], 'label': task['label'], 'model': task['model'], **future.result()})
+                        stats['evaluated'] += 1
+        finally:
+            shared.close()
+    stats['seconds'] = time.perf_counter() - start
+    return [cache[key] for key in keys], stats
+
+
+def print_results(records, min_trades, top=10):
+    eligible = [r for r in records if r['trades'] >= min_trades]
+    print(f"{'risk':>6} {'RR':>4} {'look':>4}  {'model':<40} {'trades':>6} {'win rate':>8} {'E[R]/trade':>10} {'folds E[R]':>28}")
+    for r in sorted(eligible, key=lambda r: r['expectancy_r'], reverse=True)[:top]:
+        label = r['label']
+        model = ', '.join(f"{k}={v}" for k, v in r['model'].items())
+        folds = ' '.join(f"{e:+.2f}" for e in r['fold_expectancy_r'])
+        print(f"{label['risk_percent']:6.2%} {label['rr_ratio']:4.1f} {label['lookahead']:4d}  {model:<40} {r['trades']:6d} "
+              f"{r['precision']:8.1%} {r['expectancy_r']:+10.3f} {folds:>28}")
+    if len(eligible) < len(records):
+        print(f"({len(records) - len(eligible)} configs took fewer than {min_trades} out-of-fold trades)")
+
+
+def main():
+    input_file = 'btc_15m_data.csv'
+    label_grid_spec = {
+        'risk_percent': [0.0025, 0.005, 0.01],
+        'rr_ratio': [2.0, 3.0],
+        'lookahead': [50, 100],
+    }
+    model_grid = {
+        'max_depth': [None, 8],
+        'min_samples_leaf': [1, 20],
+    }
+    n_splits = 4
+    min_trades = 20
+
+    print(f"--- Joint labeling x model search on '{input_file}' ({n_splits}-fold time-series CV) ---")
+    df = pd.read_csv(input_file)
+    cache = ResultCache()
+    records, stats = search(df, label_grid_spec, model_grid, n_splits, cache=cache)
+    print(f"{stats['configs']} configs: {stats['cached']} cached, {stats['evaluated']} evaluated in {stats['seconds']:.1f} s")
+    if stats['evaluated']:
+        print(f"Dataset: {stats['shared_bytes'] / 1024:.0f} KB in shared memory, attached by every worker; "
+              f"largest worker peak RSS {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024:.0f} MB")
+    print(f"Results cached in '{cache.path}'; rerunning or extending the grids only evaluates new configs.\n")
+    print_results(records, min_trades)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+
+# --- FIRST-TOUCH SEARCH ---
+def first_touch(values, levels, lookahead, above):
+    """
+    For every entry row i, returns the smallest j in 1..lookahead such that
+    values[i + j] crosses levels[i] (>= when `above`, <= otherwise), or
+    lookahead + 1 if the level is never touched inside the window.
+
+    The search walks the lookahead offsets once, comparing a shifted view of
+    the whole array at each step, so the cost is `lookahead` vectorized passes
+    instead of `len(values) * lookahead` Python iterations.
+    """
+    n_rows = len(levels)
+    first = np.full(n_rows, lookahead + 1, dtype=np.int32)
+    pending = np.ones(n_rows, dtype=bool)
+    for j in range(1, lookahead + 1):
+        window = values[j:j + n_rows]
+        hit = (window >= levels[:len(window)]) if above else (window <= levels[:len(window)])
+        hit &= pending[:len(window)]
+        first[:len(window)][hit] = j
+        pending[:len(window)] &= ~hit
+        if not pending.any():
+            break
+    return first
+
+
+def _outcome(first_sl, first_tp, lookahead):
+    # SL is checked before TP inside the same candle, so a tie goes to the SL.
+    labels = np.zeros(len(first_sl), dtype=np.int8)
+    sl_hit = first_sl <= lookahead
+    tp_hit = first_tp <= lookahead
+    labels[sl_hit & (first_sl <= first_tp)] = -1
+    labels[tp_hit & (first_tp < first_sl)] = 1
+    return labels
+
+
+# --- LABELING ENGINE ---
+def label_triple_barrier(high, low, close, risk_percent, rr_ratio, lookahead):
+    """
+    Computes the buy and sell first-touch labels (1 = TP, -1 = SL, 0 = neither)
+    with the same semantics as the original loop in create_master_dataset.py.
+    The last `lookahead` rows are never labeled and stay 0.
+    """
+    return label_grid(high, low, close, [risk_percent], [rr_ratio], [lookahead])[(risk_percent, rr_ratio, lookahead)]
+
+
+def label_grid(high, low, close, risk_percents, rr_ratios, lookaheads):
+    """
+    Labels every combination of RISK_PERCENT x RR_RATIO x LOOKAHEAD_CANDLES in
+    one call. Returns {(risk_percent, rr_ratio, lookahead): (label_buy, label_sell)}.
+
+    First-touch offsets are computed once per distinct barrier distance at the
+    longest lookahead; shorter lookaheads reuse them by truncation.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    max_lookahead = max(lookaheads)
+    n_rows = max(n - min(lookaheads), 0)
+    entry = close[:n_rows]
+
+    sl_cache, tp_cache = {}, {}
+
+    def sl_offsets(risk):
+        if risk not in sl_cache:
+            sl_buy, sl_sell = entry * (1 - risk), entry * (1 + risk)
+            sl_cache[risk] = (first_touch(low, sl_buy, max_lookahead, above=False),
+                              first_touch(high, sl_sell, max_lookahead, above=True))
+        return sl_cache[risk]
+
+    def tp_offsets(risk, rr):
+        key = risk * rr
+        if key not in tp_cache:
+            tp_buy, tp_sell = entry * (1 + key), entry * (1 - key)
+            tp_cache[key] = (first_touch(high, tp_buy, max_lookahead, above=True),
+                             first_touch(low, tp_sell, max_lookahead, above=False))
+        return tp_cache[key]
+
+    results = {}
+    for risk, rr, lookahead in itertools.product(risk_percents, rr_ratios, lookaheads):
+        first_sl_buy, first_sl_sell = sl_offsets(risk)
+        first_tp_buy, first_tp_sell = tp_offsets(risk, rr)
+        n_labeled = max(n - lookahead, 0)
+
+        label_buy = np.zeros(n, dtype=np.int8)
+        label_sell = np.zeros(n, dtype=np.int8)
+        label_buy[:n_labeled] = _outcome(first_sl_buy[:n_labeled], first_tp_buy[:n_labeled], lookahead)
+        label_sell[:n_labeled] = _outcome(first_sl_sell[:n_labeled], first_tp_sell[:n_labeled], lookahead)
+        results[(risk, rr, lookahead)] = (label_buy, label_sell)
+    return results
+
+
+def label_dataframe(df, risk_percent, rr_ratio, lookahead):
+    """Adds `label_buy` / `label_sell` columns to an OHLC DataFrame in place."""
+    label_buy, label_sell = label_triple_barrier(df['high'].values, df['low'].values, df['close'].values,
+                                                 risk_percent, rr_ratio, lookahead)
+    df['label_buy'] = label_buy
+    df['label_sell'] = label_sell
+    return df
+
+
+# --- REFERENCE IMPLEMENTATION (for parity checks) ---
+def label_loop(df, risk_percent, rr_ratio, lookahead):
+    """The original nested-loop labeler, kept on plain arrays to check parity against."""
+    high, low, close = df['high'].values, df['low'].values, df['close'].values
+    label_buy = np.zeros(len(df), dtype=np.int8)
+    label_sell = np.zeros(len(df), dtype=np.int8)
+    for i in range(len(df) - lookahead):
+        entry = close[i]
+        sl_buy, tp_buy = entry * (1 - risk_percent), entry * (1 + (risk_percent * rr_ratio))
+        sl_sell, tp_sell = entry * (1 + risk_percent), entry * (1 - (risk_percent * rr_ratio))
+        for j in range(1, lookahead + 1):
+            h, l = high[i + j], low[i + j]
+            if label_buy[i] == 0 and l <= sl_buy: label_buy[i] = -1
+            if label_buy[i] == 0 and h >= tp_buy: label_buy[i] = 1
+            if label_sell[i] == 0 and h >= sl_sell: label_sell[i] = -1
+            if label_sell[i] == 0 and l <= tp_sell: label_sell[i] = 1
+    return label_buy, label_sell
+
+
+def main():
+    input_file = 'btc_15m_data.csv'
+    risk_percents = [0.0025, 0.005, 0.01]
+    rr_ratios = [2.0, 3.0]
+    lookaheads = [50, 100]
+
+    print(f"--- Checking vectorized labeler against the reference loop on '{input_file}' ---")
+    df = pd.read_csv(input_file)
+
+    start = time.perf_counter()
+    grid = label_grid(df['high'].values, df['low'].values, df['close'].values, risk_percents, rr_ratios, lookaheads)
+    vectorized_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mismatches = 0
+    for (risk, rr, lookahead), (label_buy, label_sell) in grid.items():
+        ref_buy, ref_sell = label_loop(df, risk, rr, lookahead)
+        mismatches += int((ref_buy != label_buy).sum() + (ref_sell != label_sell).sum())
+    loop_time = time.perf_counter() - start
+
+    print(f"Configurations: {len(grid)}")
+    print(f"Vectorized grid: {vectorized_time * 1000:.1f} ms")
+    print(f"Reference loop:  {loop_time * 1000:.1f} ms")
+    print(f"Mismatched labels: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
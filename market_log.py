@@ -0,0 +1,817 @@
+import argparse
+import asyncio
+import bisect
+import builtins
+import collections
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from ccxt.base import errors as ccxt_errors
+import numpy as np
+
+import config
+from config import MARKET_LOG_FILE, MODEL_ARTIFACT_FILE, MODEL_FILE, SYMBOLS, TIMEFRAME
+from exchange_client import FakeExchange
+from journal import Journal
+from price_stream import candle_ticks
+from scheduler import timeframe_seconds
+
+
+LOG_MAGIC = b'BSNBMKT1'
+FRAME_HEADER = struct.Struct('<IB')   # compressed length, flags
+SESSION_START = 1                     # flag of the frame holding a session's 'start' record
+BLOCK_BYTES = 256 * 1024              # records are compressed together once this much has gathered...
+FLUSH_SECONDS = 60.0                  # ...or this long has passed, so a crash loses at most a minute
+# Exchange calls of the bot whose responses are logged; watch_prices is logged tick by tick.
+RECORDED_CALLS = ('fetch_ohlcv', 'fetch_prices', 'fetch_net_positions', 'fetch_balance', 'market_order', 'close_positions')
+# Settings that change the decisions; a replay warns when the current config.py differs from the recording's.
+DECISION_SETTINGS = ('TIMEFRAME', 'SYMBOLS', 'FEATURE_COLUMNS', 'PREDICTION_THRESHOLD', 'STARTING_BALANCE', 'MAX_OPEN_TRADES',
+                     'MAX_EXPOSURE_MULTIPLE', 'RISK_PER_TRADE_PERCENT', 'RR_RATIO', 'FEE_PERCENT', 'CANDLE_CLOSE_DELAY',
+                     'MONITOR_INTERVAL', 'MAX_SIGNAL_LATENESS', 'INTRABAR_MONITOR', 'SHADOW_MODELS', 'SHADOW_WORKERS',
+                     'RETRAIN_INTERVAL_HOURS')
+# How far a replay reads ahead for the recorded signal of a bar before calling it missing.
+SIGNAL_LOOKAHEAD = 100_000
+TICK_KEY, WAKE_KEY, CHECK_KEY = ('tick',), ('wake',), ('check',)
+# Where the tools below look when no path is given and the bot is not set to record.
+LOG_FILE = MARKET_LOG_FILE or 'market_data.log'
+
+
+# --- ENCODING ---
+def _plain(value):
+    # json.dumps fallback: numpy scalars, and the exceptions close_positions returns in place of results.
+    if isinstance(value, BaseException):
+        return {'__error__': [type(value).__name__, str(value)]}
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _dumps(value):
+    # Floats are written with repr(), so every value reads back bit-for-bit.
+    return json.dumps(value, separators=(',', ':'), default=_plain)
+
+
+def _error(name, message):
+    cls = getattr(ccxt_errors, name, None) or getattr(builtins, name, None)
+    if not (isinstance(cls, type) and issubclass(cls, Exception)):
+        return Exception(f"{name}: {message}")
+    return cls(message)
+
+
+def _restore(value):
+    # Errors sit at the top level or one list level down, where close_positions puts them.
+    if isinstance(value, dict) and '__error__' in value:
+        return _error(*value['__error__'])
+    if isinstance(value, list):
+        return [_error(*item['__error__']) if isinstance(item, dict) and '__error__' in item else item for item in value]
+    return value
+
+
+def _read_text(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
+
+
+def model_hashes(symbols=SYMBOLS):
+    """sha256 of every model file the configured symbols trade (the joblib pickle when the artifact is missing)."""
+    hashes = {}
+    for artifact_file in sorted({entry.get('model_file', MODEL_ARTIFACT_FILE) for entry in symbols}):
+        path = artifact_file if os.path.exists(artifact_file) or artifact_file != MODEL_ARTIFACT_FILE else MODEL_FILE
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                hashes[path] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+
+def session_header(journal=None):
+    """What a replay needs besides the market data: the journal as it is on disk, the settings and the models."""
+    header = {'version': 1, 'settings': {name: getattr(config, name) for name in DECISION_SETTINGS}, 'models': model_hashes()}
+    if journal is not None:
+        header['journal'] = {'name': os.path.basename(journal.path), 'records': _read_text(journal.path),
+                             'snapshot': _read_text(journal.snapshot_path), 'rotated': _read_text(journal.rotated_path)}
+    return header
+
+
+# --- LOG FILE ---
+def _open_log(path):
+    f = open(path, 'rb')
+    if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+        f.close()
+        raise ValueError(f"'{path}' is not a market data log.")
+    return f
+
+
+def _frames(f):
+    """(offset, flags, length) of every complete frame; stops at a torn one."""
+    size = f.seek(0, os.SEEK_END)
+    offset = len(LOG_MAGIC)
+    while offset + FRAME_HEADER.size <= size:
+        f.seek(offset)
+        length, flags = FRAME_HEADER.unpack(f.read(FRAME_HEADER.size))
+        end = offset + FRAME_HEADER.size + length
+        if end > size:
+            return
+        yield offset, flags, length
+        offset = end
+
+
+def sessions(path):
+    """The frames of every recorded session (one per bot start), oldest first: [[(offset, length), ...], ...]."""
+    runs = []
+    with _open_log(path) as f:
+        for offset, flags, length in _frames(f):
+            if flags & SESSION_START:
+                runs.append([])
+            if runs:
+                runs[-1].append((offset, length))
+    return runs
+
+
+def read_records(path, frames):
+    """Decodes the records of `frames` in order; a frame that does not decompress ends the log."""
+    with _open_log(path) as f:
+        for offset, length in frames:
+            f.seek(offset + FRAME_HEADER.size)
+            try:
+                block = zlib.decompress(f.read(length))
+            except zlib.error:
+                print(f"Discarding a corrupt frame at byte {offset} of '{path}' and everything after it.")
+                return
+            # One parse per block: dumped records never contain a raw newline.
+            yield from json.loads(b'[' + block.replace(b'\n', b',') + b']')
+
+
+class LogWriter:
+    """
+    Append-only writer of a market data log: the magic bytes, then frames of
+    [uint32 length, uint8 flags, zlib block], every block holding
+    newline-separated JSON records. Records are buffered and compressed
+    together (BLOCK_BYTES / FLUSH_SECONDS); a frame torn by a crash is cut
+    off the next time the log is opened, and the log continues after it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path):
+            with _open_log(path) as f:
+                end = len(LOG_MAGIC)
+                for offset, _, length in _frames(f):
+                    end = offset + FRAME_HEADER.size + length
+            if end < os.path.getsize(path):
+                print(f"Discarding a torn frame at the end of '{path}'.")
+                os.truncate(path, end)
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(LOG_MAGIC)
+        self.buffer = []
+        self.size = 0
+        self.flushed_at = time.monotonic()
+
+    def append(self, record):
+        line = _dumps(record).encode()
+        self.buffer.append(line)
+        self.size += len(line) + 1
+        if self.size >= BLOCK_BYTES or time.monotonic() - self.flushed_at >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self, flags=0):
+        if self.buffer:
+            block = zlib.compress(b'\n'.join(self.buffer))
+            self.file.write(FRAME_HEADER.pack(len(block), flags) + block)
+            self.file.flush()
+            self.buffer, self.size = [], 0
+        self.flushed_at = time.monotonic()
+
+    def start_session(self, record):
+        # The start record gets a frame of its own, so sessions are found from the frame headers alone.
+        self.flush()
+        self.append(record)
+        self.flush(SESSION_START)
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+# --- LIVE CLOCK ---
+class MarketClock:
+    """
+    Where the trading loop reads the time, waits and gets its market data
+    (bot.market_clock): the wall clock and the exchange as they are.
+    MarketRecorder logs all of it and MarketReplay plays such a log back.
+    """
+
+    passthrough = True  # main() swaps a pass-through clock for a MarketRecorder when MARKET_LOG_FILE is set
+    checkpoint = None   # PriceMonitor batch hook, only needed to record or replay
+
+    def now(self):
+        return time.time()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    def monotonic(self):
+        return time.monotonic()
+
+    async def pause(self, seconds):
+        await asyncio.sleep(seconds)
+
+    def signal(self, symbol, bar_close, buy_prob, sell_prob):
+        pass
+
+    def wrap(self, exchange):
+        return exchange
+
+    def close(self):
+        pass
+
+
+# --- RECORDING ---
+class MarketRecorder(MarketClock):
+    """
+    Logs every input of the trading loop to `path` in the order it arrives:
+    each exchange response (or error) with the call that asked for it, every
+    streamed tick, each scheduler wake-up and clock reading, and where the
+    price monitor cut its batches. A session starts with session_header()
+    and also logs the signals the bot computed, so a replay can check them.
+    Every record is [time received, kind, ...], the time read from `base`.
+    """
+
+    passthrough = False
+
+    def __init__(self, path=LOG_FILE, journal=None, base=None):
+        self.base = base or MarketClock()
+        self.writer = LogWriter(path)
+        # Taken now, before the bot recovers; written by wrap(), once the exchange is known.
+        self.header = session_header(journal)
+
+    def _log(self, kind, *fields):
+        self.writer.append([self.base.now(), kind, *fields])
+
+    def now(self):
+        value = self.base.now()
+        self.writer.append([value, 'clock'])
+        return value
+
+    async def sleep(self, seconds):
+        await self.base.sleep(seconds)
+        self._log('wake')
+
+    def monotonic(self):
+        return self.base.monotonic()
+
+    async def pause(self, seconds):
+        await self.base.pause(seconds)
+
+    async def checkpoint(self, batch):
+        self._log('check', batch)
+
+    def signal(self, symbol, bar_close, buy_prob, sell_prob):
+        self._log('signal', symbol, bar_close, buy_prob, sell_prob)
+
+    async def call(self, name, args, pending):
+        try:
+            result = await pending
+        except Exception as e:
+            self._log('raise', name, args, e)
+            raise
+        self._log('call', name, args, result)
+        return result
+
+    async def stream(self, source, symbols):
+        try:
+            async for symbol, price, timestamp in source.watch_prices(symbols):
+                self._log('tick', symbol, price, timestamp)
+                yield symbol, price, timestamp
+        except Exception as e:
+            self._log('stream_error', e)
+            raise
+
+    def wrap(self, exchange):
+        self.writer.start_session([self.base.now(), 'start', {**self.header, 'price_stream': exchange.has_price_stream}])
+        return RecordingExchange(exchange, self)
+
+    def close(self):
+        self.writer.close()
+
+
+class RecordingExchange:
+    """`exchange` with the response to every RECORDED_CALLS call and every streamed tick logged by `recorder`."""
+
+    def __init__(self, exchange, recorder):
+        self.exchange = exchange
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        attr = getattr(self.exchange, name)
+        if name not in RECORDED_CALLS:
+            return attr
+
+        def call(*args):
+            return self.recorder.call(name, list(args), attr(*args))
+        return call
+
+    def watch_prices(self, symbols):
+        return self.recorder.stream(self.exchange, symbols)
+
+
+# --- REPLAY ---
+class ReplayFinished(asyncio.CancelledError):
+    """The session is played out. A CancelledError, so no `except Exception` in the bot swallows it."""
+
+
+class MarketReplay(MarketClock):
+    """
+    Plays one recorded session back into bot.main() as fast as it runs.
+
+    Each response, tick, wake-up and batch cut is handed out only once
+    everything received before it live has been handed out, so the bot's
+    tasks interleave exactly as they did live. Concurrent symbols therefore
+    reach the trade caps in the same order, and the price monitor checks the
+    same batches. Responses are found by call, so a call the live bot did not
+    make stalls the replay, and the stall is reported as a divergence. The
+    scheduler reads the recorded clock values one by one; the price
+    monitor's staleness runs on the receive times. Every signal is compared
+    bit-for-bit with the recorded one.
+    """
+
+    passthrough = False
+
+    def __init__(self, path=LOG_FILE, session=-1, stall_seconds=5.0):
+        runs = sessions(path)
+        if not runs:
+            raise ValueError(f"'{path}' holds no recorded session.")
+        self.records = read_records(path, runs[session])
+        start = next(self.records)
+        self.header = start[2]
+        self.started = self.time = start[0]
+        self.stall_seconds = stall_seconds
+        self.ahead = collections.deque()        # ordered events not handed out yet: (key, record)
+        self.clock_values = collections.deque()
+        self.expected = collections.defaultdict(collections.deque)  # symbol -> recorded signals
+        self.waiting = {}                       # key -> futures of the tasks waiting for it
+        self.exhausted = False
+        self.finished = False
+        self.watchdog = None
+        self.consumed = 0
+        self.counts = collections.Counter()
+        self.signals = collections.Counter()
+        self.divergences = []
+
+    def _advance(self):
+        """Routes the next record to its queue; False at the end of the session."""
+        record = None if self.exhausted else next(self.records, None)
+        if record is None:
+            self.exhausted = True
+            return False
+        kind = record[1]
+        if kind == 'clock':
+            self.clock_values.append(record[0])
+        elif kind == 'signal':
+            self.expected[record[2]].append(record)
+        elif kind in ('call', 'raise'):
+            self.ahead.append((('call', record[2], _dumps(record[3])), record))
+        elif kind in ('tick', 'stream_error'):
+            self.ahead.append((TICK_KEY, record))
+        elif kind == 'wake':
+            self.ahead.append((WAKE_KEY, record))
+        elif kind == 'check':
+            self.ahead.append((CHECK_KEY, record))
+        return True
+
+    def _head(self):
+        while not self.ahead and self._advance():
+            pass
+        return self.ahead[0] if self.ahead else None
+
+    def _release(self):
+        head = self._head()
+        if head is None:
+            self._finish()
+            return
+        waiters = self.waiting.get(head[0])
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+
+    def _finish(self):
+        self.finished = True
+        for waiters in self.waiting.values():
+            for future in waiters:
+                if not future.done():
+                    future.set_result(None)
+        self.waiting.clear()
+
+    def _diverge(self, message):
+        self.divergences.append(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(self.time))} UTC: {message}")
+
+    async def take(self, key):
+        """The next recorded event for `key`, once every event received before it has been taken."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.finished:
+                raise ReplayFinished()
+            head = self._head()
+            if head is None:
+                self._finish()
+                raise ReplayFinished()
+            if head[0] == key:
+                self.ahead.popleft()
+                record = head[1]
+                self.time = record[0]
+                self.consumed += 1
+                self.counts[record[1]] += 1
+                self._release()
+                return record
+            if self.watchdog is None:
+                self.watchdog = loop.create_task(self._watch())
+            future = loop.create_future()
+            self.waiting.setdefault(key, collections.deque()).append(future)
+            await future
+
+    async def _watch(self):
+        # A replay that left the recorded path ends with every task waiting for an event that is not next.
+        last = self.consumed
+        while not self.finished:
+            await asyncio.sleep(self.stall_seconds)
+            if self.consumed == last:
+                head = self._head()
+                waiting = [_describe_key(key) for key, futures in self.waiting.items() if any(not f.done() for f in futures)]
+                self._diverge(f"stalled: the recording continues with {_describe(head[1]) if head else 'nothing'}, "
+                              f"the bot waits for {', '.join(waiting) or 'nothing'}")
+                self._finish()
+            last = self.consumed
+
+    def now(self):
+        while not self.clock_values:
+            if not self._advance():
+                raise ReplayFinished()
+        return self.clock_values.popleft()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(0)  # work that needs no recorded input (journal commits, the notifier) runs, as during a real wait
+        await self.take(WAKE_KEY)
+
+    def monotonic(self):
+        return self.time
+
+    async def pause(self, seconds):
+        await asyncio.sleep(0)
+
+    async def checkpoint(self, batch):
+        record = await self.take(CHECK_KEY)
+        if _dumps(batch) != _dumps(record[2]):
+            self._diverge(f"price monitor batch {_dumps(batch)}, live {_dumps(record[2])}")
+
+    def signal(self, symbol, bar_close, buy_prob, sell_prob):
+        expected = self.expected[symbol]
+        while not expected and len(self.ahead) < SIGNAL_LOOKAHEAD and self._advance():
+            pass
+        while expected and expected[0][3] < bar_close:
+            self.signals['missing'] += 1
+            self._diverge(f"{symbol} bar {expected.popleft()[3]}: recorded signal not reproduced")
+        if not expected or expected[0][3] > bar_close:
+            self.signals['extra'] += 1
+            self._diverge(f"{symbol} bar {bar_close}: signal that the live bot did not compute")
+            return
+        record = expected.popleft()
+        if _dumps([buy_prob, sell_prob]) == _dumps(record[4:6]):
+            self.signals['identical'] += 1
+        else:
+            self.signals['different'] += 1
+            self._diverge(f"{symbol} bar {bar_close}: buy/sell {buy_prob!r}/{sell_prob!r}, live {record[4]!r}/{record[5]!r}")
+
+    async def respond(self, name, args):
+        record = await self.take(('call', name, _dumps(list(args))))
+        if record[1] == 'raise':
+            raise _error(*record[4]['__error__'])
+        return _restore(record[4])
+
+    def wrap(self, exchange):
+        return ReplayExchange(self)
+
+    def restore_journal(self, directory):
+        """A Journal in `directory` holding what the recorded bot had on disk when it started."""
+        saved = self.header.get('journal') or {}
+        path = os.path.join(directory, saved.get('name', 'portfolio.journal'))
+        saved_files = ((path, saved.get('records')), (path + '.snapshot', saved.get('snapshot')), (path + '.rotated', saved.get('rotated')))
+        for target, text in saved_files:
+            if text is not None:
+                with open(target, 'w') as f:
+                    f.write(text)
+        return Journal(path)
+
+    def warnings(self):
+        """Differences between the recording and this checkout that can make the replay diverge."""
+        notes = []
+        for name, value in self.header['settings'].items():
+            current = getattr(config, name, None)
+            if name not in ('RETRAIN_INTERVAL_HOURS', 'SHADOW_WORKERS') and _dumps(current) != _dumps(value):
+                notes.append(f"{name} is {current!r} here, {value!r} in the recording.")
+        current_models = model_hashes(self.header['settings'].get('SYMBOLS', SYMBOLS))
+        for path, digest in self.header['models'].items():
+            if current_models.get(path) != digest:
+                notes.append(f"'{path}' is not the model the recording ran with.")
+        if self.header['settings'].get('RETRAIN_INTERVAL_HOURS'):
+            notes.append("Retraining was on: signals after a model swap during the recording will differ.")
+        if self.header['settings'].get('SHADOW_MODELS') and self.header['settings'].get('SHADOW_WORKERS'):
+            notes.append("Shadow models were scored in worker processes: their open symbols may change the polled prices.")
+        return notes
+
+    def report(self):
+        missing = self.signals['missing'] + sum(len(queue) for queue in self.expected.values())
+        return {'started': self.started, 'span_seconds': self.time - self.started, 'events': self.consumed,
+                'counts': dict(self.counts), 'complete': self.exhausted and not self.ahead,
+                'signals': {'identical': self.signals['identical'], 'different': self.signals['different'],
+                            'missing': missing, 'extra': self.signals['extra']},
+                'divergences': self.divergences, 'warnings': self.warnings()}
+
+
+class ReplayExchange:
+    """Serves the recorded responses to the bot's exchange calls (see MarketReplay)."""
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.has_price_stream = replay.header.get('price_stream', True)
+
+    def __getattr__(self, name):
+        if name not in RECORDED_CALLS:
+            raise AttributeError(f"'{name}' was not recorded")
+
+        def call(*args):
+            return self.replay.respond(name, args)
+        return call
+
+    async def watch_prices(self, symbols):
+        while True:
+            try:
+                record = await self.replay.take(TICK_KEY)
+            except ReplayFinished:
+                return
+            if record[1] == 'stream_error':
+                raise _error(*record[2]['__error__'])
+            yield record[2], record[3], record[4]
+
+    async def close(self):
+        pass
+
+
+def _describe(record):
+    return f"{record[1]} {_dumps(record[2:])[:160]}"
+
+
+def _describe_key(key):
+    return key[0] if len(key) == 1 else f"{key[1]}({key[2][1:-1][:160]})"
+
+
+def replay(path=LOG_FILE, session=-1, verbose=False):
+    """
+    Runs bot.main() on a recorded session at full speed and returns the
+    replay's report. Retraining, metrics and Telegram are off; shadow models
+    are scored inline so they settle at the same points every time.
+    """
+    market = MarketReplay(path, session)
+    os.environ['TELEGRAM_TOKEN'] = ''  # load_dotenv() keeps it empty: nothing is sent
+    import bot
+    from shadow import ShadowRunner
+
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        bot.journal = market.restore_journal(directory)
+        bot.market_clock = market
+        bot.shadows = ShadowRunner(bot.SHADOW_MODELS, workers=0)
+        bot.RETRAIN_INTERVAL_HOURS = None
+        bot.METRICS_ENABLED = False
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+            try:
+                asyncio.run(bot.main())
+            except asyncio.CancelledError:
+                if not market.finished:
+                    raise
+        seconds = time.perf_counter() - start
+    result = market.report()
+    result.update(seconds=seconds, balance=bot.portfolio['balance'], trades=bot.portfolio['total_trades'],
+                  open_positions=len(bot.portfolio['positions']))
+    return result
+
+
+def print_replay(result):
+    signals = result['signals']
+    print(f"{result['events']:,} events over {result['span_seconds'] / 86400:.2f} days replayed in {result['seconds']:.1f} s "
+          f"({result['span_seconds'] / max(result['seconds'], 1e-9):,.0f}x real time), "
+          f"{'the whole session' if result['complete'] else 'stopped early'}")
+    print(f"Events: {', '.join(f'{kind} {count:,}' for kind, count in sorted(result['counts'].items()))}")
+    print(f"Signals: {signals['identical']:,} identical, {signals['different']} different, {signals['missing']} missing, "
+          f"{signals['extra']} extra")
+    print(f"Portfolio: balance ${result['balance']:.2f}, {result['trades']} trades, {result['open_positions']} open")
+    for note in result['warnings']:
+        print(f"Warning: {note}")
+    for line in result['divergences'][:20]:
+        print(f"Divergence {line}")
+    if len(result['divergences']) > 20:
+        print(f"... {len(result['divergences']) - 20} more divergences")
+
+
+def info(path=LOG_FILE):
+    """Per session: start, span, records by kind and the models it ran with."""
+    runs = sessions(path)
+    print(f"'{path}': {os.path.getsize(path) / 2**20:.1f} MB, {len(runs)} sessions")
+    for i, frames in enumerate(runs):
+        counts = collections.Counter()
+        first = last = None
+        header = None
+        raw = 0
+        for record in read_records(path, frames):
+            first = record[0] if first is None else first
+            last = record[0]
+            header = header or record[2]
+            counts[record[1]] += 1
+            raw += len(_dumps(record)) + 1
+        packed = sum(length + FRAME_HEADER.size for _, length in frames)
+        print(f"Session {i}: {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(first))} UTC, {(last - first) / 3600:.1f} h, "
+              f"{raw / 2**20:.1f} MB of records in {packed / 2**20:.1f} MB ({raw / max(packed, 1):.1f}x)")
+        print(f"  {', '.join(f'{kind} {count:,}' for kind, count in sorted(counts.items()))}")
+        for model, digest in header['models'].items():
+            print(f"  model '{model}' {digest[:12]}")
+
+
+# --- SELF-CHECK ---
+class StopRecording(Exception):
+    pass
+
+
+class VirtualClock(MarketClock):
+    """A clock that jumps through every wait, ending the recording after `end` (epoch seconds)."""
+
+    def __init__(self, start, end):
+        self.value = start
+        self.end = end
+
+    def now(self):
+        return self.value
+
+    async def sleep(self, seconds):
+        self.value += seconds + 0.003  # timers always fire a little late
+        if self.value > self.end:
+            raise StopRecording()
+        await asyncio.sleep(0)
+
+    def monotonic(self):
+        return self.value
+
+    async def pause(self, seconds):
+        await asyncio.sleep(0)
+
+
+class SimulatedMarket(FakeExchange):
+    """
+    FakeExchange over one candle series per symbol as of `clock`: closed
+    candles plus the forming one, and a tick stream along every candle's
+    intrabar path (price_stream.candle_ticks) released as the clock passes it.
+    """
+
+    has_price_stream = True
+
+    def __init__(self, series, period_ms, clock, steps=10):
+        super().__init__(latency=0.0, poll_interval=0.0)
+        self.series = series
+        self.period_ms = period_ms
+        self.clock = clock
+        self.starts = {symbol: [row[0] for row in rows] for symbol, rows in series.items()}
+        start_ms = clock.now() * 1000
+        self.ticks = sorted((tick for symbol, rows in series.items() for tick in candle_ticks(rows, symbol, period_ms, steps)
+                             if tick[0] >= start_ms), key=lambda tick: tick[0])
+        self.tick_times = {symbol: [] for symbol in series}
+        self.tick_prices = {symbol: [] for symbol in series}
+        for timestamp, symbol, price in self.ticks:
+            self.tick_times[symbol].append(timestamp)
+            self.tick_prices[symbol].append(price)
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        await asyncio.sleep(0)
+        rows, starts = self.series[symbol], self.starts[symbol]
+        forming = bisect.bisect_right(starts, self.clock.now() * 1000) - 1
+        if since is None:
+            first, last = (max(0, forming + 1 - limit) if limit else 0), forming + 1
+        else:
+            first = bisect.bisect_left(starts, since)
+            last = min(forming + 1, first + limit) if limit else forming + 1
+        open = rows[forming][1]
+        return [list(row) if i < forming else [row[0], open, open, open, open, 0.0]
+                for i, row in zip(range(first, last), rows[first:last])]
+
+    async def fetch_prices(self, symbols):
+        await asyncio.sleep(0)
+        now_ms = self.clock.now() * 1000
+        prices = {}
+        for symbol in symbols:
+            k = bisect.bisect_right(self.tick_times[symbol], now_ms)
+            if k:
+                prices[symbol] = self.tick_prices[symbol][k - 1]
+        return prices
+
+    async def watch_prices(self, symbols):
+        wanted = set(symbols)
+        for timestamp, symbol, price in self.ticks:
+            while timestamp > self.clock.now() * 1000:
+                await asyncio.sleep(0)
+            if symbol in wanted:
+                yield symbol, price, timestamp
+
+
+def record_stage(path, directory, days, seed, steps):
+    """Records `days` of the bot trading synthetic candles for every configured symbol on a virtual clock."""
+    from benchmarks import synthetic_ohlcv
+
+    os.environ['TELEGRAM_TOKEN'] = ''
+    config.RETRAIN_INTERVAL_HOURS = None  # what the session header records: retraining is off below
+    import bot
+    from shadow import ShadowRunner
+
+    period = timeframe_seconds(TIMEFRAME)
+    warmup = 200
+    n = warmup + int(days * 86400 / period) + 2
+    series = {}
+    for i, entry in enumerate(SYMBOLS):
+        df = synthetic_ohlcv(n, seed=seed + i)
+        timestamps = df['timestamp'].values.astype('datetime64[ms]').astype(np.int64)
+        series[entry['symbol']] = [list(row) for row in zip(timestamps.tolist(), *(df[c].tolist() for c in ('open', 'high', 'low', 'close', 'volume')))]
+    start = series[SYMBOLS[0]['symbol']][warmup][0] / 1000 + 1.0
+    clock = VirtualClock(start, start + days * 86400)
+    bot.exchange = market = SimulatedMarket(series, period * 1000, clock, steps)
+    bot.journal = Journal(os.path.join(directory, 'portfolio.journal'))
+    bot.market_clock = MarketRecorder(path, bot.journal, base=clock)
+    bot.shadows = ShadowRunner(bot.SHADOW_MODELS, workers=0)
+    bot.RETRAIN_INTERVAL_HOURS = None
+    bot.METRICS_ENABLED = False
+    begin = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            asyncio.run(bot.main())
+        except StopRecording:
+            pass
+    return {'seconds': time.perf_counter() - begin, 'balance': bot.portfolio['balance'], 'trades': bot.portfolio['total_trades'],
+            'open_positions': len(bot.portfolio['positions']), 'orders': len(market.orders), 'ticks': len(market.ticks)}
+
+
+def _in_child(fn, *args):
+    # Recording and replay each import the bot fresh, like two separate runs.
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def check(days, seed, steps):
+    """Records a synthetic session of the bot, replays it and compares the two."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'market_data.log')
+        recorded = _in_child(record_stage, path, directory, days, seed, steps)
+        print(f"Recorded {days} days of {len(SYMBOLS)} symbols on a virtual clock in {recorded['seconds']:.1f} s: "
+              f"{recorded['orders']} orders, balance ${recorded['balance']:.2f}, {os.path.getsize(path) / 2**20:.2f} MB log")
+        info(path)
+        result = _in_child(replay, path)
+        print_replay(result)
+        same = all(recorded[name] == result[name] for name in ('balance', 'trades', 'open_positions'))
+        print(f"Replay {'matches' if same and not result['divergences'] and result['complete'] else 'DIFFERS FROM'} the recorded run.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and replay market data logs of the live bot.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    info_parser = commands.add_parser('info', help='list the recorded sessions of a log')
+    info_parser.add_argument('path', nargs='?', default=LOG_FILE)
+    replay_parser = commands.add_parser('replay', help='run bot.main() on a recorded session and check its signals')
+    replay_parser.add_argument('path', nargs='?', default=LOG_FILE)
+    replay_parser.add_argument('--session', type=int, default=-1, help='index from `info`; the latest by default')
+    replay_parser.add_argument('--verbose', action='store_true', help="show the bot's own output")
+    check_parser = commands.add_parser('check', help='record a synthetic session, replay it and compare')
+    check_parser.add_argument('--days', type=float, default=7.0)
+    check_parser.add_argument('--seed', type=int, default=42)
+    check_parser.add_argument('--steps', type=int, default=10, help='ticks per intrabar leg of every candle')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        info(args.path)
+    elif args.command == 'replay':
+        print(f"--- Replaying session {args.session} of '{args.path}' ---")
+        print_replay(replay(args.path, args.session, args.verbose))
+    else:
+        print("--- Record and replay ---")
+        check(args.days, args.seed, args.steps)
+
+
+if __name__ == "__main__":
+    main()
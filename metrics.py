@@ -0,0 +1,263 @@
+import asyncio
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+
+# --- LATENCY HISTOGRAM ---
+class Histogram:
+    """
+    Streaming latency histogram on log-spaced buckets (5% wide, 1 µs to ~20 min),
+    so memory is constant and quantiles are accurate to a few percent.
+    """
+
+    MIN_VALUE = 1e-6
+    GROWTH = 1.05
+    N_BUCKETS = 430
+
+    def __init__(self):
+        self.counts = [0] * self.N_BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        if seconds <= self.MIN_VALUE:
+            index = 0
+        else:
+            index = min(self.N_BUCKETS - 1, int(math.log(seconds / self.MIN_VALUE) / math.log(self.GROWTH)) + 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float('nan')
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                # Geometric midpoint of the bucket.
+                upper = self.MIN_VALUE * self.GROWTH ** index
+                return min(self.max, upper / math.sqrt(self.GROWTH))
+        return self.max
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.inc(f"{self.name}_errors")
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# --- METRICS REGISTRY ---
+class Metrics:
+    """
+    Spans, latency histograms and counters for the trading cycle.
+    Disabled by default: span() then hands back a shared no-op context manager
+    and observe()/inc() return immediately, so the instrumentation can stay in
+    the hot path.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, prefix='bot', enabled=False):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    def inc(self, name, value=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def render(self):
+        """Prometheus text exposition format (latencies as summaries)."""
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in self.QUANTILES:
+                lines.append(f'{metric}{{quantile="{q}"}} {histogram.quantile(q):.9g}')
+            lines.append(f"{metric}_sum {histogram.sum:.9g}")
+            lines.append(f"{metric}_count {histogram.count}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {histogram.max:.9g}")
+        for name, value in sorted(self.counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Atomic write, for node_exporter's textfile collector or a plain `cat`."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """One line per stage: count, p50 and p99 in milliseconds."""
+        return "\n".join(f"{name:<20} n={h.count:<6} p50={h.quantile(0.5) * 1000:9.3f} ms  p99={h.quantile(0.99) * 1000:9.3f} ms"
+                         for name, h in sorted(self.histograms.items()))
+
+    async def serve(self, port, host='127.0.0.1'):
+        """Minimal HTTP endpoint answering every GET with render()."""
+        async def handle(reader, writer):
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+                body = self.render().encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                             b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+                await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+        return await asyncio.start_server(handle, host, port)
+
+
+# Shared by every module of the bot; bot.main() enables it from config.
+metrics = Metrics()
+
+
+# --- SAMPLING PROFILER ---
+class SamplingProfiler:
+    """
+    Samples the stack of one thread every `interval` seconds from a helper
+    thread, so the profiled code runs unmodified. Results are written as
+    collapsed stacks ("frame;frame;frame count"), the input format of
+    flamegraph.pl and speedscope.
+
+    request() arms it; the next cycle_start()/cycle_end() pair is then
+    profiled and dumped to `out_dir`. install_signal() arms it on SIGUSR1.
+    """
+
+    def __init__(self, interval=0.002, out_dir='profiles'):
+        self.interval = interval
+        self.out_dir = out_dir
+        self.armed = False
+        self.samples = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.target = None
+
+    def request(self):
+        self.armed = True
+
+    def install_signal(self, sig=getattr(signal, 'SIGUSR1', None)):
+        if sig is None:
+            return False
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, self.request)
+        except (RuntimeError, NotImplementedError):
+            signal.signal(sig, lambda *_: self.request())
+        return True
+
+    def cycle_start(self):
+        if not self.armed or self.thread is not None:
+            return
+        self.armed = False
+        self.samples = Counter()
+        self.target = threading.get_ident()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+
+    def cycle_end(self):
+        if self.thread is None:
+            return None
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        return self.dump()
+
+    def _sample(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"cycle-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt")
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"Cycle profile ({sum(self.samples.values())} samples) written to '{path}'.")
+        return path
+
+
+def main():
+    # Overhead of the instrumentation, disabled and enabled.
+    n = 1_000_000
+    bench = Metrics()
+    for enabled in (False, True):
+        bench.enabled = enabled
+        start = time.perf_counter()
+        for _ in range(n):
+            with bench.span('stage'):
+                pass
+        elapsed = time.perf_counter() - start
+        print(f"span() {'enabled ' if enabled else 'disabled'}: {elapsed / n * 1e9:6.0f} ns per span")
+
+    start = time.perf_counter()
+    for _ in range(n):
+        pass
+    print(f"empty loop:       {(time.perf_counter() - start) / n * 1e9:6.0f} ns per iteration")
+    print()
+    print(bench.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from array_file import open_array_file, write_array_file
+from config import MODEL_FILE, MODEL_ARTIFACT_FILE, TRAINING_DATA_FILE, PREDICTION_THRESHOLD, FEATURE_COLUMNS
+from forest_inference import CompiledForest
+
+
+ARTIFACT_KIND = 'random_forest'
+ARTIFACT_VERSION = 1
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _floor_float32(values):
+    # Rounding a threshold *down* to float32 keeps `x <= threshold` exact for float32 inputs,
+    # which is what the model sees, so quantized thresholds never change a split.
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+# --- EXPORT / LOAD ---
+def export_forest(forest, path, prediction_threshold, training_data_hash, quantize=False):
+    """
+    Writes a CompiledForest to the pickle-free artifact format. With `quantize`
+    thresholds and leaf probabilities are stored as float32 (about half the
+    size); splits stay exact, probabilities move by ~1e-8.
+    """
+    threshold = _floor_float32(forest.threshold) if quantize else forest.threshold
+    value = forest.value.astype(np.float32) if quantize else forest.value
+    meta = {
+        'artifact_version': ARTIFACT_VERSION,
+        'feature_columns': FEATURE_COLUMNS,
+        'prediction_threshold': prediction_threshold,
+        'training_data_sha256': training_data_hash,
+        'quantized': quantize,
+        'n_trees': forest.n_trees,
+        'max_depth': forest.max_depth,
+        'n_features': forest.n_features,
+    }
+    write_array_file(path, ARTIFACT_KIND, meta, {
+        'feature': forest.feature,
+        'threshold': threshold,
+        'child': forest.child,
+        'value': value,
+        'roots': forest.roots,
+    })
+
+
+def load_forest(path):
+    """Memory-maps an exported forest. Returns (CompiledForest, metadata); sklearn is never imported."""
+    meta, arrays = open_array_file(path, kind=ARTIFACT_KIND)
+    if meta['artifact_version'] != ARTIFACT_VERSION:
+        raise ValueError(f"'{path}' is artifact version {meta['artifact_version']}, expected {ARTIFACT_VERSION}")
+    if meta['feature_columns'] != FEATURE_COLUMNS:
+        raise ValueError(f"'{path}' was trained on {meta['feature_columns']}, the bot computes {FEATURE_COLUMNS}")
+    forest = CompiledForest(arrays['feature'], arrays['threshold'], arrays['child'], arrays['value'],
+                            arrays['roots'], meta['max_depth'], meta['n_features'])
+    return forest, meta
+
+
+# --- COLD-START REPORT ---
+_JOBLIB_START = """
+import time
+start = time.perf_counter()
+import joblib
+from forest_inference import CompiledForest
+model = joblib.load({path!r})
+forest = CompiledForest.from_sklearn(model)
+forest.predict_buy_sell([0.0] * forest.n_features)
+elapsed = time.perf_counter() - start
+print(elapsed, [line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM')][0])
+"""
+
+_ARTIFACT_START = """
+import sys, time
+start = time.perf_counter()
+from model_artifact import load_forest
+forest, meta = load_forest({path!r})
+forest.predict_buy_sell([0.0] * forest.n_features)
+assert 'sklearn' not in sys.modules
+elapsed = time.perf_counter() - start
+print(elapsed, [line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM')][0])
+"""
+
+
+def _measure(script, runs=5):
+    # Peak RSS comes from VmHWM, which belongs to the child's own image; ru_maxrss survives exec
+    # and would report the parent's peak instead.
+    times, rss = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        elapsed, maxrss = out.stdout.split()
+        times.append(float(elapsed))
+        rss.append(int(maxrss))
+    return min(times), min(rss)
+
+
+def main():
+    import joblib
+
+    quantized_file = MODEL_ARTIFACT_FILE + '.f32'
+
+    print(f"--- Exporting '{MODEL_FILE}' to '{MODEL_ARTIFACT_FILE}' ---")
+    forest = CompiledForest.from_sklearn(joblib.load(MODEL_FILE))
+    data_hash = file_sha256(TRAINING_DATA_FILE)
+    export_forest(forest, MODEL_ARTIFACT_FILE, PREDICTION_THRESHOLD, data_hash)
+    export_forest(forest, quantized_file, PREDICTION_THRESHOLD, data_hash, quantize=True)
+
+    print("\n--- Cold start: import + load + first decision (best of 5, fresh interpreter) ---")
+    results = [
+        ('joblib + sklearn', MODEL_FILE, _JOBLIB_START),
+        ('artifact (float64, mmap)', MODEL_ARTIFACT_FILE, _ARTIFACT_START),
+        ('artifact (float32, mmap)', quantized_file, _ARTIFACT_START),
+    ]
+    for label, path, script in results:
+        elapsed, maxrss = _measure(script.format(path=path))
+        print(f"  {label:<26} {elapsed * 1000:8.1f} ms  {maxrss / 1024:6.1f} MB max RSS  {os.path.getsize(path) / 1024:7.1f} KB on disk")
+
+    os.remove(quantized_file)
+
+
+if __name__ == "__main__":
+    main()
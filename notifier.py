@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from metrics import metrics
+
+
+# --- PRIORITIES (lower is sent first) ---
+PRIORITY_FILL = 0
+PRIORITY_ERROR = 1
+PRIORITY_INFO = 2
+PRIORITY_REPORT = 3
+
+MESSAGE_SEPARATOR = "\n\n"
+MARKDOWN_SPECIAL = ('_', '*', '`', '[')  # what Telegram's legacy Markdown lets a backslash escape
+
+
+def escape_markdown(text):
+    """`text` (e.g. an exception message) made literal inside a Telegram Markdown message."""
+    text = str(text)
+    for char in MARKDOWN_SPECIAL:
+        text = text.replace(char, '\\' + char)
+    return text
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `capacity` banked."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        self._refill()
+        while self.tokens < 1:
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+
+# --- BACKGROUND NOTIFIER ---
+class Notifier:
+    """
+    Decouples the trading loop from Telegram. notify() only enqueues and never
+    awaits the network; a background task drains the queue:
+    - messages leave in priority order (fills, then errors, info, reports);
+    - everything that arrives within `coalesce_window` is merged into one message;
+      if Telegram rejects the merged message, its parts are resent one by one,
+      and a part it still rejects is sent once more as plain text;
+    - sends are paced by a token bucket to stay under Telegram's rate limits;
+    - an error identical to one sent in the last `repeat_window` seconds is
+      counted instead of sent, and a one-line summary follows later;
+    - the queue is bounded: when full, the lowest-priority message is dropped.
+    """
+
+    def __init__(self, sender, max_queue=100, coalesce_window=0.5, max_message_chars=3500,
+                 rate=0.5, burst=5, repeat_window=300.0):
+        self.sender = sender
+        self.max_queue = max_queue
+        self.coalesce_window = coalesce_window
+        self.max_message_chars = max_message_chars
+        self.bucket = TokenBucket(rate, burst)
+        self.repeat_window = repeat_window
+        self.queue = []  # (priority, seq, text)
+        self.seq = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.recent_errors = {}  # text -> [last_sent_at, suppressed_count]
+        self.dropped = 0
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return self
+
+    def notify(self, text, priority=PRIORITY_INFO):
+        if priority == PRIORITY_ERROR and self._suppress_repeat(text):
+            return
+        if len(self.queue) >= self.max_queue:
+            worst = max(self.queue)
+            self.dropped += 1
+            metrics.inc('notifications_dropped')
+            if (priority, float('inf')) >= worst[:2]:
+                return
+            self.queue.remove(worst)
+            heapq.heapify(self.queue)
+        heapq.heappush(self.queue, (priority, next(self.seq), text))
+        self.wakeup.set()
+
+    async def send_message(self, text, parse_mode='Markdown'):
+        """Drop-in for TelegramBot.send_message(): enqueues as an info message."""
+        self.notify(text)
+
+    def _suppress_repeat(self, text):
+        now = time.monotonic()
+        entry = self.recent_errors.get(text)
+        if entry is not None and now - entry[0] < self.repeat_window:
+            entry[1] += 1
+            return True
+        self.recent_errors[text] = [now, 0]
+        return False
+
+    def _repeat_summaries(self, force=False):
+        now = time.monotonic()
+        lines = []
+        for text, (sent_at, suppressed) in list(self.recent_errors.items()):
+            if now - sent_at < self.repeat_window and not force:
+                continue
+            if suppressed:
+                lines.append(f"🔁 Repeated {suppressed} more times: {text[:200]}")
+            del self.recent_errors[text]
+        return lines
+
+    def _next_batch(self):
+        parts, size = [], 0
+        while self.queue:
+            text = self.queue[0][2]
+            if parts and size + len(MESSAGE_SEPARATOR) + len(text) > self.max_message_chars:
+                break
+            heapq.heappop(self.queue)
+            parts.append(text)
+            size += len(text) + len(MESSAGE_SEPARATOR)
+        return parts
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.repeat_window)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            # Give a burst a moment to arrive so it leaves as one message.
+            await asyncio.sleep(self.coalesce_window)
+            await self._flush()
+
+    async def _flush(self, force_summaries=False):
+        summaries = self._repeat_summaries(force_summaries)
+        if summaries:
+            heapq.heappush(self.queue, (PRIORITY_ERROR, next(self.seq), "\n".join(summaries)))
+        if self.dropped:
+            heapq.heappush(self.queue, (PRIORITY_INFO, next(self.seq), f"⚠️ {self.dropped} notifications dropped (queue full)."))
+            self.dropped = 0
+        while self.queue:
+            batch = self._next_batch()
+            if await self._send(MESSAGE_SEPARATOR.join(batch)):
+                continue
+            # One bad part must not take the others down with it.
+            for text in batch:
+                if len(batch) == 1 or not await self._send(text):
+                    await self._send(text, plain=True)
+
+    async def _send(self, text, plain=False):
+        """One paced send; True if the sender accepted it."""
+        await self.bucket.acquire()
+        try:
+            with metrics.span('telegram_send'):
+                await self.sender.send_message(text, parse_mode=None if plain else 'Markdown')
+            metrics.inc('notifications_sent')
+            return True
+        except Exception as e:
+            print(f"Error sending notification{' as plain text' if plain else ''}: {e}")
+            metrics.inc('notifications_failed')
+            return False
+
+    async def stop(self, timeout=10.0):
+        """Cancels the background task and makes a best-effort attempt to send what is still queued."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await asyncio.wait_for(self._flush(force_summaries=True), timeout)
+        except asyncio.TimeoutError:
+            print("Timed out sending queued notifications.")
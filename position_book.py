@@ -0,0 +1,238 @@
+import time
+
+import numpy as np
+
+
+POSITION_DTYPE = np.dtype([
+    ('symbol', np.int32),    # index into PositionBook.symbols
+    ('side', np.int8),       # +1 buy, -1 sell
+    ('entry_price', np.float64),
+    ('sl_price', np.float64),
+    ('tp_price', np.float64),
+    ('size', np.float64),
+    ('order_id', 'U48'),
+    ('opened', np.float64),  # loop clock reading at open, for triggered_range(); not journaled
+])
+SIDES = {'buy': 1, 'sell': -1}
+SIDE_NAMES = {1: 'buy', -1: 'sell'}
+# Relative slack on the exposure cap: positions sized at the full balance land exactly on a whole multiple of it.
+EXPOSURE_TOLERANCE = 1e-9
+
+
+# --- POSITION BOOK ---
+class PositionBook:
+    """
+    Open positions in one structured NumPy array. Rows are unordered:
+    removing a position moves the last row into its slot (swap-delete), so
+    adding and removing are O(1) and the live rows are always rows[:len].
+    triggered() finds every TP/SL hit for a set of prices in one vectorized
+    pass over all positions.
+    """
+
+    def __init__(self, capacity=16):
+        self.rows = np.zeros(capacity, dtype=POSITION_DTYPE)
+        self.n = 0
+        self.symbols = []
+        self.symbol_ids = {}
+
+    def __len__(self):
+        return self.n
+
+    def _symbol_id(self, symbol):
+        if symbol not in self.symbol_ids:
+            self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.symbol_ids[symbol]
+
+    @property
+    def live(self):
+        return self.rows[:self.n]
+
+    def add(self, symbol, side, entry_price, sl_price, tp_price, size, order_id=None, opened=-np.inf):
+        if self.n == len(self.rows):
+            self.rows = np.concatenate([self.rows, np.zeros(len(self.rows), dtype=POSITION_DTYPE)])
+        self.rows[self.n] = (self._symbol_id(symbol), SIDES[side], entry_price, sl_price, tp_price, size,
+                             '' if order_id is None else str(order_id), opened)
+        self.n += 1
+        return self.n - 1
+
+    def remove(self, indices):
+        """Swap-deletes the given rows; highest index first so pending indices stay valid."""
+        for index in sorted(indices, reverse=True):
+            self.n -= 1
+            if index != self.n:
+                self.rows[index] = self.rows[self.n]
+
+    def trade(self, index):
+        """One position as the trade dict the rest of the bot uses."""
+        row = self.rows[index]
+        return {
+            'symbol': self.symbols[row['symbol']],
+            'side': SIDE_NAMES[int(row['side'])],
+            'entry_price': float(row['entry_price']),
+            'sl_price': float(row['sl_price']),
+            'tp_price': float(row['tp_price']),
+            'size': float(row['size']),
+            'order_id': str(row['order_id']) or None,
+        }
+
+    def find(self, order_id):
+        """Row index of the position opened by `order_id`, or None."""
+        matches = np.flatnonzero(self.live['order_id'] == str(order_id))
+        return int(matches[0]) if len(matches) else None
+
+    def trades(self, symbol=None):
+        if symbol is None:
+            return [self.trade(i) for i in range(self.n)]
+        return [self.trade(i) for i in np.flatnonzero(self.symbol_mask(symbol))]
+
+    def symbol_mask(self, symbol):
+        symbol_id = self.symbol_ids.get(symbol)
+        return self.live['symbol'] == (-1 if symbol_id is None else symbol_id)
+
+    def count(self, symbol=None):
+        return self.n if symbol is None else int(np.count_nonzero(self.symbol_mask(symbol)))
+
+    def open_symbols(self):
+        return sorted({self.symbols[i] for i in np.unique(self.live['symbol'])})
+
+    def exposure(self):
+        live = self.live
+        return float(np.sum(live['entry_price'] * live['size']))
+
+    def _price_by_position(self, prices):
+        price_by_id = np.full(len(self.symbols), np.nan)
+        for symbol, price in prices.items():
+            if symbol in self.symbol_ids:
+                price_by_id[self.symbol_ids[symbol]] = price
+        return price_by_id[self.live['symbol']] if len(self.symbols) else np.empty(0)
+
+    def triggered(self, prices):
+        """
+        TP/SL hits for `prices` ({symbol: price}; positions of other symbols are
+        skipped). TP is checked before SL, as in the original loop. Returns
+        (indices, hit_tp, gross_pnl) arrays.
+        """
+        price = self._price_by_position(prices)
+        return self._hits(price, price)
+
+    def triggered_range(self, lows, highs, prices=None, since=None):
+        """
+        Like triggered(), but for the low/high a price touched since the last
+        check ({symbol: price} each), so a level that was crossed and left again
+        in between still triggers. If one range reached both levels the order is
+        unknown and the position counts as stopped out. Positions opened at or
+        after `since` (when the range started) are only checked at `prices`,
+        as the range may hold prices from before they existed.
+        """
+        low, high = self._price_by_position(lows), self._price_by_position(highs)
+        if since is not None:
+            fresh = self.live['opened'] >= since
+            if fresh.any():
+                price = self._price_by_position(prices)
+                low, high = np.where(fresh, price, low), np.where(fresh, price, high)
+        return self._hits(low, high, sl_first=True)
+
+    def _hits(self, low, high, sl_first=False):
+        live = self.live
+        side = live['side']
+        buy = side == 1
+        # NaN prices compare False everywhere, so positions without a price never trigger.
+        hit_tp = np.where(buy, high >= live['tp_price'], low <= live['tp_price'])
+        hit_sl = np.where(buy, low <= live['sl_price'], high >= live['sl_price'])
+        if sl_first:
+            hit_tp &= ~hit_sl
+        else:
+            hit_sl &= ~hit_tp
+        indices = np.flatnonzero(hit_tp | hit_sl)
+        exit_price = np.where(hit_tp[indices], live['tp_price'][indices], live['sl_price'][indices])
+        gross_pnl = (exit_price - live['entry_price'][indices]) * live['size'][indices] * side[indices]
+        return indices, hit_tp[indices], gross_pnl
+
+
+# --- TRADE RULES ---
+# The live bot and the shadow portfolios (shadow.py) size, cap and charge trades with these, so both follow the same rules.
+def plan_trade(portfolio, side, entry_price):
+    """SL, TP, size and notional of a new position risking risk_per_trade_percent of the portfolio balance."""
+    risk_percent = portfolio['risk_per_trade_percent']
+    risk_amount_usd = portfolio['balance'] * risk_percent
+    if side == 'buy':
+        sl_price = entry_price * (1 - risk_percent)
+        tp_price = entry_price * (1 + (risk_percent * portfolio['rr_ratio']))
+    else:  # 'sell'
+        sl_price = entry_price * (1 + risk_percent)
+        tp_price = entry_price * (1 - (risk_percent * portfolio['rr_ratio']))
+    position_value = risk_amount_usd / risk_percent
+    return sl_price, tp_price, position_value / entry_price, position_value
+
+
+def can_open(portfolio, position_value, symbol=None, symbol_max_open=None):
+    """Global trade cap, per-symbol trade cap and total exposure cap."""
+    book = portfolio['positions']
+    if len(book) >= portfolio['max_open_trades']:
+        return False
+    if symbol_max_open is not None and book.count(symbol) >= symbol_max_open:
+        return False
+    if portfolio['max_exposure_multiple'] is None:
+        return True
+    return book.exposure() + position_value <= portfolio['max_exposure_multiple'] * portfolio['balance'] * (1 + EXPOSURE_TOLERANCE)
+
+
+def close_fees(portfolio, trade, exit_price):
+    return (trade['entry_price'] * trade['size'] + exit_price * trade['size']) * portfolio['fee_percent']
+
+
+def _check_list(open_trades, prices):
+    """The original list-of-dicts scan, kept as the reference for main()."""
+    closed = []
+    for trade in open_trades:
+        current_price = prices[trade['symbol']]
+        if trade['side'] == 'buy':
+            if current_price >= trade['tp_price']:
+                closed.append((trade, (trade['tp_price'] - trade['entry_price']) * trade['size']))
+            elif current_price <= trade['sl_price']:
+                closed.append((trade, (trade['sl_price'] - trade['entry_price']) * trade['size']))
+        else:
+            if current_price <= trade['tp_price']:
+                closed.append((trade, (trade['entry_price'] - trade['tp_price']) * trade['size']))
+            elif current_price >= trade['sl_price']:
+                closed.append((trade, (trade['entry_price'] - trade['sl_price']) * trade['size']))
+    trades_to_remove = [trade for trade, _ in closed]
+    return closed, [t for t in open_trades if t not in trades_to_remove]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    symbols = [f"C{i}/USDC:USDC" for i in range(12)]
+    for n in (10, 100, 1000):
+        book, trades = PositionBook(), []
+        for i in range(n):
+            symbol, side = symbols[i % len(symbols)], ('buy', 'sell')[i % 2]
+            entry = 100 * (1 + rng.normal(0, 0.01))
+            sl, tp = (entry * 0.98, entry * 1.06) if side == 'buy' else (entry * 1.02, entry * 0.94)
+            book.add(symbol, side, entry, sl, tp, 1.0, str(i))
+            trades.append(book.trade(book.n - 1))
+        prices = {s: 100 * (1 + rng.normal(0, 0.03)) for s in symbols}
+
+        closed, _ = _check_list(trades, prices)
+        indices, _, pnl = book.triggered(prices)
+        reference = sorted((t['order_id'], p) for t, p in closed)
+        vectorized = sorted(zip(book.live['order_id'][indices].tolist(), pnl.tolist()))
+        assert [r[0] for r in reference] == [v[0] for v in vectorized]
+        assert np.allclose([r[1] for r in reference], [v[1] for v in vectorized], rtol=0, atol=1e-12)
+
+        repeat = max(1, 20000 // n)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            _check_list(trades, prices)
+        list_time = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            book.triggered(prices)
+        book_time = (time.perf_counter() - start) / repeat
+        print(f"{n:5d} positions, {len(indices):4d} hits: list scan + removal {list_time * 1e6:9.1f} us, "
+              f"position book {book_time * 1e6:7.1f} us (identical hits and P&L)")
+
+
+if __name__ == "__main__":
+    main()
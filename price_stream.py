@@ -0,0 +1,231 @@
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+
+from metrics import metrics, Histogram
+from position_book import PositionBook
+
+
+# --- REPLAY STAND-IN ---
+class ReplayPriceStream:
+    """
+    Local stand-in for the websocket feed: replays recorded ticks
+    [(timestamp ms, symbol, price)] through the same watch_prices() interface
+    as AsyncExchange, at `speed` times real time (None: as fast as possible).
+    """
+
+    has_price_stream = True
+
+    def __init__(self, ticks, speed=1.0, sleep=asyncio.sleep):
+        self.ticks = ticks
+        self.speed = speed
+        self.sleep = sleep
+
+    async def watch_prices(self, symbols):
+        wanted = set(symbols)
+        previous = None
+        for i, (timestamp, symbol, price) in enumerate(self.ticks):
+            if self.speed and previous is not None and timestamp > previous:
+                await self.sleep((timestamp - previous) / 1000 / self.speed)
+            elif i % 256 == 0:
+                await asyncio.sleep(0)  # let the consumer run during an unthrottled replay
+            previous = timestamp
+            if symbol in wanted:
+                yield symbol, price, timestamp
+
+
+def candle_ticks(rows, symbol, period_ms, steps=1):
+    """
+    Synthetic ticks for (timestamp, open, high, low, close, ...) candles along
+    the usual intrabar path: open, then the extreme against the candle's
+    direction, then the other extreme, then close. With steps > 1 every leg
+    is interpolated linearly, like a dense feed.
+    """
+    ticks = []
+    n = 3 * steps + 1
+    offsets = np.arange(n) * (period_ms // n)
+    for timestamp, open, high, low, close, *_ in rows:
+        first, second = (low, high) if close >= open else (high, low)
+        path = np.interp(np.arange(n), [0, steps, 2 * steps, 3 * steps], [open, first, second, close])
+        ticks += [(timestamp + int(offset), symbol, float(price)) for offset, price in zip(offsets, path)]
+    return ticks
+
+
+# --- INTRABAR TP/SL MONITOR ---
+class PriceMonitor:
+    """
+    Checks every open position against every streamed price update,
+    independently of the candle cycle.
+
+    Updates are folded per symbol into the low, high and last price seen since
+    the previous check, and one consumer task hands that batch to
+    `on_prices(batch, started)` ({symbol: (low, high, last)}, and the `clock`
+    reading at its first update) as soon as it is free.
+    While updates arrive slower than checks run, each one is checked on its
+    own. When they burst, they are merged rather than queued: memory stays at
+    one entry per symbol, the check always sees the newest price, and the
+    low/high keep any level that was touched in between. Closes triggered
+    by a check run as separate tasks, at most `max_inflight` at a time, so a
+    slow exchange round-trip never delays the next check.
+
+    `source` is anything with watch_prices(symbols) (AsyncExchange,
+    ReplayPriceStream). A dropped stream is reconnected with backoff;
+    healthy() tells the bot when to fall back to polling. `clock` and
+    `sleep` are injectable like the scheduler's, and `checkpoint`, when
+    given, is awaited with the pending batch just before it is taken, so
+    market_log can record and replay where the batches were cut.
+    """
+
+    def __init__(self, source, symbols, on_prices, max_inflight=8, stale_after=30.0,
+                 clock=time.monotonic, sleep=asyncio.sleep, checkpoint=None):
+        self.source = source
+        self.symbols = symbols
+        self.on_prices = on_prices
+        self.max_inflight = max_inflight
+        self.stale_after = stale_after
+        self.clock = clock
+        self.sleep = sleep
+        self.checkpoint = checkpoint
+        self.pending = {}
+        self.pending_since = None
+        self.pending_started = None
+        self.wakeup = asyncio.Event()
+        self.inflight = set()
+        self.last_update = None
+        self.updates = 0
+        self.merged = 0
+        self.checks = 0
+        self.latency = Histogram()  # first pending update -> check done
+
+    def healthy(self):
+        return self.last_update is not None and self.clock() - self.last_update < self.stale_after
+
+    def ingest(self, symbol, price):
+        entry = self.pending.get(symbol)
+        if entry is None:
+            self.pending[symbol] = [price, price, price]
+            if self.pending_since is None:
+                self.pending_since = time.perf_counter()
+                self.pending_started = self.clock()
+        else:
+            entry[0] = min(entry[0], price)
+            entry[1] = max(entry[1], price)
+            entry[2] = price
+            self.merged += 1
+        self.updates += 1
+        self.last_update = self.clock()
+        self.wakeup.set()
+
+    async def _consume(self):
+        while True:
+            await self.wakeup.wait()
+            if self.checkpoint is not None:
+                await self.checkpoint(self.pending)
+            self.wakeup.clear()
+            batch, since, started = self.pending, self.pending_since, self.pending_started
+            self.pending, self.pending_since, self.pending_started = {}, None, None
+            if not batch:
+                continue
+            if len(self.inflight) >= self.max_inflight:
+                await asyncio.wait(self.inflight, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.ensure_future(self.on_prices(batch, started))
+            self.inflight.add(task)
+            task.add_done_callback(self._done)
+            # The check itself is synchronous up to the first exchange call; yield once so it runs now.
+            await asyncio.sleep(0)
+            self.checks += 1
+            elapsed = time.perf_counter() - since
+            self.latency.observe(elapsed)
+            metrics.observe('tick_to_check', elapsed)
+
+    def _done(self, task):
+        self.inflight.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Intrabar TP/SL check failed: {task.exception()}")
+
+    async def run(self):
+        consumer = asyncio.create_task(self._consume())
+        backoff = 1.0
+        try:
+            while True:
+                try:
+                    async for symbol, price, _ in self.source.watch_prices(self.symbols):
+                        self.ingest(symbol, price)
+                        backoff = 1.0
+                    return  # a finite source (a replay) has ended
+                except Exception as e:
+                    metrics.inc('price_stream_errors')
+                    print(f"Price stream error: {e}; reconnecting in {backoff:.0f}s.")
+                    await self.sleep(backoff)
+                    backoff = min(backoff * 2, 60.0)
+        finally:
+            # Let the last batch be checked before stopping.
+            while (self.pending or self.wakeup.is_set()) and not consumer.done():
+                await asyncio.sleep(0)
+            consumer.cancel()
+            if self.inflight:
+                await asyncio.wait(self.inflight)
+
+
+def main():
+    df = pd.read_csv('btc_15m_data.csv')
+    timestamps = pd.to_datetime(df['timestamp']).values.astype('datetime64[ms]').astype(np.int64)
+    rows = list(zip(timestamps.tolist(), df['open'], df['high'], df['low'], df['close']))
+    symbol = 'BTC/USDC:USDC'
+
+    # Fill quality: a position opened at every 10th close, with stops checked on
+    # every tick of a dense synthetic feed vs only against candle closes. Slippage is how far past
+    # its stop a position was closed, in basis points of the entry.
+    books = {'tick': PositionBook(), 'close': PositionBook()}
+    slippage = {'tick': [], 'close': []}
+
+    def settle(name, price):
+        book = books[name]
+        indices, hit_tp, _ = book.triggered({symbol: price})
+        for i, tp in zip(indices.tolist(), hit_tp.tolist()):
+            row = book.rows[i]
+            if not tp:
+                slippage[name].append((row['sl_price'] - price) * row['side'] / row['entry_price'] * 1e4)
+        book.remove(indices.tolist())
+
+    for i, row in enumerate(rows):
+        for _, _, price in candle_ticks([row], symbol, 900_000, steps=50):
+            settle('tick', price)
+        settle('close', row[4])
+        if i % 10 == 0:
+            entry, side = row[4], ('buy', 'sell')[i // 10 % 2]
+            sl, tp = (entry * 0.995, entry * 1.015) if side == 'buy' else (entry * 1.005, entry * 0.985)
+            for book in books.values():
+                book.add(symbol, side, entry, sl, tp, 1.0, str(i))
+    for name in ('close', 'tick'):
+        values = np.array(slippage[name])
+        print(f"Stops checked per {name:<5}: {len(values):3d} stopped out, slippage past the stop mean {values.mean():5.1f} bps, "
+              f"worst {values.max():5.1f} bps")
+
+    # Monitor latency: a paced stream (one tick per ms) and an unthrottled burst.
+    async def replay(ticks, speed):
+        book = PositionBook()
+        for k in range(50):
+            book.add(symbol, 'buy', 100_000.0, 1.0, 1e9, 1.0, str(k))  # levels never reached: every check scans the book
+
+        async def on_prices(batch, started):
+            book.triggered_range({s: v[0] for s, v in batch.items()}, {s: v[1] for s, v in batch.items()},
+                                 {s: v[2] for s, v in batch.items()}, started)
+
+        monitor = PriceMonitor(ReplayPriceStream(ticks, speed=speed), [symbol], on_prices)
+        start = time.perf_counter()
+        await monitor.run()
+        return monitor, time.perf_counter() - start
+
+    paced = [(k, symbol, price) for k, (_, _, price) in enumerate(candle_ticks(rows[:250], symbol, 900_000))]
+    burst = candle_ticks(rows, symbol, 900_000) * 20
+    for name, ticks, speed in (('paced, 1 tick/ms', paced, 1.0), ('burst, unthrottled', burst, None)):
+        monitor, elapsed = asyncio.run(replay(ticks, speed))
+        print(f"{name:<19} {monitor.updates:6d} ticks in {elapsed:6.2f} s: {monitor.checks:5d} checks, {monitor.merged:6d} merged, "
+              f"tick->check p50 {monitor.latency.quantile(0.5) * 1e6:6.0f} us, p99 {monitor.latency.quantile(0.99) * 1e6:6.0f} us")
+
+
+if __name__ == "__main__":
+    main()
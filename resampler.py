@@ -0,0 +1,193 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from scheduler import timeframe_seconds
+
+
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def timestamps_ms(values):
+    """Epoch milliseconds from a datetime-like column (btc_15m_data.csv strings, candle store datetimes, ...)."""
+    return pd.to_datetime(values).values.astype('datetime64[ms]').astype(np.int64)
+
+
+# --- BARS OF ONE TIMEFRAME ---
+class TimeframeBars:
+    """
+    The newest `keep` closed bars of one timeframe in preallocated NumPy
+    columns (column() returns views), plus the still-forming bar.
+    """
+
+    def __init__(self, timeframe, keep=50):
+        self.timeframe = timeframe
+        self.period_ms = timeframe_seconds(timeframe) * 1000
+        self.keep = keep
+        self.timestamps = np.zeros(2 * keep, dtype=np.int64)
+        self.values = np.zeros((2 * keep, len(COLUMNS)), dtype=np.float64)
+        self.start = 0
+        self.end = 0
+        self.forming = None  # [bucket timestamp, open, high, low, close, volume]
+        self.partial = False  # the forming bar started after its bucket did
+
+    def __len__(self):
+        return self.end - self.start
+
+    def column(self, name):
+        if name == 'timestamp':
+            return self.timestamps[self.start:self.end]
+        return self.values[self.start:self.end, COLUMNS.index(name)]
+
+    def clear(self):
+        self.start = self.end = 0
+        self.forming = None
+        self.partial = False
+
+    def _close_forming(self):
+        if self.partial:
+            # The stream began mid-bucket (a fresh start or a rebuilt window): such a
+            # bar is missing candles, so it is dropped rather than used as a feature.
+            self.forming = None
+            self.partial = False
+            return False
+        if self.end == len(self.timestamps):
+            self.timestamps[:self.keep - 1] = self.timestamps[self.end - self.keep + 1:self.end]
+            self.values[:self.keep - 1] = self.values[self.end - self.keep + 1:self.end]
+            self.start, self.end = 0, self.keep - 1
+        self.timestamps[self.end] = self.forming[0]
+        self.values[self.end] = self.forming[1:]
+        self.end += 1
+        self.start = max(self.start, self.end - self.keep)
+        self.forming = None
+        return True
+
+    def add(self, timestamp, open, high, low, close, volume, base_period_ms):
+        """
+        Folds one base candle into the forming bar. Returns True when a bar
+        was closed: this candle was the last of its bucket, or it starts a new
+        bucket while an older one was still forming (a gap). A first bar that
+        starts mid-bucket is never closed.
+        """
+        bucket = timestamp - timestamp % self.period_ms
+        closed = False
+        if self.forming is not None and self.forming[0] != bucket:
+            closed = self._close_forming()
+        if self.forming is None:
+            self.forming = [bucket, open, high, low, close, volume]
+            self.partial = timestamp != bucket and not len(self)
+        else:
+            forming = self.forming
+            forming[2] = max(forming[2], high)
+            forming[3] = min(forming[3], low)
+            forming[4] = close
+            forming[5] += volume
+        if timestamp + base_period_ms >= bucket + self.period_ms:
+            closed = self._close_forming() or closed
+        return closed
+
+
+# --- RESAMPLER ---
+class Resampler:
+    """
+    Builds bars of several higher timeframes from one stream of closed base
+    candles (15m -> 1h/4h, or 1m -> 15m) without ever re-reading history:
+    every update() folds one candle into each timeframe's forming bar, and a
+    bar is closed as soon as its last base candle arrives. Buckets are aligned
+    to the epoch like exchange candles (and pandas resample for timeframes
+    that divide a day).
+
+    The bot feeds it the candle cache with sync(); batch code streams a whole
+    DataFrame through the same update() (see resample_frame), so live and
+    training bars are identical by construction.
+    """
+
+    def __init__(self, base_timeframe, timeframes, keep=50):
+        self.base_timeframe = base_timeframe
+        self.base_period_ms = timeframe_seconds(base_timeframe) * 1000
+        for timeframe in timeframes:
+            period_ms = timeframe_seconds(timeframe) * 1000
+            if period_ms <= self.base_period_ms or period_ms % self.base_period_ms:
+                raise ValueError(f"'{timeframe}' is not a multiple of the base timeframe '{base_timeframe}'")
+        self.bars = {timeframe: TimeframeBars(timeframe, keep) for timeframe in timeframes}
+        self.last_timestamp = None
+
+    def reset(self):
+        for bars in self.bars.values():
+            bars.clear()
+        self.last_timestamp = None
+
+    def update(self, timestamp, open, high, low, close, volume):
+        """Adds one closed base candle; returns the timeframes that closed a bar with it."""
+        self.last_timestamp = timestamp
+        return [timeframe for timeframe, bars in self.bars.items()
+                if bars.add(timestamp, open, high, low, close, volume, self.base_period_ms)]
+
+    def sync(self, candles):
+        """
+        Adds every (timestamp, open, high, low, close, volume) row newer than
+        the last one seen; if the last seen row left the window the state is
+        rebuilt from the window (same contract as StreamingFeatures.sync).
+        """
+        candles = list(candles)
+        if not candles:
+            return
+        timestamps = [c[0] for c in candles]
+        if self.last_timestamp is None or self.last_timestamp not in timestamps:
+            self.reset()
+            start = 0
+        else:
+            start = timestamps.index(self.last_timestamp) + 1
+        for row in candles[start:]:
+            self.update(*row[:6])
+
+
+def resample_frame(df, base_timeframe, timeframe):
+    """Batch mode: streams an OHLCV DataFrame through a Resampler and returns the closed `timeframe` bars."""
+    resampler = Resampler(base_timeframe, [timeframe], keep=len(df))
+    rows = zip(timestamps_ms(df['timestamp']).tolist(), *(df[c].values.tolist() for c in COLUMNS))
+    for row in rows:
+        resampler.update(*row)
+    bars = resampler.bars[timeframe]
+    out = pd.DataFrame(bars.values[bars.start:bars.end], columns=COLUMNS)
+    out.insert(0, 'timestamp', pd.to_datetime(bars.column('timestamp'), unit='ms'))
+    return out
+
+
+def main():
+    df = pd.read_csv('btc_15m_data.csv')
+    indexed = df.assign(timestamp=pd.to_datetime(df['timestamp'])).set_index('timestamp')
+
+    print("--- Resampler vs pandas resample ---")
+    for timeframe, rule in (('1h', '1h'), ('4h', '4h')):
+        start = time.perf_counter()
+        ours = resample_frame(df, '15m', timeframe)
+        elapsed = time.perf_counter() - start
+        reference = indexed.resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+        # pandas also emits the partial first and last buckets; the resampler only emits complete bars.
+        reference = reference.dropna()
+        reference = reference[reference.index >= ours['timestamp'].iloc[0]].iloc[:len(ours)]
+        assert (ours['timestamp'].values == reference.index.values).all()
+        error = np.abs(ours[COLUMNS].values - reference[COLUMNS].values).max()
+        print(f"{timeframe}: {len(ours)} bars, max abs difference {error:.3e}, batch {elapsed / len(df) * 1e6:.2f} us per base candle")
+
+    # Live cost: one incremental update per closed candle vs re-resampling a 200-candle window every cycle.
+    rows = list(zip(timestamps_ms(df['timestamp']).tolist(), *(df[c].values.tolist() for c in COLUMNS)))
+    resampler = Resampler('15m', ['1h', '4h'])
+    start = time.perf_counter()
+    for row in rows:
+        resampler.update(*row)
+    incremental = (time.perf_counter() - start) / len(rows)
+    n_windows = 200
+    start = time.perf_counter()
+    for end in range(len(indexed) - n_windows, len(indexed)):
+        window = indexed.iloc[end - 200:end]
+        for rule in ('1h', '4h'):
+            window.resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+    per_cycle = (time.perf_counter() - start) / n_windows
+    print(f"Per new candle (1h + 4h): incremental {incremental * 1e6:.2f} us, pandas resample of a 200-candle window {per_cycle * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from candle_store import CandleStore, STORE_DIR
+from config import MODEL_FILE, MODEL_ARTIFACT_FILE, PREDICTION_THRESHOLD, FEATURE_COLUMNS, TIMEFRAME
+from config import LABEL_RISK_PERCENT, LABEL_RR_RATIO, LABEL_LOOKAHEAD
+from config import RETRAIN_SYMBOL, RETRAIN_WINDOW_DAYS, RETRAIN_HOLDOUT_DAYS, RETRAIN_ADD_TREES, RETRAIN_MAX_TREES, RETRAIN_MIN_TRADES
+from create_master_dataset import build_master_frame
+from fetch_binance_data import KlinesDownloader
+from forest_inference import CompiledForest
+from model_artifact import export_forest, load_forest
+from scheduler import timeframe_seconds
+
+
+# --- WALK-FORWARD DATASET ---
+def walk_forward_split(candles, holdout_bars, lookahead=LABEL_LOOKAHEAD):
+    """
+    Builds buy + sign-flipped sell rows from an OHLCV DataFrame and splits them
+    in time: the last `holdout_bars` bars with a complete label window are the
+    holdout, everything before them minus a `lookahead`-bar purge is training
+    data, so no training label looks into the holdout. The final `lookahead`
+    bars are dropped because their labels cannot be known yet.
+    Returns ((X_train, y_train), (X_holdout, y_holdout)) as float32/int8 arrays.
+    """
+    buy, sell = build_master_frame(candles, LABEL_RISK_PERCENT, LABEL_RR_RATIO, lookahead)
+    usable = len(candles) - lookahead
+    holdout_start = usable - holdout_bars
+    train_end = holdout_start - lookahead
+    if train_end <= 0:
+        raise ValueError(f"{len(candles)} candles are not enough for a {holdout_bars}-bar holdout plus two {lookahead}-bar label windows")
+
+    def rows(start, end):
+        frame = pd.concat([buy.iloc[start:end], sell.iloc[start:end]], ignore_index=True).dropna()
+        return frame[FEATURE_COLUMNS].values.astype(np.float32), frame['label'].values.astype(np.int8)
+
+    return rows(0, train_end), rows(holdout_start, usable)
+
+
+# --- TRAINING & VALIDATION ---
+def train_candidate(X, y, base_model=None, add_trees=RETRAIN_ADD_TREES, max_trees=RETRAIN_MAX_TREES):
+    """
+    Grows `base_model` by `add_trees` trees fitted on the new data (warm_start)
+    while it stays under `max_trees`; otherwise fits a fresh forest with the
+    parameters of train_unified_model.py. Class balancing is passed as sample
+    weights, which is what class_weight='balanced' does and also works with
+    warm_start. Returns (model, 'warm_start' | 'refit').
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.utils.class_weight import compute_sample_weight
+
+    weights = compute_sample_weight('balanced', y)
+    if base_model is not None and base_model.n_estimators + add_trees <= max_trees:
+        base_model.set_params(warm_start=True, n_estimators=base_model.n_estimators + add_trees, class_weight=None)
+        base_model.fit(X, y, sample_weight=weights)
+        return base_model, 'warm_start'
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+    model.fit(X, y, sample_weight=weights)
+    return model, 'refit'
+
+
+def evaluate(probabilities, y, threshold=PREDICTION_THRESHOLD, rr_ratio=LABEL_RR_RATIO):
+    """Trades taken at `threshold` and their expectancy in R (a win pays rr_ratio, a loss costs 1)."""
+    take = probabilities >= threshold
+    trades = int(take.sum())
+    wins = int(y[take].sum())
+    expectancy = (wins * rr_ratio - (trades - wins)) / trades if trades else float('nan')
+    return {'trades': trades, 'wins': wins, 'precision': wins / trades if trades else float('nan'), 'expectancy_r': expectancy}
+
+
+def _dump_atomic(model, path):
+    import joblib
+
+    tmp_path = f"{path}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def retrain(symbol=RETRAIN_SYMBOL, interval=TIMEFRAME, window_days=RETRAIN_WINDOW_DAYS, holdout_days=RETRAIN_HOLDOUT_DAYS,
+            artifact_file=MODEL_ARTIFACT_FILE, model_file=MODEL_FILE, store_root=STORE_DIR, sync=True,
+            min_trades=RETRAIN_MIN_TRADES, tolerance_r=0.0):
+    """
+    One walk-forward retraining run; meant to be executed in a worker process.
+    Syncs the candle store, trains a candidate on the latest `window_days`,
+    and compares it with the live artifact on the most recent `holdout_days`.
+    The candidate replaces the artifact (and the joblib model) only if it takes
+    at least `min_trades` holdout trades and its expectancy is no worse than the
+    live model's minus `tolerance_r`. Both files are swapped by atomic rename.
+    Returns a summary dict.
+    """
+    # sklearn/joblib are imported here, in the worker, so the bot can import this module without them.
+    import joblib
+
+    start = time.perf_counter()
+    store = CandleStore(store_root)
+    if sync:
+        try:
+            # An empty store only needs the candles this run trains and evaluates on, not the whole history.
+            now_ms = int(time.time() * 1000)
+            KlinesDownloader(store).sync([symbol], [interval], now_ms, since_ms=now_ms - (window_days + holdout_days) * 86_400_000)
+        except Exception as e:
+            print(f"Candle sync failed, retraining on stored candles: {e}")
+
+    bar_ms = timeframe_seconds(interval) * 1000
+    last = store.last_timestamp(symbol, interval)
+    if last is None:
+        return {'accepted': False, 'reason': f"no stored {symbol} {interval} candles"}
+    candles = store.to_dataframe(symbol, interval, start_ms=last - window_days * 86_400_000 + bar_ms)
+    holdout_bars = holdout_days * 86_400_000 // bar_ms
+    (X_train, y_train), (X_holdout, y_holdout) = walk_forward_split(candles, holdout_bars)
+
+    base_model = joblib.load(model_file) if os.path.exists(model_file) else None
+    model, mode = train_candidate(X_train, y_train, base_model)
+    candidate = CompiledForest.from_sklearn(model)
+    result = {
+        'mode': mode,
+        'n_trees': candidate.n_trees,
+        'train_rows': len(y_train),
+        'holdout_rows': len(y_holdout),
+        'candidate': evaluate(candidate.predict_proba1(X_holdout), y_holdout),
+        'current': None,
+    }
+    if os.path.exists(artifact_file):
+        current, _ = load_forest(artifact_file)
+        result['current'] = evaluate(current.predict_proba1(X_holdout), y_holdout)
+
+    cand, curr = result['candidate'], result['current']
+    if cand['trades'] < min_trades:
+        result.update(accepted=False, reason=f"only {cand['trades']} holdout trades (< {min_trades})")
+    elif curr is not None and curr['trades'] and cand['expectancy_r'] < curr['expectancy_r'] - tolerance_r:
+        result.update(accepted=False, reason=f"holdout expectancy {cand['expectancy_r']:.3f}R < live {curr['expectancy_r']:.3f}R")
+    else:
+        data_hash = hashlib.sha256(X_train.tobytes() + y_train.tobytes()).hexdigest()
+        export_forest(candidate, artifact_file, PREDICTION_THRESHOLD, data_hash)
+        _dump_atomic(model, model_file)
+        result.update(accepted=True, reason='passed walk-forward validation')
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def format_result(result):
+    if 'mode' not in result:
+        return f"Retraining skipped: {result['reason']}."
+    lines = [f"Retraining ({result['mode']}, {result['n_trees']} trees, {result['train_rows']} train / {result['holdout_rows']} holdout rows, "
+             f"{result['seconds']:.1f}s): {'ACCEPTED' if result['accepted'] else 'rejected'} - {result['reason']}"]
+    for name in ('candidate', 'current'):
+        stats = result[name]
+        if stats is not None:
+            lines.append(f"  {name:<9} {stats['trades']:4d} trades, precision {stats['precision']:.3f}, expectancy {stats['expectancy_r']:+.3f}R")
+    return "\n".join(lines)
+
+
+def main():
+    print(f"--- Walk-forward retraining on {RETRAIN_SYMBOL} {TIMEFRAME} (last {RETRAIN_WINDOW_DAYS} days, {RETRAIN_HOLDOUT_DAYS}-day holdout) ---")
+    print(format_result(retrain()))
+
+
+if __name__ == "__main__":
+    main()
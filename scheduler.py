@@ -0,0 +1,116 @@
+import asyncio
+import math
+import time
+from collections import namedtuple
+
+
+TIMEFRAME_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# close_time: epoch seconds at which the bar closed; lateness: seconds between
+# that close and the callback; missed: bars that closed since the previous
+# callback without one of their own; stale: lateness exceeded max_lateness.
+BarClose = namedtuple('BarClose', ['close_time', 'lateness', 'missed', 'stale'])
+
+
+def timeframe_seconds(timeframe):
+    """'15m' -> 900, '4h' -> 14400, ..."""
+    return int(timeframe[:-1]) * TIMEFRAME_UNITS[timeframe[-1]]
+
+
+# --- CANDLE-CLOSE SCHEDULER ---
+class CandleScheduler:
+    """
+    Runs `on_close` once per `timeframe` bar, `close_delay` seconds after the
+    bar closes (the exchange needs a moment to publish it), and `on_monitor`
+    on a faster fixed cadence in between.
+
+    Every wake-up is computed from the absolute bar/monitor grid rather than
+    from the previous sleep, so slow callbacks or late timers never make the
+    schedule drift. If the loop falls behind by whole bars (a stall, a laptop
+    sleep), the missed bars are not replayed: on_close runs once for the newest
+    one, reports how many were missed, and flags the signal as stale when it
+    is more than `max_lateness` seconds old. Monitor ticks that were missed are
+    simply dropped. The first on_close runs immediately at startup.
+
+    `clock` and `sleep` are injectable so a replay can drive the scheduler on
+    a virtual clock.
+    """
+
+    def __init__(self, timeframe, close_delay=1.0, monitor_interval=10.0, max_lateness=30.0,
+                 clock=time.time, sleep=asyncio.sleep):
+        self.period = timeframe_seconds(timeframe)
+        self.close_delay = close_delay
+        self.monitor_interval = monitor_interval
+        self.max_lateness = max_lateness
+        self.clock = clock
+        self.sleep = sleep
+        self.missed_bars = 0
+
+    def last_close(self, now):
+        """Newest bar boundary that on_close may already run for."""
+        return math.floor((now - self.close_delay) / self.period) * self.period
+
+    def _next_monitor(self, now):
+        return (math.floor(now / self.monitor_interval) + 1) * self.monitor_interval
+
+    async def run(self, on_close, on_monitor=None):
+        last_run = None
+        next_monitor = None
+        while True:
+            now = self.clock()
+            bar_close = self.last_close(now)
+            if last_run is None or bar_close > last_run:
+                missed = 0 if last_run is None else round((bar_close - last_run) / self.period) - 1
+                self.missed_bars += missed
+                lateness = now - bar_close
+                await on_close(BarClose(bar_close, lateness, missed, lateness > self.max_lateness))
+                last_run = bar_close
+                next_monitor = self._next_monitor(self.clock())
+                continue
+
+            if on_monitor is not None and now >= next_monitor:
+                await on_monitor()
+                next_monitor = self._next_monitor(self.clock())
+                continue
+
+            target = last_run + self.period + self.close_delay
+            if on_monitor is not None:
+                target = min(target, next_monitor)
+            await self.sleep(max(0.0, target - now))
+
+
+def main():
+    # Runs the scheduler for two virtual hours with slow callbacks and one 40-minute stall.
+    state = {'now': 1_700_000_123.0}
+
+    def clock():
+        return state['now']
+
+    async def sleep(seconds):
+        state['now'] += seconds + 0.003  # timers always fire a little late
+
+    scheduler = CandleScheduler('15m', monitor_interval=10.0, clock=clock, sleep=sleep)
+    start = state['now']
+    monitors = []
+
+    async def on_close(bar):
+        print(f"close {bar.close_time:.0f}: ran at +{bar.lateness:6.3f}s  missed={bar.missed} stale={bar.stale}")
+        state['now'] += 0.4  # the cycle itself takes time
+
+    async def on_monitor():
+        monitors.append(state['now'] % 10)
+        state['now'] += 0.2
+        if len(monitors) == 300:
+            state['now'] += 2400
+        if state['now'] - start > 7200:
+            raise SystemExit
+
+    try:
+        asyncio.run(scheduler.run(on_close, on_monitor))
+    except SystemExit:
+        pass
+    print(f"{len(monitors)} monitor ticks, phase within the 10 s grid: max {max(monitors):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
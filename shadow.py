@@ -0,0 +1,241 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import MODEL_ARTIFACT_FILE, PREDICTION_THRESHOLD, FEATURE_COLUMNS
+from config import STARTING_BALANCE, MAX_OPEN_TRADES, MAX_EXPOSURE_MULTIPLE, RISK_PER_TRADE_PERCENT, RR_RATIO, FEE_PERCENT
+from forest_inference import SELL_SIGN
+from journal import new_state, apply_record
+from metrics import metrics
+from model_artifact import load_forest
+from position_book import plan_trade, can_open, close_fees
+
+
+# --- WORKER SIDE ---
+# Each worker process keeps its own memory-mapped copy of every shadow model,
+# reloaded when the artifact file changes on disk (e.g. a new candidate).
+_models = {}
+
+
+def _model(path):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _models.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _models[path] = (mtime, load_forest(path)[0])
+    return cached[1]
+
+
+def score_vectors(model_files, vectors):
+    """
+    Buy and sign-flipped sell probabilities of every model for every vector:
+    returns an array of shape (len(model_files), len(vectors), 2). Each model
+    scores all vectors in one batched call.
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    rows = np.concatenate([vectors, vectors * SELL_SIGN])
+    probs = np.empty((len(model_files), len(vectors), 2))
+    for i, path in enumerate(model_files):
+        p = _model(path).predict_proba1(rows)
+        probs[i, :, 0] = p[:len(vectors)]
+        probs[i, :, 1] = p[len(vectors):]
+    return probs
+
+
+# --- VIRTUAL PORTFOLIO ---
+class ShadowPortfolio:
+    """
+    One candidate model trading on paper: a portfolio dict shaped like the
+    bot's, opened, capped, sized and closed with the same rules
+    (plan_trade/can_open/close_fees and journal.apply_record), but no order
+    ever leaves the process.
+    """
+
+    def __init__(self, name, model_file=MODEL_ARTIFACT_FILE, threshold=PREDICTION_THRESHOLD):
+        self.name = name
+        self.model_file = model_file
+        self.threshold = threshold
+        self.portfolio = new_state(STARTING_BALANCE)
+        self.portfolio.update(max_open_trades=MAX_OPEN_TRADES, max_exposure_multiple=MAX_EXPOSURE_MULTIPLE,
+                              risk_per_trade_percent=RISK_PER_TRADE_PERCENT, rr_ratio=RR_RATIO, fee_percent=FEE_PERCENT)
+        self.seq = 0
+        self.fees = 0.0
+
+    def decide(self, symbol, buy_prob, sell_prob, price, symbol_max_open=None, opened=-np.inf):
+        """Same entry rule as run_symbol_cycle: buy first, then sell, both against the threshold."""
+        if len(self.portfolio['positions']) >= self.portfolio['max_open_trades']:
+            return None
+        if buy_prob >= self.threshold:
+            side = 'buy'
+        elif sell_prob >= self.threshold:
+            side = 'sell'
+        else:
+            return None
+        sl_price, tp_price, size, position_value = plan_trade(self.portfolio, side, price)
+        if not can_open(self.portfolio, position_value, symbol, symbol_max_open):
+            return None
+        self.seq += 1
+        apply_record(self.portfolio, dict(type='open', symbol=symbol, side=side, entry_price=price, sl_price=sl_price,
+                                          tp_price=tp_price, size=size, order_id=f"{self.name}-{self.seq}", opened=opened))
+        return side
+
+    def check(self, prices, lows=None, highs=None, since=None):
+        """Virtual TP/SL pass, exactly as check_and_close_trades settles live positions."""
+        book = self.portfolio['positions']
+        indices, hit_tp, gross_pnl = book.triggered(prices) if lows is None else book.triggered_range(lows, highs, prices, since)
+        if not len(indices):
+            return 0
+        closed = [(book.trade(i), pnl, tp) for i, pnl, tp in zip(indices.tolist(), gross_pnl.tolist(), hit_tp.tolist())]
+        book.remove(indices.tolist())
+        for trade, pnl, tp in closed:
+            fees = close_fees(self.portfolio, trade, prices[trade['symbol']])
+            self.fees += fees
+            apply_record(self.portfolio, dict(type='close', order_id=trade['order_id'], win=tp,
+                                              balance=self.portfolio['balance'] + pnl - fees))
+        return len(closed)
+
+
+def portfolio_line(name, portfolio):
+    trades = portfolio['total_trades']
+    closed = portfolio['wins'] + portfolio['losses']
+    win_rate = portfolio['wins'] / closed * 100 if closed else 0.0
+    return (f"{name:<12} ${portfolio['balance']:8.2f} ({portfolio['balance'] - STARTING_BALANCE:+7.2f})  "
+            f"{trades:3d} trades  {win_rate:5.1f}% wins  {len(portfolio['positions'])} open")
+
+
+# --- SHADOW RUNNER ---
+class ShadowRunner:
+    """
+    Scores the SHADOW_MODELS on the feature vectors the live models just used
+    and keeps one ShadowPortfolio per entry.
+
+    The live cycle only submit()s its vectors (a list append) and, once every
+    symbol has decided, flush() hands the whole bar to a worker pool as one
+    batch; the decisions are applied when the workers answer, on the event
+    loop, without the live path ever waiting for them. If a batch is still
+    being scored when the next one is flushed, the older one is waited for
+    first so shadows see bars in order; more than `max_pending` outstanding
+    batches means the workers cannot keep up and the newest bar is dropped.
+
+    With workers=0 the models are scored inline in flush(), which is
+    deterministic (useful for replays) but does run on the event loop.
+    """
+
+    def __init__(self, shadows, workers=1, max_pending=2, clock=time.monotonic):
+        self.portfolios = [ShadowPortfolio(entry['name'], entry.get('model_file', MODEL_ARTIFACT_FILE),
+                                           entry.get('threshold', PREDICTION_THRESHOLD)) for entry in shadows]
+        self.model_files = sorted({p.model_file for p in self.portfolios})
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pool = None
+        self.pending = []
+        self.tasks = []
+        self.dropped = 0
+        self.clock = clock  # stamps shadow positions like the live ones (see PositionBook.triggered_range)
+
+    def __bool__(self):
+        return bool(self.portfolios)
+
+    def submit(self, symbol, feature_vector, price, symbol_max_open=None):
+        if self.portfolios and feature_vector is not None:
+            self.pending.append((symbol, feature_vector, price, symbol_max_open))
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        if not self.workers:
+            self._apply(batch, score_vectors(self.model_files, [job[1] for job in batch]))
+            return
+        self.tasks = [task for task in self.tasks if not task.done()]
+        if len(self.tasks) >= self.max_pending:
+            self.dropped += 1
+            metrics.inc('shadow_batches_dropped')
+            return
+        if self.pool is None:
+            # 'spawn': workers must not inherit the event loop or the exchange's connections.
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        previous = self.tasks[-1] if self.tasks else None
+        self.tasks.append(asyncio.create_task(self._score(batch, previous)))
+
+    async def _score(self, batch, previous):
+        start = time.perf_counter()
+        try:
+            probs = await asyncio.get_running_loop().run_in_executor(self.pool, score_vectors, self.model_files,
+                                                                     [job[1] for job in batch])
+        except Exception as e:
+            print(f"Shadow scoring failed: {e}")
+            return
+        if previous is not None:
+            await asyncio.wait([previous])
+        self._apply(batch, probs)
+        metrics.observe('shadow_batch', time.perf_counter() - start)
+
+    def _apply(self, batch, probs):
+        index = {path: i for i, path in enumerate(self.model_files)}
+        opened = self.clock()
+        for shadow in self.portfolios:
+            model_probs = probs[index[shadow.model_file]]
+            for (symbol, _, price, symbol_max_open), (buy_prob, sell_prob) in zip(batch, model_probs.tolist()):
+                shadow.decide(symbol, buy_prob, sell_prob, price, symbol_max_open, opened)
+
+    def check(self, prices, lows=None, highs=None, since=None):
+        for shadow in self.portfolios:
+            shadow.check(prices, lows, highs, since)
+
+    def open_symbols(self):
+        return sorted({symbol for shadow in self.portfolios for symbol in shadow.portfolio['positions'].open_symbols()})
+
+    def report(self, live_portfolio):
+        """Comparative P&L: the live portfolio first, then every shadow."""
+        lines = [portfolio_line('live', live_portfolio)]
+        lines += [portfolio_line(shadow.name, shadow.portfolio) for shadow in self.portfolios]
+        if self.dropped:
+            lines.append(f"({self.dropped} bars dropped: shadow workers fell behind)")
+        return "\n".join(lines)
+
+    async def close(self):
+        if self.tasks:
+            await asyncio.wait(self.tasks, timeout=5.0)
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+def main():
+    # Worker-pool scoring must agree with inline scoring and with predict_buy_sell on the live model.
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(0, 1, (8, len(FEATURE_COLUMNS)))
+    forest = load_forest(MODEL_ARTIFACT_FILE)[0]
+    inline = score_vectors([MODEL_ARTIFACT_FILE], vectors)
+    reference = np.array([forest.predict_buy_sell(v) for v in vectors])
+    assert np.array_equal(inline[0], reference)
+
+    async def pooled():
+        runner = ShadowRunner([{'name': 'live-copy'}], workers=1)
+        runner.pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(runner.pool, score_vectors, runner.model_files, vectors[:1])  # warm up the worker
+
+        # Live-path cost of a shadow bar: submit() per symbol + flush(), while the worker scores in the background.
+        start = time.perf_counter()
+        for i, vector in enumerate(vectors):
+            runner.submit(f"C{i}/USDC:USDC", vector, 100.0)
+        runner.flush()
+        live_cost = time.perf_counter() - start
+        await asyncio.wait(runner.tasks)
+        probs = await loop.run_in_executor(runner.pool, score_vectors, runner.model_files, vectors)
+        await runner.close()
+        return live_cost, probs
+
+    live_cost, probs = asyncio.run(pooled())
+    assert np.array_equal(probs, inline)
+    print(f"{len(vectors)} vectors: worker scores identical to predict_buy_sell; "
+          f"live-path cost of submitting a bar {live_cost * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
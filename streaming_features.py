@@ -0,0 +1,301 @@
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import FEATURE_COLUMNS, BASE_FEATURE_COLUMNS, CONTEXT_TIMEFRAMES, CONTEXT_FEATURES, TIMEFRAME
+from resampler import Resampler, timestamps_ms
+
+
+VOLATILITY_WINDOW = 10
+# Running sums are rebuilt from the ring this often so float error cannot accumulate on a long-lived stream.
+RESYNC_EVERY = 1000
+
+
+# --- RING BUFFER ---
+class RingBuffer:
+    """Fixed-size circular buffer of floats; `ago(1)` is the newest value."""
+
+    def __init__(self, size):
+        self.size = size
+        self.values = [0.0] * size
+        self.head = 0
+        self.count = 0
+
+    def append(self, value):
+        evicted = self.values[self.head] if self.count == self.size else None
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        return evicted
+
+    def ago(self, k):
+        return self.values[(self.head - k) % self.size]
+
+    @property
+    def full(self):
+        return self.count == self.size
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+
+def _pct_change(new, old):
+    # Same result as pandas pct_change, including +-inf / nan on a zero base.
+    if old == 0:
+        return math.nan if new == 0 else math.copysign(math.inf, new)
+    return new / old - 1
+
+
+# --- STREAMING FEATURE CALCULATOR ---
+class StreamingFeatures:
+    """
+    Incremental version of bot.calculate_features(). Every closed candle is
+    pushed with update(); the feature vector for the newest candle is
+    available in O(1) without rebuilding a DataFrame. peek() evaluates a
+    still-forming candle without committing it. `latest` holds the feature
+    vector of the newest committed candle.
+    """
+
+    def __init__(self):
+        self.closes = RingBuffer(10)
+        self.volumes = RingBuffer(5)
+        self.returns = RingBuffer(VOLATILITY_WINDOW)
+        self.return_sum = 0.0
+        self.return_sumsq = 0.0
+        self.updates_since_resync = 0
+        self.last_timestamp = None
+        self.latest = None
+
+    def reset(self):
+        self.closes.clear()
+        self.volumes.clear()
+        self.returns.clear()
+        self.return_sum = 0.0
+        self.return_sumsq = 0.0
+        self.updates_since_resync = 0
+        self.last_timestamp = None
+        self.latest = None
+
+    def _features(self, high, low, close, volume, return_1, return_sum, return_sumsq):
+        if not (self.closes.full and self.volumes.full):
+            return None
+        n = VOLATILITY_WINDOW
+        variance = (return_sumsq - return_sum * return_sum / n) / (n - 1)
+        return np.array([
+            return_1,
+            _pct_change(close, self.closes.ago(5)),
+            _pct_change(close, self.closes.ago(10)),
+            _pct_change(volume, self.volumes.ago(1)),
+            _pct_change(volume, self.volumes.ago(5)),
+            (high - low) / close,
+            math.sqrt(max(variance, 0.0)),
+        ])
+
+    def peek(self, high, low, close, volume):
+        """Features for a candle appended after the committed history, without storing it."""
+        if not self.closes.full or self.returns.count < VOLATILITY_WINDOW - 1:
+            return None
+        return_1 = _pct_change(close, self.closes.ago(1))
+        oldest = self.returns.ago(VOLATILITY_WINDOW) if self.returns.full else 0.0
+        return_sum = self.return_sum - oldest + return_1
+        return_sumsq = self.return_sumsq - oldest * oldest + return_1 * return_1
+        return self._features(high, low, close, volume, return_1, return_sum, return_sumsq)
+
+    def update(self, high, low, close, volume, timestamp=None):
+        """Commits a closed candle and returns its feature vector (None while warming up)."""
+        features = self.peek(high, low, close, volume)
+
+        if self.closes.count:
+            return_1 = _pct_change(close, self.closes.ago(1))
+            evicted = self.returns.append(return_1)
+            if evicted is not None:
+                self.return_sum -= evicted
+                self.return_sumsq -= evicted * evicted
+            self.return_sum += return_1
+            self.return_sumsq += return_1 * return_1
+            self.updates_since_resync += 1
+            if self.updates_since_resync >= RESYNC_EVERY:
+                self._resync()
+        self.closes.append(close)
+        self.volumes.append(volume)
+        self.last_timestamp = timestamp
+        self.latest = features
+        return features
+
+    def _resync(self):
+        values = [self.returns.ago(k) for k in range(1, self.returns.count + 1)]
+        self.return_sum = math.fsum(values)
+        self.return_sumsq = math.fsum(v * v for v in values)
+        self.updates_since_resync = 0
+
+    def sync(self, candles):
+        """
+        Commits every closed candle newer than the last one seen. `candles` is
+        an iterable of (timestamp, open, high, low, close, volume) rows in
+        chronological order. If the stream has a gap (the last committed
+        candle is no longer in the window) the state is rebuilt from scratch.
+        """
+        candles = list(candles)
+        if not candles:
+            return
+        timestamps = [c[0] for c in candles]
+        if self.last_timestamp is None or self.last_timestamp not in timestamps:
+            self.reset()
+            start = 0
+        else:
+            start = timestamps.index(self.last_timestamp) + 1
+        for timestamp, _, high, low, close, volume in candles[start:]:
+            self.update(high, low, close, volume, timestamp)
+
+
+# --- HIGHER-TIMEFRAME CONTEXT ---
+# Calculators read the completed bars of one timeframe (a resampler.TimeframeBars);
+# each entry is (bars needed, function).
+def _context_return_1(bars):
+    closes = bars.column('close')
+    return _pct_change(closes[-1], closes[-2])
+
+
+def _context_volatility_10(bars):
+    closes = bars.column('close')[-(VOLATILITY_WINDOW + 1):].tolist()
+    return float(np.std([_pct_change(new, old) for old, new in zip(closes, closes[1:])], ddof=1))
+
+
+CONTEXT_CALCULATORS = {
+    'return_1': (2, _context_return_1),
+    'volatility_10': (VOLATILITY_WINDOW + 1, _context_volatility_10),
+}
+
+
+class ContextFeatures:
+    """
+    CONTEXT_FEATURES for every CONTEXT_TIMEFRAMES series, computed from the
+    completed higher-timeframe bars a Resampler builds out of the base
+    candles. A value only changes when a bar of its timeframe closes, so it is
+    recomputed then and reused for every base candle in between. Same
+    update()/sync()/latest contract as StreamingFeatures.
+    """
+
+    def __init__(self, base_timeframe=TIMEFRAME, timeframes=CONTEXT_TIMEFRAMES, features=CONTEXT_FEATURES):
+        self.features = features
+        self.needed = max(CONTEXT_CALCULATORS[name][0] for name in features)
+        self.resampler = Resampler(base_timeframe, timeframes, keep=self.needed)
+        self.values = dict.fromkeys(timeframes)
+        self.latest = None
+
+    @property
+    def last_timestamp(self):
+        return self.resampler.last_timestamp
+
+    def warmup_candles(self):
+        """Base candles needed after a reset before every timeframe has enough bars (one extra bar for a partial start)."""
+        base_period = self.resampler.base_period_ms
+        return max((self.needed + 1) * bars.period_ms // base_period for bars in self.resampler.bars.values())
+
+    def reset(self):
+        self.resampler.reset()
+        self.values = dict.fromkeys(self.values)
+        self.latest = None
+
+    def update(self, timestamp, open, high, low, close, volume):
+        """Commits a closed base candle and returns the context vector (None while warming up)."""
+        for timeframe in self.resampler.update(timestamp, open, high, low, close, volume):
+            bars = self.resampler.bars[timeframe]
+            if len(bars) >= self.needed:
+                self.values[timeframe] = [CONTEXT_CALCULATORS[name][1](bars) for name in self.features]
+        if any(values is None for values in self.values.values()):
+            self.latest = None
+        else:
+            self.latest = np.array([value for values in self.values.values() for value in values])
+        return self.latest
+
+    def sync(self, candles):
+        """Same contract as StreamingFeatures.sync()."""
+        candles = list(candles)
+        if not candles:
+            return
+        timestamps = [c[0] for c in candles]
+        if self.last_timestamp is None or self.last_timestamp not in timestamps:
+            self.reset()
+            start = 0
+        else:
+            start = timestamps.index(self.last_timestamp) + 1
+        for row in candles[start:]:
+            self.update(*row[:6])
+
+
+# --- BATCH HELPERS ---
+def context_feature_matrix(df, base_timeframe=TIMEFRAME):
+    """Batch mode of ContextFeatures over an OHLCV DataFrame: (n, len(context columns)), NaN while warming up."""
+    stream = ContextFeatures(base_timeframe)
+    out = np.full((len(df), len(FEATURE_COLUMNS) - len(BASE_FEATURE_COLUMNS)), np.nan)
+    rows = zip(timestamps_ms(df['timestamp']).tolist(), *(df[c].values.tolist() for c in ('open', 'high', 'low', 'close', 'volume')))
+    for i, row in enumerate(rows):
+        features = stream.update(*row)
+        if features is not None:
+            out[i] = features
+    return out
+
+
+def feature_matrix(df):
+    """
+    Streams a whole OHLCV DataFrame through StreamingFeatures (and
+    ContextFeatures when CONTEXT_TIMEFRAMES is set) and returns an
+    (n, len(FEATURE_COLUMNS)) array aligned with its rows (NaN for warm-up
+    rows), so training can use the exact same code path as the live bot.
+    """
+    stream = StreamingFeatures()
+    out = np.full((len(df), len(FEATURE_COLUMNS)), np.nan)
+    n_base = len(BASE_FEATURE_COLUMNS)
+    for i, (high, low, close, volume) in enumerate(zip(df['high'].values, df['low'].values,
+                                                      df['close'].values, df['volume'].values)):
+        features = stream.update(high, low, close, volume)
+        if features is not None:
+            out[i, :n_base] = features
+    if CONTEXT_TIMEFRAMES:
+        out[:, n_base:] = context_feature_matrix(df)
+    return out
+
+
+def main():
+    from bot import calculate_features
+
+    input_files = ['btc_15m_data.csv', 'inverted_btc_15m_data.csv']
+
+    print("--- Checking StreamingFeatures against calculate_features() ---")
+    for input_file in input_files:
+        df = pd.read_csv(input_file)
+        reference = calculate_features(df.copy())
+
+        start = time.perf_counter()
+        streamed = feature_matrix(df)
+        elapsed = time.perf_counter() - start
+
+        streamed = streamed[reference.index.values, :len(BASE_FEATURE_COLUMNS)]
+        expected = reference[BASE_FEATURE_COLUMNS].values
+        rel_err = np.abs(streamed - expected) / np.maximum(np.abs(expected), 1e-12)
+
+        # Live path: the bot only ever asks for the newest (forming) candle of a 25-row window.
+        live = StreamingFeatures()
+        live_err = 0.0
+        rows = list(df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].itertuples(index=False, name=None))
+        for end in range(25, len(rows) + 1):
+            window = rows[end - 25:end]
+            live.sync(window[:-1])
+            _, _, high, low, close, volume = window[-1]
+            features = live.peek(high, low, close, volume)
+            expected_row = calculate_features(df.iloc[end - 25:end].copy()).iloc[-1][BASE_FEATURE_COLUMNS].values
+            live_err = max(live_err, float(np.max(np.abs(features - expected_row) / np.maximum(np.abs(expected_row), 1e-12))))
+
+        print(f"\n{input_file}")
+        print(f"  Rows compared: {len(reference)}")
+        print(f"  Max relative error (batch): {rel_err.max():.3e}")
+        print(f"  Max relative error (live window): {live_err:.3e}")
+        print(f"  Per-candle update: {elapsed / len(df) * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
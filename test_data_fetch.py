@@ -1,61 +1,39 @@
 import asyncio
+import time
 import pandas as pd
 
-# --- IMPORTS FOR THE NEWEST SDK VERSION ---
-from pyinjective.core.network import Network
-from pyinjective.async_client import AsyncClient
+from exchange_client import InjectiveExchange, MarketCache
 
-TARGET_SYMBOL = "BTC/USDT PERP"
+TARGET_SYMBOL = "BTC/USDT:USDT"  # Injective's "BTC/USDT PERP" market
 TIMEFRAME = '15m'
 
 async def main():
     print(f"Attempting to fetch {TIMEFRAME} candles for {TARGET_SYMBOL} using the new Chronos API...")
 
+    exchange = InjectiveExchange(market_cache=MarketCache())
     try:
-        network = Network.mainnet()
-        client = AsyncClient(network)
-
-        # --- STEP 1: Get Market ID ---
-        response_dict = await client.fetch_derivative_markets()
-        market_id = None
-        for market in response_dict['markets']:
-            if market['ticker'] == TARGET_SYMBOL:
-                market_id = market['marketId']
-                break
-        
-        if not market_id:
-            print(f"❌ FAILED: Could not find market ID.")
-            return
-        print(f"✅ Found Market ID: {market_id}")
-
-        # --- STEP 2: Fetch candles via SDK ---
-        resolutions = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '4h': 14400, '1d': 86400}
-        
-        # CORRECT METHOD NAME: fetch_derivative_candles
-        candles_response = await client.fetch_derivative_candles(
-            market_id=market_id,
-            resolution=resolutions[TIMEFRAME],
-            limit=25
-        )
-        candles_list = candles_response.candles
-        
-        # --- STEP 3: Format into DataFrame (already in chronological order) ---
-        df = pd.DataFrame([
-            {
-                'timestamp': pd.to_datetime(int(candle.start_time), unit='s'),
-                'open': float(candle.open),
-                'high': float(candle.high),
-                'low': float(candle.low),
-                'close': float(candle.close),
-                'volume': float(candle.volume)
-            } for candle in candles_list
-        ])
+        # --- STEP 1: Get Market ID (from the market cache after the first run) ---
+        start = time.perf_counter()
+        market = await exchange.market(TARGET_SYMBOL)
+        print(f"✅ Found Market ID: {market['id']} in {(time.perf_counter() - start) * 1000:.0f} ms "
+              f"(price tick {market['price_precision']}, quantity tick {market['amount_precision']})")
+
+        # --- STEP 2: Fetch candles as [ms, open, high, low, close, volume] rows, oldest first ---
+        rows = await exchange.fetch_ohlcv(TARGET_SYMBOL, TIMEFRAME, limit=25)
+
+        # --- STEP 3: Format into DataFrame ---
+        df = pd.DataFrame(rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
 
         print("\n✅ SUCCESS! Latest candle data:")
         print(df.tail())
 
+    except KeyError:
+        print(f"❌ FAILED: Could not find market ID.")
     except Exception as e:
         print(f"\n🚨 An unexpected error occurred: {e}")
+    finally:
+        await exchange.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
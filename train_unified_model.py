@@ -4,10 +4,17 @@ from sklearn.model_selection import train_test_split
 import joblib
 from sklearn.metrics import classification_report, confusion_matrix
 
+from config import MODEL_ARTIFACT_FILE, PREDICTION_THRESHOLD, TRAINING_DATA_FILE
+from dataset_store import Dataset, load_dataset, save_dataset
+from forest_inference import CompiledForest
+from model_artifact import export_forest, file_sha256
+
 def main():
     # --- Configuration ---
-    input_filename = 'master_training_data.csv'
+    input_filename = TRAINING_DATA_FILE
     model_output_file = 'master_model.joblib'
+    artifact_output_file = MODEL_ARTIFACT_FILE
+    quantize_artifact = False  # float32 thresholds/leaves: smaller file, identical splits
     
     feature_columns = [
         'return_1', 'return_5', 'return_10',
@@ -18,9 +25,12 @@ def main():
     print(f"--- Training Unified Master Model (Tuned for Action) ---")
 
     try:
-        df_combined = pd.read_csv(input_filename)
-        X = df_combined[feature_columns]
-        y = df_combined['label']
+        # Zero-copy: the memory-mapped float32 matrix is already the dtype sklearn trains on.
+        dataset = load_dataset(input_filename)
+        if dataset.feature_columns != feature_columns:
+            raise ValueError(f"'{input_filename}' has features {dataset.feature_columns}, expected {feature_columns}")
+        X = pd.DataFrame(dataset.features, columns=feature_columns, copy=False)
+        y = pd.Series(dataset.label(), name='label')
 
         # --- Split the Data ---
         X_train, X_test, y_train, y_test = train_test_split(
@@ -29,8 +39,9 @@ def main():
         
         # --- THE CRITICAL ADDITION: Save the test sets for our tuning script ---
         print("Saving test data for tuning script...")
-        X_test.to_csv('X_test.csv', index=False)
-        pd.DataFrame(y_test, columns=['label']).to_csv('y_test.csv', index=False)
+        test_provenance = {'source': input_filename, 'split': 'test', 'test_size': 0.2, 'random_state': 42}
+        save_dataset(Dataset.from_dataframe(X_test, test_provenance), 'X_test.dset')
+        save_dataset(Dataset.from_dataframe(y_test.to_frame(), test_provenance), 'y_test.dset')
         
         print(f"Training set size: {len(X_train)}")
         print(f"Testing set size: {len(X_test)}")
@@ -43,7 +54,12 @@ def main():
         print("Model training complete.")
         
         joblib.dump(model, model_output_file)
-        print(f"Unified model saved to '{model_output_file}'.\n")
+        print(f"Unified model saved to '{model_output_file}'.")
+
+        # --- Export the pickle-free artifact the bot memory-maps at startup ---
+        export_forest(CompiledForest.from_sklearn(model), artifact_output_file, PREDICTION_THRESHOLD,
+                      file_sha256(input_filename), quantize=quantize_artifact)
+        print(f"Fast-start artifact saved to '{artifact_output_file}'.\n")
 
         # --- Evaluate the Model (at default 0.5 threshold) ---
         print(f"--- Evaluating Tuned Model (at default threshold) ---")
@@ -1,54 +1,176 @@
-import pandas as pd
+import time
+import warnings
+
 import joblib
-from sklearn.metrics import confusion_matrix
+import numpy as np
+
+from config import MODEL_FILE, PREDICTION_THRESHOLD, RR_RATIO, RISK_PER_TRADE_PERCENT, FEE_PERCENT, LABEL_RR_RATIO, LABEL_RISK_PERCENT
+from dataset_store import load_dataset
+
+
+# --- COSTS ---
+def fees_in_r(rr_ratio=RR_RATIO, risk_percent=RISK_PER_TRADE_PERCENT, fee_percent=FEE_PERCENT):
+    """
+    Round-trip fees of a win and of a loss in R, as check_and_close_trades
+    charges them: fee_percent of the entry plus the exit notional, with the
+    position sized so that the stop distance (risk_percent) costs 1R.
+    """
+    win = fee_percent * (2 + risk_percent * rr_ratio) / risk_percent
+    loss = fee_percent * (2 - risk_percent) / risk_percent
+    return win, loss
+
+
+def expectancy(trades, wins, rr_ratio=RR_RATIO, fees=None):
+    """(expected R per trade, total R) after fees; NaN where no trade is taken."""
+    win_fee, loss_fee = fees if fees is not None else fees_in_r(rr_ratio)
+    trades = np.asarray(trades, dtype=np.float64)
+    wins = np.asarray(wins, dtype=np.float64)
+    total = wins * (rr_ratio - win_fee) - (trades - wins) * (1 + loss_fee)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(trades > 0, total / trades, np.nan), total
+
+
+# --- THRESHOLD CURVE ---
+def threshold_curve(probabilities, y, rr_ratio=RR_RATIO, fees=None):
+    """
+    Trades, wins, win rate and expected R at every distinct threshold, from one
+    sort and one cumulative sum (O(n log n)). Entry i of every array is what
+    `probabilities >= threshold[i]` would give; thresholds descend.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    order = np.argsort(-probabilities, kind='stable')
+    sorted_probs = probabilities[order]
+    cumulative_wins = np.cumsum(np.asarray(y)[order] == 1)
+    # Last row of every group of equal probabilities: a threshold takes the whole group or none of it.
+    last = np.flatnonzero(np.append(sorted_probs[1:] != sorted_probs[:-1], True))
+    trades = last + 1
+    wins = cumulative_wins[last]
+    per_trade, total = expectancy(trades, wins, rr_ratio, fees)
+    return {
+        'threshold': sorted_probs[last],
+        'trades': trades,
+        'wins': wins,
+        'win_rate': wins / trades,
+        'expectancy_r': per_trade,
+        'total_r': total,
+    }
+
+
+def grid_counts(probabilities, y, grid):
+    """
+    Row counts per (grid bin, label) cell: bin k holds grid[k] <= p < grid[k + 1],
+    bin 0 everything below grid[0]. Shape (len(grid) + 1, 2).
+    """
+    bins = np.searchsorted(grid, probabilities, side='right')
+    cells = bins * 2 + (np.asarray(y) == 1)
+    return np.bincount(cells, minlength=2 * (len(grid) + 1)).reshape(-1, 2)
+
+
+def _counts_at_grid(cell_counts):
+    # Trades/wins at threshold grid[k] = every row in bin k + 1 and above; works on (..., bins, 2) arrays.
+    from_top = np.cumsum(cell_counts[..., ::-1, :], axis=-2)[..., ::-1, :][..., 1:, :]
+    return from_top.sum(axis=-1), from_top[..., 1]
+
+
+def bootstrap_bands(probabilities, y, grid, rr_ratio=RR_RATIO, fees=None, n_boot=2000, level=0.90, seed=0):
+    """
+    Bootstrap confidence bands of win rate and expected R at every grid threshold.
+
+    Resampling n rows with replacement only changes how many rows fall in each
+    (grid bin, label) cell, and those counts are multinomial over the observed
+    cell frequencies. Drawing them directly is the same bootstrap for every
+    statistic on the grid, vectorized over all resamples at once and
+    independent of n. Returns {'win_rate': (low, high), 'expectancy_r': (low, high)}.
+    """
+    counts = grid_counts(probabilities, y, grid)
+    n = counts.sum()
+    rng = np.random.default_rng(seed)
+    samples = rng.multinomial(n, counts.ravel() / n, size=n_boot).reshape(n_boot, *counts.shape)
+    trades, wins = _counts_at_grid(samples)
+    per_trade, _ = expectancy(trades, wins, rr_ratio, fees)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        win_rate = np.where(trades > 0, wins / trades, np.nan)
+    tails = [(1 - level) / 2 * 100, (1 + level) / 2 * 100]
+    bands = {}
+    for name, values in (('win_rate', win_rate), ('expectancy_r', per_trade)):
+        # Resamples without a trade at a threshold are left out of its band (all-NaN columns stay NaN).
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high = np.nanpercentile(values, tails, axis=0)
+        bands[name] = (low, high)
+    return bands
+
+
+def best_threshold(curve, min_trades):
+    """Threshold with the highest expected R per trade among those taking at least `min_trades` trades."""
+    eligible = np.flatnonzero(curve['trades'] >= min_trades)
+    if not len(eligible):
+        return None
+    return int(eligible[np.nanargmax(curve['expectancy_r'][eligible])])
+
 
 def main():
     # --- Configuration ---
-    model_file = 'master_model.joblib'
-    x_test_file = 'X_test.csv' # We need to save this file first
-    y_test_file = 'y_test.csv' # and this one
+    model_file = MODEL_FILE
+    x_test_file = 'X_test.dset'
+    y_test_file = 'y_test.dset'
+    grid = np.round(np.arange(0.05, 0.951, 0.05), 2)
+    level = 0.90
 
     print(f"--- Tuning Prediction Threshold for {model_file} ---")
+    # y_test says whether the label's trade (LABEL_RR_RATIO, LABEL_RISK_PERCENT) won, so R and fees are that trade's.
+    rr_ratio = LABEL_RR_RATIO
+    win_fee, loss_fee = fees = fees_in_r(LABEL_RR_RATIO, LABEL_RISK_PERCENT)
+    print(f"RR {rr_ratio}, fees {win_fee:.3f}R per win / {loss_fee:.3f}R per loss "
+          f"({FEE_PERCENT:.4%} per side at {LABEL_RISK_PERCENT:.2%} risk)")
+    if (LABEL_RR_RATIO, LABEL_RISK_PERCENT) != (RR_RATIO, RISK_PER_TRADE_PERCENT):
+        print(f"Warning: the labels were built with RR {LABEL_RR_RATIO} at {LABEL_RISK_PERCENT:.2%} risk, "
+              f"the bot trades RR {RR_RATIO} at {RISK_PER_TRADE_PERCENT:.2%} risk.")
 
     try:
         # Load the model and the test data
         model = joblib.load(model_file)
-        X_test = pd.read_csv(x_test_file)
-        y_test = pd.read_csv(y_test_file).values.ravel()
+        X_test = load_dataset(x_test_file).to_dataframe()
+        y_test = load_dataset(y_test_file).label()
 
-        # --- Get Prediction Probabilities ---
         # Instead of a hard 0 or 1, we get the model's confidence for class '1'
         probabilities = model.predict_proba(X_test)[:, 1]
 
-        # --- Test Different Thresholds ---
-        print("\n--- Threshold Analysis ---")
-        thresholds_to_test = [0.5, 0.45, 0.4, 0.35, 0.3]
-        
-        for threshold in thresholds_to_test:
-            # Apply the current threshold to the probabilities
-            predictions = (probabilities >= threshold).astype(int)
-            
-            cm = confusion_matrix(y_test, predictions)
-            
-            trades_taken = cm[1][1] + cm[0][1]
-            correct_trades = cm[1][1]
-
-            if trades_taken > 0:
-                win_rate = correct_trades / trades_taken * 100
-                # Expected profit for 100 trades = (Wins * 3 Reward) - (Losses * 1 Risk)
-                # We scale this to a "per trade" value
-                expected_profit_per_trade = ((correct_trades * 3) - (trades_taken - correct_trades)) / trades_taken
-                
-                print(f"\nThreshold: {threshold:.2f}")
-                print(f"  Trades Taken: {trades_taken} (out of 54 opportunities)")
-                print(f"  Win Rate: {win_rate:.2f}%")
-                print(f"  Expected Profit Per Trade: {expected_profit_per_trade:.2f}R")
-            else:
-                print(f"\nThreshold: {threshold:.2f} -> No trades were taken.")
-        
-        print("\n--------------------------")
-        print("Goal: Find the threshold with the best balance of Trades Taken and Expected Profit.")
+        start = time.perf_counter()
+        curve = threshold_curve(probabilities, y_test, rr_ratio, fees)
+        curve_time = time.perf_counter() - start
+        start = time.perf_counter()
+        bands = bootstrap_bands(probabilities, y_test, grid, rr_ratio, fees, level=level)
+        band_time = time.perf_counter() - start
 
+        # --- Threshold Analysis ---
+        print(f"\n--- Threshold Analysis ({len(y_test)} opportunities, {len(curve['threshold'])} distinct thresholds "
+              f"in {curve_time * 1000:.1f} ms, {level:.0%} bootstrap bands in {band_time * 1000:.1f} ms) ---")
+        print(f"{'threshold':>9} {'trades':>7} {'taken':>7} {'win rate':>9} {f'{level:.0%} band':>17} "
+              f"{'E[R]/trade':>10} {f'{level:.0%} band':>17} {'total R':>8}")
+        trades_at, wins_at = _counts_at_grid(grid_counts(probabilities, y_test, grid))
+        per_trade, total = expectancy(trades_at, wins_at, rr_ratio, fees)
+        for k, threshold in enumerate(grid):
+            if not trades_at[k]:
+                print(f"{threshold:9.2f} {0:7d}   no trades")
+                continue
+            wr_low, wr_high = bands['win_rate'][0][k], bands['win_rate'][1][k]
+            e_low, e_high = bands['expectancy_r'][0][k], bands['expectancy_r'][1][k]
+            marker = '  <- PREDICTION_THRESHOLD' if np.isclose(threshold, PREDICTION_THRESHOLD) else ''
+            print(f"{threshold:9.2f} {trades_at[k]:7d} {trades_at[k] / len(y_test):7.1%} {wins_at[k] / trades_at[k]:9.1%} "
+                  f"[{wr_low:6.1%}, {wr_high:6.1%}] {per_trade[k]:+10.3f} [{e_low:+6.3f}, {e_high:+6.3f}] {total[k]:+8.1f}{marker}")
+
+        min_trades = max(30, len(y_test) // 100)
+        best = best_threshold(curve, min_trades)
+        print("\n--------------------------")
+        if best is None:
+            print(f"No threshold takes at least {min_trades} trades.")
+        else:
+            print(f"Best expected R with at least {min_trades} trades: threshold {curve['threshold'][best]:.4f}, "
+                  f"{curve['trades'][best]} trades, win rate {curve['win_rate'][best]:.1%}, "
+                  f"{curve['expectancy_r'][best]:+.3f}R per trade")
+        most = int(np.nanargmax(curve['total_r']))
+        print(f"Most total R: threshold {curve['threshold'][most]:.4f}, {curve['trades'][most]} trades, {curve['total_r'][most]:+.1f}R")
 
     except FileNotFoundError:
         # We need to update our training script to save the test data first
@@ -58,4 +180,4 @@ def main():
         print(f"SCRIPT FAILED: An unexpected error occurred: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()